@@ -0,0 +1,126 @@
+"""
+    Benchmark suite for the mock clients.
+
+    Run it with ``python -m pytest_tornadis.benchmarks [name ...]``. Save the
+    results with ``--save results.json`` and compare a later run against them
+    with ``--baseline results.json``: the run fails when a case is slower
+    than its baseline by more than ``--threshold`` (25% by default).
+"""
+
+import argparse
+import collections
+import importlib
+import json
+import time
+
+import tornado.gen
+import tornado.ioloop
+
+MODULES = ('dispatch', 'commands', 'keys', 'lists', 'pubsub', 'seed', 'server', 'snapshot',
+           'workloads', 'zsets')
+
+DEFAULT_THRESHOLD = 0.25
+
+BENCHMARKS = collections.OrderedDict()
+
+def benchmark(name):
+    """Registers a benchmark function under ``name``.
+
+    The function takes no arguments and returns a dict mapping a case label
+    to the measured seconds per operation.
+    """
+    def decorator(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return decorator
+
+def time_calls(client, args, number=10000, repeat=3):
+    """Returns the best per-call time of ``client.call(*args)`` in seconds."""
+    @tornado.gen.coroutine
+    def run():
+        for _ in range(number):
+            yield client.call(*args)
+
+    return time_coroutine(run, number, repeat)
+
+def time_coroutine(fn, number, repeat=3):
+    """Returns the best time of running coroutine ``fn`` divided by ``number``."""
+    io_loop = tornado.ioloop.IOLoop.current()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        io_loop.run_sync(fn)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best / number
+
+def load():
+    for module in MODULES:
+        importlib.import_module('{}.{}'.format(__name__, module))
+
+def run(names=None):
+    """Runs the named benchmarks, all by default.
+
+    Returns an ordered dict mapping ``benchmark.case`` to seconds per operation.
+    """
+    load()
+    results = collections.OrderedDict()
+    for name in names or list(BENCHMARKS):
+        for case, seconds in BENCHMARKS[name]().items():
+            results['{}.{}'.format(name, case)] = seconds
+
+    return results
+
+def save(results, path):
+    with open(path, 'w') as stream:
+        json.dump(results, stream, indent=2)
+
+def load_results(path):
+    with open(path) as stream:
+        return json.load(stream, object_pairs_hook=collections.OrderedDict)
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Returns ``(case, ratio)`` for every case slower than its baseline by more than ``threshold``."""
+    regressions = []
+    for case, seconds in results.items():
+        previous = baseline.get(case)
+        if not previous:
+            continue
+
+        ratio = seconds / previous
+        if ratio > 1 + threshold:
+            regressions.append((case, ratio))
+
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pytest_tornadis.benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all by default')
+    parser.add_argument('--save', metavar='PATH', help='write the results as JSON')
+    parser.add_argument('--baseline', metavar='PATH', help='compare against saved results')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='tolerated slowdown against the baseline (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    load()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: {}'.format(', '.join(sorted(unknown))))
+
+    baseline = load_results(args.baseline) if args.baseline else {}
+    results = run(args.names)
+    for case, seconds in results.items():
+        line = '{:<45} {:>14.3f} us/op'.format(case, seconds * 1e6)
+        if baseline.get(case):
+            line += ' {:>+8.1%}'.format(seconds / baseline[case] - 1)
+        print(line)
+
+    if args.save:
+        save(results, args.save)
+
+    regressions = compare(results, baseline, args.threshold)
+    for case, ratio in regressions:
+        print('REGRESSION {}: {:.2f}x slower than baseline'.format(case, ratio))
+
+    return 1 if regressions else 0
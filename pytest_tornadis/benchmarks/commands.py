@@ -0,0 +1,56 @@
+"""
+    Per-command latency on hash, list and set workloads, and bulk commands
+    against the equivalent per-key loops.
+"""
+
+import tornado.gen
+
+from .. import clients
+from . import benchmark, time_calls, time_coroutine
+
+BULK_KEYS = 10000
+
+@benchmark('commands')
+def bench_commands():
+    client = clients.MockClient()
+    client.clear_mock_redis()
+
+    results = {}
+    results['set'] = time_calls(client, ('SET', 'string', 'foo'))
+    results['get'] = time_calls(client, ('GET', 'string'))
+    results['expire'] = time_calls(client, ('EXPIRE', 'string', 100))
+    results['persist'] = time_calls(client, ('PERSIST', 'string'))
+    results['hset'] = time_calls(client, ('HSET', 'hash', 'field', 'value'))
+    results['hmset'] = time_calls(client, ('HMSET', 'hash', 'a', '1', 'b', '2'))
+    results['hget'] = time_calls(client, ('HGET', 'hash', 'field'))
+    results['hgetall'] = time_calls(client, ('HGETALL', 'hash'))
+    results['rpush'] = time_calls(client, ('RPUSH', 'list', 'value'))
+    results['lrange'] = time_calls(client, ('LRANGE', 'list', 0, 10))
+    results['sadd'] = time_calls(client, ('SADD', 'set', 'member'))
+    results['smembers'] = time_calls(client, ('SMEMBERS', 'set'))
+    results['incr'] = time_calls(client, ('INCR', 'counter'))
+    results['hincrby'] = time_calls(client, ('HINCRBY', 'hash', 'counter', 1))
+
+    keys = ['key:{}'.format(i) for i in range(BULK_KEYS)]
+    mset_args = ['MSET']
+    for key in keys:
+        mset_args.extend((key, 'value'))
+
+    @tornado.gen.coroutine
+    def get_each():
+        for key in keys:
+            yield client.call('GET', key)
+
+    @tornado.gen.coroutine
+    def set_each():
+        for key in keys:
+            yield client.call('SET', key, 'value')
+
+    # Seconds per batch of BULK_KEYS keys.
+    results['mset_10k'] = time_calls(client, mset_args, number=10)
+    results['set_10k'] = time_coroutine(set_each, 1)
+    results['mget_10k'] = time_calls(client, ['MGET'] + keys, number=10)
+    results['get_10k'] = time_coroutine(get_each, 1)
+
+    client.clear_mock_redis()
+    return results
@@ -0,0 +1,60 @@
+"""
+    Command dispatch cost as the number of registered commands grows, with
+    per-command statistics enabled, and of ``call`` returning a resolved
+    Future compared with wrapping every call in a coroutine.
+"""
+
+import tornado.concurrent
+import tornado.gen
+
+from .. import clients
+from . import benchmark, time_calls, time_coroutine
+
+CALLS = 10000
+
+class _CoroutineClient(clients.MockClient):
+    """``call`` as a ``tornado.gen`` coroutine, as before the fast path."""
+
+    @tornado.gen.coroutine
+    def call(self, *args, **kwargs):
+        result = self._dispatch(args)
+        if tornado.concurrent.is_future(result):
+            result = yield result
+        return result
+
+def _time_awaited(client, args):
+    async def run():
+        for _ in range(CALLS):
+            await client.call(*args)
+
+    return time_coroutine(run, CALLS)
+
+def _noop(client, *args):
+    return None
+
+@benchmark('dispatch')
+def bench_dispatch():
+    results = {}
+    for extra in (0, 100, 1000, 10000):
+        client_cls = type('BenchClient', (clients.MockClient,), {})
+        for i in range(extra):
+            client_cls.register_command('bench{}'.format(i), _noop)
+
+        client = client_cls()
+        results['smembers+{}'.format(extra)] = time_calls(client, ('SMEMBERS', 'bench'))
+        results['get+{}'.format(extra)] = time_calls(client, ('GET', 'bench'))
+
+    redis = clients.MockRedis()
+    client = clients.MockClient(redis=redis)
+    results['get_stats_off'] = time_calls(client, ('GET', 'bench'))
+    redis.enable_stats()
+    results['get_stats_on'] = time_calls(client, ('GET', 'bench'))
+
+    client = clients.MockClient(redis=clients.MockRedis())
+    coroutine_client = _CoroutineClient(redis=client.redis)
+    results['get_resolved_yield'] = time_calls(client, ('GET', 'bench'))
+    results['get_coroutine_yield'] = time_calls(coroutine_client, ('GET', 'bench'))
+    results['get_resolved_await'] = _time_awaited(client, ('GET', 'bench'))
+    results['get_coroutine_await'] = _time_awaited(coroutine_client, ('GET', 'bench'))
+
+    return results
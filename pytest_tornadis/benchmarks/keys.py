@@ -0,0 +1,36 @@
+"""
+    Key enumeration: SCAN batches, KEYS with and without a literal prefix,
+    and SSCAN over a large set.
+"""
+
+from .. import clients
+from . import benchmark, time_calls
+
+KEYS = 200000
+LARGE_SET = 100000
+
+@benchmark('keys')
+def bench_keys():
+    results = {}
+    client = clients.MockClient(redis=clients.MockRedis())
+    keyspace = client.keyspace
+    for i in range(KEYS):
+        keyspace.put('user:{}'.format(i), 'foo')
+    keyspace.get_set('large', create=True).update(range(LARGE_SET))
+
+    # Every batch only costs its COUNT, wherever the cursor is.
+    cursor, _ = keyspace.scan(0, count=KEYS // 2)
+    results['scan_100_200k'] = time_calls(client, ('SCAN', 0, 'COUNT', 100))
+    results['scan_100_middle_200k'] = time_calls(client, ('SCAN', cursor, 'COUNT', 100))
+    results['scan_match_100_200k'] = time_calls(client, ('SCAN', 0, 'MATCH', 'user:1*', 'COUNT', 100))
+
+    results['keys_literal_200k'] = time_calls(client, ('KEYS', 'user:4242'))
+    results['keys_prefix_10_200k'] = time_calls(client, ('KEYS', 'user:1999?'), number=1000)
+    results['keys_suffix_200k'] = time_calls(client, ('KEYS', '*:19999'), number=3)
+
+    # The first SSCAN copies the members of a large set, later ones only
+    # walk their batch of the copy.
+    results['sscan_first_100_100k'] = time_calls(client, ('SSCAN', 'large', 0, 'COUNT', 100), number=100)
+    cursor, _ = keyspace.scan_members('large', keyspace.get_set('large'), 0, count=100)
+    results['sscan_next_100_100k'] = time_calls(client, ('SSCAN', 'large', cursor, 'COUNT', 100))
+    return results
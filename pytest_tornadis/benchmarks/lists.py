@@ -0,0 +1,56 @@
+"""
+    List throughput: a BRPOP job queue fed by LPUSH, a capped log and pops
+    from large lists.
+"""
+
+import tornado.gen
+
+from .. import clients
+from . import benchmark, time_calls, time_coroutine
+
+JOBS = 20000
+CONSUMERS = 10
+LARGE_LIST = 100000
+
+@benchmark('lists')
+def bench_lists():
+    results = {}
+    redis = clients.MockRedis()
+    producer = clients.MockClient(redis=redis)
+
+    @tornado.gen.coroutine
+    def queue():
+        consumed = []
+
+        @tornado.gen.coroutine
+        def consume(client):
+            while True:
+                reply = yield client.call('BRPOP', 'jobs', 0)
+                if reply[1] is None:
+                    return
+                consumed.append(reply[1])
+
+        consumers = [consume(clients.MockClient(redis=redis)) for _ in range(CONSUMERS)]
+        for i in range(JOBS):
+            yield producer.call('LPUSH', 'jobs', i)
+        for _ in range(CONSUMERS):
+            yield producer.call('LPUSH', 'jobs', None)
+        yield consumers
+        assert len(consumed) == JOBS
+
+    results['lpush_brpop_{}_consumers'.format(CONSUMERS)] = time_coroutine(queue, JOBS)
+
+    @tornado.gen.coroutine
+    def capped_log():
+        for i in range(JOBS):
+            yield producer.call('LPUSH', 'log', i)
+            yield producer.call('LTRIM', 'log', 0, 999)
+
+    results['lpush_ltrim_1000'] = time_coroutine(capped_log, JOBS)
+
+    producer.keyspace.get_list('large', create=True).extend(range(LARGE_LIST))
+    results['lpop_100k'] = time_calls(producer, ('LPOP', 'large'))
+    results['rpop_100k'] = time_calls(producer, ('RPOP', 'large'))
+    results['lrange_tail_100k'] = time_calls(producer, ('LRANGE', 'large', -10, -1))
+
+    return results
@@ -0,0 +1,73 @@
+"""
+    Pub/sub fan-out, drain and unsubscribe cost.
+"""
+
+import tornado.gen
+
+from .. import clients
+from . import benchmark, time_coroutine
+
+@benchmark('pubsub')
+def bench_pubsub():
+    results = {}
+    publisher = clients.MockClient()
+    publisher.clear_mock_redis()
+
+    subscribers = [clients.MockPubSubClient() for _ in range(10000)]
+
+    @tornado.gen.coroutine
+    def subscribe():
+        for subscriber in subscribers:
+            yield subscriber.pubsub_subscribe('fanout')
+    results['subscribe_10k'] = time_coroutine(subscribe, len(subscribers), repeat=1)
+
+    @tornado.gen.coroutine
+    def fanout():
+        for _ in range(10):
+            yield publisher.call('PUBLISH', 'fanout', 'message')
+    results['publish_fanout_10k'] = time_coroutine(fanout, 10, repeat=1)
+
+    @tornado.gen.coroutine
+    def unsubscribe():
+        for subscriber in subscribers:
+            yield subscriber.pubsub_unsubscribe('fanout')
+    results['unsubscribe_10k'] = time_coroutine(unsubscribe, len(subscribers), repeat=1)
+
+    consumer = clients.MockPubSubClient()
+
+    @tornado.gen.coroutine
+    def drain():
+        yield consumer.pubsub_subscribe('drain')
+        for _ in range(100000):
+            yield publisher.call('PUBLISH', 'drain', 'message')
+        for _ in range(100000):
+            yield consumer.pubsub_pop_message()
+    results['publish_drain_100k'] = time_coroutine(drain, 100000, repeat=1)
+
+    publisher.clear_mock_redis()
+    return results
+
+@benchmark('psubscribe')
+def bench_psubscribe():
+    results = {}
+    publisher = clients.MockClient()
+
+    for count in (10, 1000, 10000):
+        publisher.clear_mock_redis()
+        subscriber = clients.MockPubSubClient()
+
+        @tornado.gen.coroutine
+        def subscribe():
+            for i in range(count):
+                yield subscriber.pubsub_psubscribe('events.{}.*'.format(i))
+        time_coroutine(subscribe, count, repeat=1)
+
+        @tornado.gen.coroutine
+        def publish():
+            for i in range(1000):
+                yield publisher.call('PUBLISH', 'events.{}.created'.format(i % count), 'message')
+            subscriber._reply_list.clear()
+        results['publish_{}_patterns'.format(count)] = time_coroutine(publish, 1000)
+
+    publisher.clear_mock_redis()
+    return results
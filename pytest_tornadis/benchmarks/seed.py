@@ -0,0 +1,55 @@
+"""
+    Per-test setup time of a large seed dataset: repopulating it through
+    ``MockClient.call`` against restoring a copy-on-write snapshot.
+"""
+
+import time
+
+import tornado.gen
+import tornado.ioloop
+
+from .. import clients
+from . import benchmark
+
+SEED_KEYS = 200000
+
+@tornado.gen.coroutine
+def _populate(client, keys):
+    for i in range(keys):
+        if i % 4 == 0:
+            yield client.call('HSET', 'hash:{}'.format(i), 'field', i)
+        elif i % 4 == 1:
+            yield client.call('RPUSH', 'list:{}'.format(i), i)
+        elif i % 4 == 2:
+            yield client.call('SADD', 'set:{}'.format(i), i)
+        else:
+            yield client.call('SET', 'string:{}'.format(i), i)
+
+@tornado.gen.coroutine
+def _touch(client):
+    for i in range(0, 400, 4):
+        yield client.call('HSET', 'hash:{}'.format(i), 'field', 'changed')
+
+@benchmark('seed')
+def bench_seed():
+    io_loop = tornado.ioloop.IOLoop.current()
+    results = {}
+
+    start = time.perf_counter()
+    seed = clients.MockRedis()
+    io_loop.run_sync(lambda: _populate(clients.MockClient(redis=seed), SEED_KEYS))
+    results['populate_200k'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot = seed.snapshot()
+    results['snapshot_200k'] = time.perf_counter() - start
+
+    tests = 20
+    start = time.perf_counter()
+    for _ in range(tests):
+        redis = clients.MockRedis()
+        redis.restore(snapshot)
+        io_loop.run_sync(lambda: _touch(clients.MockClient(redis=redis)))
+    results['restore_and_touch_100_200k'] = (time.perf_counter() - start) / tests
+
+    return results
@@ -0,0 +1,40 @@
+"""
+    Pipelined request throughput of MockRedisServer over loopback TCP.
+"""
+
+import hiredis
+import tornado.gen
+import tornado.tcpclient
+
+from .. import clients, server
+from . import benchmark, time_coroutine
+
+@benchmark('server')
+def bench_server():
+    results = {}
+    redis_server = server.MockRedisServer(redis=clients.MockRedis())
+    port = redis_server.listen_tcp()
+
+    for batch in (1, 100, 1000):
+        parts = []
+        for i in range(batch):
+            server.encode_reply([b'SET', b'key:%d' % i, b'value'], parts)
+        payload = b''.join(parts)
+        rounds = max(10000 // batch, 10)
+
+        @tornado.gen.coroutine
+        def run():
+            stream = yield tornado.tcpclient.TCPClient().connect('127.0.0.1', port)
+            reader = hiredis.Reader()
+            for _ in range(rounds):
+                yield stream.write(payload)
+                received = 0
+                while received < batch:
+                    reader.feed((yield stream.read_bytes(65536, partial=True)))
+                    while reader.gets() is not False:
+                        received += 1
+            stream.close()
+        results['set_pipeline_{}'.format(batch)] = time_coroutine(run, rounds * batch)
+
+    redis_server.stop()
+    return results
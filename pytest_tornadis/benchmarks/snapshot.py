@@ -0,0 +1,59 @@
+"""
+    Snapshot files of a million keys: loading one against building the same
+    keyspace in memory, and the cost of the first access to lazy values.
+"""
+
+import gc
+import os
+import tempfile
+import time
+
+from .. import clients, snapshot
+from . import benchmark
+
+SNAPSHOT_KEYS = 1000000
+HASH_EVERY = 10
+
+def _build(keys):
+    redis = clients.MockRedis()
+    keyspace = redis.db()
+    keyspace.put_many(('string:{}'.format(i), 'value:{}'.format(i))
+                      for i in range(keys) if i % HASH_EVERY)
+    for i in range(0, keys, HASH_EVERY):
+        keyspace.get_hash('hash:{}'.format(i), create=True).update(
+            ('field:{}'.format(field), field) for field in range(10))
+        keyspace.expire('string:{}'.format(i + 1), 3600)
+    return redis
+
+@benchmark('snapshot')
+def bench_snapshot():
+    results = {}
+
+    start = time.perf_counter()
+    seed = _build(SNAPSHOT_KEYS)
+    results['build_1m'] = time.perf_counter() - start
+
+    handle, path = tempfile.mkstemp(suffix='.snapshot')
+    os.close(handle)
+    try:
+        start = time.perf_counter()
+        snapshot.dump(seed, path)
+        results['dump_1m'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        redis = snapshot.load(path)
+        results['load_1m'] = time.perf_counter() - start
+
+        # The collection of the loaded entries that load defers would
+        # otherwise land in the middle of the reads.
+        gc.collect()
+        keyspace = redis.db()
+        start = time.perf_counter()
+        for i in range(0, 10000, HASH_EVERY):
+            keyspace.get_string('string:{}'.format(i + 1))
+            keyspace.get_hash('hash:{}'.format(i))
+        results['first_read_1k_pairs'] = (time.perf_counter() - start) / 1000
+    finally:
+        os.remove(path)
+
+    return results
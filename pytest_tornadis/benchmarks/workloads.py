@@ -0,0 +1,68 @@
+"""
+    Mixed workloads closer to what test suites do than single-command loops:
+    a read-heavy GET/SET mix, large containers and TTL-heavy keyspaces.
+"""
+
+import random
+
+import tornado.gen
+
+from .. import clients
+from . import benchmark, time_coroutine
+
+KEYS = 10000
+OPERATIONS = 20000
+CONTAINER_SIZE = 10000
+
+@benchmark('workloads')
+def bench_workloads():
+    results = {}
+    redis = clients.MockRedis()
+    client = clients.MockClient(redis=redis)
+    rng = random.Random(0)
+
+    # 80% GET / 20% SET over a fixed keyspace.
+    keys = ['key:{}'.format(i) for i in range(KEYS)]
+    operations = [('GET', rng.choice(keys)) if rng.random() < 0.8 else ('SET', rng.choice(keys), 'value')
+                  for _ in range(OPERATIONS)]
+
+    @tornado.gen.coroutine
+    def mixed():
+        for args in operations:
+            yield client.call(*args)
+
+    results['get_set_80_20'] = time_coroutine(mixed, OPERATIONS)
+
+    @tornado.gen.coroutine
+    def fill_containers():
+        redis.clear()
+        for i in range(CONTAINER_SIZE):
+            yield client.call('HSET', 'hash', 'field:{}'.format(i), i)
+            yield client.call('RPUSH', 'list', i)
+            yield client.call('SADD', 'set', i)
+
+    results['fill_large_containers'] = time_coroutine(fill_containers, 3 * CONTAINER_SIZE)
+    results['hgetall_large'] = time_coroutine(lambda: client.call('HGETALL', 'hash'), 1)
+    results['lrange_large'] = time_coroutine(lambda: client.call('LRANGE', 'list', 0, -1), 1)
+    results['smembers_large'] = time_coroutine(lambda: client.call('SMEMBERS', 'set'), 1)
+
+    # Every key gets a TTL; a virtual clock makes them all expire at once, so
+    # the active expire cycles do a fixed amount of work.
+    clock = clients.VirtualClock()
+    redis.clear()
+    redis.clock = clock
+
+    @tornado.gen.coroutine
+    def expiring():
+        for i, key in enumerate(keys):
+            yield client.call('SETEX', key, 1 + i % 10, 'value')
+
+    results['setex'] = time_coroutine(expiring, KEYS, repeat=1)
+    clock.advance(60)
+    keyspace = redis.db(0)
+    start = keyspace.expire_cycle_time
+    while keyspace.expire_cycle(keyspace.active_expire_limit):
+        pass
+    results['expire_cycle_per_key'] = (keyspace.expire_cycle_time - start) / KEYS
+
+    return results
@@ -0,0 +1,46 @@
+"""
+    Sorted-set operations on a large set, against sorting a plain dict of
+    scores on every read.
+"""
+
+import random
+import time
+
+from .. import clients
+from . import benchmark, time_calls
+
+MEMBERS = 1000000
+NAIVE_READS = 5
+
+def _naive_range(scores, start, stop):
+    return sorted(scores.items(), key=lambda item: (item[1], item[0]))[start:stop + 1]
+
+@benchmark('zsets')
+def bench_zsets():
+    results = {}
+    rng = random.Random(0)
+    client = clients.MockClient(redis=clients.MockRedis())
+
+    start = time.perf_counter()
+    zset = client.keyspace.get_zset('board', create=True)
+    for i in range(MEMBERS):
+        zset.add('member{}'.format(i), rng.random())
+    results['build_1m'] = (time.perf_counter() - start) / MEMBERS
+
+    middle = MEMBERS // 2
+    results['zadd_1m'] = time_calls(client, ('ZADD', 'board', 0.5, 'member42'))
+    results['zincrby_1m'] = time_calls(client, ('ZINCRBY', 'board', 0.001, 'member42'))
+    results['zrank_1m'] = time_calls(client, ('ZRANK', 'board', 'member42'))
+    results['zrange_10_1m'] = time_calls(client, ('ZRANGE', 'board', middle, middle + 9))
+    results['zrevrange_10_1m'] = time_calls(client, ('ZREVRANGE', 'board', 0, 9, 'WITHSCORES'))
+    results['zrangebyscore_limit_10_1m'] = time_calls(
+        client, ('ZRANGEBYSCORE', 'board', 0.25, '+inf', 'LIMIT', 0, 10))
+    results['zcount_1m'] = time_calls(client, ('ZCOUNT', 'board', 0.25, 0.75))
+
+    scores = dict(zset.scores)
+    start = time.perf_counter()
+    for _ in range(NAIVE_READS):
+        _naive_range(scores, middle, middle + 9)
+    results['naive_sorted_range_10_1m'] = (time.perf_counter() - start) / NAIVE_READS
+
+    return results
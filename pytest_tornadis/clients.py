@@ -1,14 +1,212 @@
+import bisect
 import collections
 import datetime
 import enum
+import functools
+import heapq
+import itertools
+import re
+import threading
+import time
 
 import tornadis
 import tornado
+import tornado.concurrent
+import tornado.gen
+import tornado.ioloop
 
-_channels = collections.defaultdict(list)
-_data = {}
+from . import stats
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python < 3.7
+    class ContextVar(object):
+        """Thread-local stand-in for ``contextvars.ContextVar``."""
+
+        def __init__(self, name, default=None):
+            self.name = name
+            self._default = default
+            self._local = threading.local()
+
+        def get(self):
+            return getattr(self._local, 'value', self._default)
+
+        def set(self, value):
+            token = self.get()
+            self._local.value = value
+            return token
+
+        def reset(self, token):
+            self._local.value = token
+
+@functools.lru_cache(maxsize=256)
+def compile_glob(pattern):
+    """Compiles a Redis glob-style pattern.
+
+    Supports ``*``, ``?``, ``[...]`` classes (with ``^`` negation and
+    ranges) and backslash escapes. Returns ``(prefix, regex)`` where
+    ``prefix`` is the literal text every match starts with and ``regex``
+    is meant to be used with ``match``. Bytes patterns give bytes results.
+    Recently used patterns are cached, as SCAN and KEYS recompile theirs
+    on every call.
+    """
+    is_bytes = isinstance(pattern, bytes)
+    text = pattern.decode('latin-1') if is_bytes else pattern
+
+    parts = []
+    prefix = None
+    literal = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        char_class = _compile_glob_class(text, i + 1) if char == '[' else None
+        if (char in '*?' or char_class is not None) and prefix is None:
+            prefix = ''.join(literal)
+
+        if char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        elif char_class is not None:
+            i, char_class = char_class
+            parts.append(char_class)
+        else:
+            if char == '\\' and i + 1 < len(text):
+                i += 1
+                char = text[i]
+            if prefix is None:
+                literal.append(char)
+            parts.append(re.escape(char))
+        i += 1
+
+    if prefix is None:
+        prefix = ''.join(literal)
+    regex = '(?s)' + ''.join(parts) + r'\Z'
+    if is_bytes:
+        return prefix.encode('latin-1'), re.compile(regex.encode('latin-1'))
+    return prefix, re.compile(regex)
+
+def _compile_glob_class(text, i):
+    """Compiles the class starting after the ``[`` at ``text[i - 1]``.
+
+    Returns the index of the closing ``]`` and the regex, or ``None`` if the
+    class is not terminated.
+    """
+    negate = i < len(text) and text[i] == '^'
+    if negate:
+        i += 1
+
+    chars = []
+    while i < len(text) and text[i] != ']':
+        if text[i] == '\\' and i + 1 < len(text):
+            i += 1
+        chars.append(text[i])
+        i += 1
+    if i >= len(text):
+        return None
+
+    items = []
+    j = 0
+    while j < len(chars):
+        if j + 2 < len(chars) and chars[j + 1] == '-':
+            low, high = sorted((chars[j], chars[j + 2]))
+            items.append('{}-{}'.format(re.escape(low), re.escape(high)))
+            j += 3
+        else:
+            items.append(re.escape(chars[j]))
+            j += 1
+
+    if not items:
+        return i, '.' if negate else '(?!)'
+    return i, '[{}{}]'.format('^' if negate else '', ''.join(items))
+
+def _glob_literal(prefix, regex):
+    """Returns True if the pattern compiled to ``regex`` only matches ``prefix``."""
+    if isinstance(prefix, bytes):
+        return regex.pattern == b'(?s)' + re.escape(prefix) + b'\\Z'
+    return regex.pattern == '(?s)' + re.escape(prefix) + '\\Z'
+
+def _resolved(value):
+    future = tornado.concurrent.Future()
+    future.set_result(value)
+    return future
+
+def _failed(error):
+    future = tornado.concurrent.Future()
+    future.set_exception(error)
+    return future
+
+class PatternIndex(object):
+    """Pattern subscriptions, grouped by the literal prefix of each pattern.
+
+    A channel only needs to be matched against the patterns whose prefix it
+    starts with, which ``match`` finds with one dict lookup per distinct
+    prefix length, so publishing does not slow down with every pattern added.
+    """
+
+    def __init__(self):
+        self.patterns = {}
+        self._by_prefix = {}
+        self._prefix_lengths = collections.Counter()
+
+    def __contains__(self, pattern):
+        return pattern in self.patterns
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def subscribers(self, pattern):
+        """Returns the subscriber dict of ``pattern``, registering it if needed."""
+        if pattern in self.patterns:
+            return self.patterns[pattern][1]
+
+        prefix, regex = compile_glob(pattern)
+        subscribers = {}
+        self.patterns[pattern] = (prefix, subscribers)
+        self._by_prefix.setdefault(prefix, {})[pattern] = (regex, subscribers)
+        self._prefix_lengths[len(prefix)] += 1
+        return subscribers
+
+    def discard(self, pattern, subscriber):
+        if pattern not in self.patterns:
+            return
+
+        prefix, subscribers = self.patterns[pattern]
+        subscribers.pop(subscriber, None)
+        if subscribers:
+            return
+
+        del self.patterns[pattern]
+        bucket = self._by_prefix[prefix]
+        del bucket[pattern]
+        if not bucket:
+            del self._by_prefix[prefix]
+        self._prefix_lengths[len(prefix)] -= 1
+        if not self._prefix_lengths[len(prefix)]:
+            del self._prefix_lengths[len(prefix)]
+
+    def match(self, channel):
+        """Yields ``(pattern, subscribers)`` for every pattern matching ``channel``."""
+        by_prefix = self._by_prefix
+        for length in self._prefix_lengths:
+            if length > len(channel):
+                continue
+
+            bucket = by_prefix.get(channel[:length])
+            if bucket is None:
+                continue
+            for pattern, (regex, subscribers) in bucket.items():
+                if regex.match(channel):
+                    yield pattern, subscribers
+
+    def clear(self):
+        self.patterns.clear()
+        self._by_prefix.clear()
+        self._prefix_lengths.clear()
 
 class RedisCommands(enum.Enum):
+    PING = 'ping'
+    ECHO = 'echo'
     PUBLISH = 'publish'
     DEL = 'del'
     GET = 'get'
@@ -24,207 +222,2633 @@ class RedisCommands(enum.Enum):
     LRANGE = 'lrange'
     SADD = 'sadd'
     SMEMBERS = 'smembers'
+    TTL = 'ttl'
+    PTTL = 'pttl'
+    SELECT = 'select'
+    INFO = 'info'
+    TYPE = 'type'
+    MEMORY = 'memory'
+    LPUSH = 'lpush'
+    LPOP = 'lpop'
+    RPOP = 'rpop'
+    LLEN = 'llen'
+    LTRIM = 'ltrim'
+    BLPOP = 'blpop'
+    BRPOP = 'brpop'
+    ZADD = 'zadd'
+    ZREM = 'zrem'
+    ZSCORE = 'zscore'
+    ZINCRBY = 'zincrby'
+    ZCARD = 'zcard'
+    ZCOUNT = 'zcount'
+    ZRANK = 'zrank'
+    ZREVRANK = 'zrevrank'
+    ZRANGE = 'zrange'
+    ZREVRANGE = 'zrevrange'
+    ZRANGEBYSCORE = 'zrangebyscore'
+    ZREVRANGEBYSCORE = 'zrevrangebyscore'
+    ZREMRANGEBYSCORE = 'zremrangebyscore'
+    ZREMRANGEBYRANK = 'zremrangebyrank'
+    SCAN = 'scan'
+    KEYS = 'keys'
+    HSCAN = 'hscan'
+    SSCAN = 'sscan'
+    MULTI = 'multi'
+    EXEC = 'exec'
+    DISCARD = 'discard'
+    WATCH = 'watch'
+    UNWATCH = 'unwatch'
+    MGET = 'mget'
+    MSET = 'mset'
+    HMGET = 'hmget'
+    HDEL = 'hdel'
+    INCR = 'incr'
+    INCRBY = 'incrby'
+    HINCRBY = 'hincrby'
+
+class Clock(object):
+    """Wall clock used to compute and check key expiry deadlines."""
+
+    def time(self):
+        return time.time()
+
+class VirtualClock(Clock):
+    """Clock that only moves when told to, so TTLs can be tested without sleeping."""
+
+    def __init__(self, start=None):
+        self.now = time.time() if start is None else start
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+class ValueType(enum.Enum):
+    STRING = 'string'
+    HASH = 'hash'
+    LIST = 'list'
+    SET = 'set'
+    ZSET = 'zset'
+
+class CommandError(ValueError):
+    """Error reply with a Redis error code other than ``ERR``, such as ``WRONGTYPE``."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+def _wrong_type():
+    return CommandError('WRONGTYPE', 'Operation against a key holding the wrong kind of value')
+
+class Entry(object):
+    """Value stored under a key: its type, the value, its expiry ``deadline``
+    (a timestamp of the keyspace clock, or None) and its accounted ``size``."""
+
+    __slots__ = ('type', 'value', 'deadline', 'size')
+
+    def __init__(self, type, value, deadline=None, size=0):
+        self.type = type
+        self.value = value
+        self.deadline = deadline
+        self.size = size
+
+    def __eq__(self, other):
+        if not isinstance(other, Entry):
+            return NotImplemented
+        return (self.type, self.value, self.deadline) == (other.type, other.value, other.deadline)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Entry({!r}, {!r}, deadline={!r})'.format(self.type, self.value, self.deadline)
+
+# Rough per-key and per-element overheads of Redis' own structures.
+_ENTRY_OVERHEAD = 48
+_ELEMENT_OVERHEAD = 16
+
+def _scalar_size(value):
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return 8
+
+def memory_usage(key, entry, samples=5):
+    """Returns the approximate bytes used by ``entry``, as MEMORY USAGE does.
+
+    Container sizes are extrapolated from their first ``samples`` elements,
+    or from all of them when ``samples`` is 0.
+    """
+    size = _ENTRY_OVERHEAD + _scalar_size(key)
+    value = entry.value
+    if entry.type is ValueType.STRING:
+        return size + _scalar_size(value)
+    if not value:
+        return size
+
+    limit = samples or None
+    if entry.type is ValueType.HASH or entry.type is ValueType.ZSET:
+        sizes = [_scalar_size(field) + _scalar_size(item)
+                 for field, item in itertools.islice(value.items(), limit)]
+    else:
+        sizes = [_scalar_size(item) for item in itertools.islice(value, limit)]
+    return size + int(len(value) * (_ELEMENT_OVERHEAD + sum(sizes) / len(sizes)))
+
+class _Above(object):
+    """Sorts after any member, to bound ``(score, member)`` pairs by score."""
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+_ABOVE = _Above()
+
+class SortedList(object):
+    """Sorted sequence of unique, comparable items with positional access.
+
+    Items are kept in a list of sorted chunks of at most twice
+    ``CHUNK_SIZE`` items, plus the last item of each chunk and a Fenwick
+    tree of the chunk lengths. Inserts, removals and position lookups take
+    O(log n) bisections and bounded list moves, and slices only walk the
+    requested window. This is a skiplist's complexity with far smaller
+    constants in Python.
+    """
+
+    CHUNK_SIZE = 1000
+
+    def __init__(self, items=()):
+        self._chunks = []
+        self._maxes = []
+        self._tree = [0]
+        self._len = 0
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            for item in chunk:
+                yield item
+
+    def __contains__(self, item):
+        index = bisect.bisect_left(self._maxes, item)
+        if index == len(self._maxes):
+            return False
+        chunk = self._chunks[index]
+        return chunk[bisect.bisect_left(chunk, item)] == item
+
+    def copy(self):
+        other = SortedList()
+        other._chunks = [list(chunk) for chunk in self._chunks]
+        other._maxes = list(self._maxes)
+        other._tree = list(self._tree)
+        other._len = self._len
+        return other
+
+    def _rebuild_tree(self):
+        tree = [0]
+        tree.extend(len(chunk) for chunk in self._chunks)
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, index, delta):
+        tree = self._tree
+        index += 1
+        while index < len(tree):
+            tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, index):
+        """Returns the number of items in the chunks before chunk ``index``."""
+        tree = self._tree
+        total = 0
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+    def _locate(self, position):
+        """Returns the chunk and offset in it of the item at ``position``."""
+        tree = self._tree
+        index = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            following = index + step
+            if following < len(tree) and tree[following] <= position:
+                index = following
+                position -= tree[following]
+            step >>= 1
+        return index, position
+
+    def add(self, item):
+        chunks = self._chunks
+        maxes = self._maxes
+        self._len += 1
+        if not maxes:
+            chunks.append([item])
+            maxes.append(item)
+            self._rebuild_tree()
+            return
+
+        index = bisect.bisect_left(maxes, item)
+        if index == len(maxes):
+            index -= 1
+            chunk = chunks[index]
+            chunk.append(item)
+            maxes[index] = item
+        else:
+            chunk = chunks[index]
+            bisect.insort(chunk, item)
+
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            chunks[index:index + 1] = [chunk[:self.CHUNK_SIZE], chunk[self.CHUNK_SIZE:]]
+            maxes[index:index + 1] = [chunk[self.CHUNK_SIZE - 1], chunk[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(index, 1)
+
+    def remove(self, item):
+        """Removes ``item``, or raises a ValueError if it is not present."""
+        chunks = self._chunks
+        maxes = self._maxes
+        index = bisect.bisect_left(maxes, item)
+        if index == len(maxes):
+            raise ValueError('{!r} is not in the list'.format(item))
+        chunk = chunks[index]
+        position = bisect.bisect_left(chunk, item)
+        if chunk[position] != item:
+            raise ValueError('{!r} is not in the list'.format(item))
+        del chunk[position]
+        self._len -= 1
+        if chunk:
+            maxes[index] = chunk[-1]
+            self._tree_add(index, -1)
+        else:
+            del chunks[index]
+            del maxes[index]
+            self._rebuild_tree()
+
+    def position(self, bound):
+        """Returns the number of items sorting before ``bound``."""
+        index = bisect.bisect_left(self._maxes, bound)
+        if index == len(self._maxes):
+            return self._len
+        return self._prefix(index) + bisect.bisect_left(self._chunks[index], bound)
+
+    def islice(self, start, stop, reverse=False):
+        """Yields the items from position ``start`` to ``stop`` excluded,
+        both clamped to the list. With ``reverse`` positions count from the
+        end and items come last first."""
+        start = max(start, 0)
+        count = min(stop, self._len) - start
+        if count <= 0:
+            return
+
+        chunks = self._chunks
+        if not reverse:
+            index, offset = self._locate(start)
+            while count > 0:
+                part = chunks[index][offset:offset + count]
+                for item in part:
+                    yield item
+                count -= len(part)
+                index += 1
+                offset = 0
+            return
+
+        index, offset = self._locate(self._len - 1 - start)
+        while count > 0:
+            first = max(offset - count + 1, 0)
+            part = chunks[index][first:offset + 1]
+            for item in reversed(part):
+                yield item
+            count -= len(part)
+            index -= 1
+            offset = len(chunks[index]) - 1
+
+def _member_order(member):
+    # Members of different types do not compare, so ties on score are
+    # broken by type name first. Numbers all share one, as 1 and 1.0 are
+    # the same member.
+    if isinstance(member, (int, float)):
+        return 'number', member
+    return type(member).__name__, member
+
+class SortedSet(object):
+    """Members ordered by score, then by member.
+
+    ``scores`` maps members to scores and a ``SortedList`` of
+    ``(score, (type, member))`` pairs keeps the order, so inserts, removals,
+    rank lookups and locating either end of a range take O(log n) and
+    range queries only walk the requested window.
+    """
+
+    def __init__(self, items=()):
+        self.scores = {}
+        self._order = SortedList()
+        for member, score in items:
+            self.add(member, score)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, member):
+        return member in self.scores
+
+    def __iter__(self):
+        for _, (_, member) in self._order:
+            yield member
+
+    def __eq__(self, other):
+        if not isinstance(other, SortedSet):
+            return NotImplemented
+        return list(self.items()) == list(other.items())
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'SortedSet({!r})'.format(list(self.items()))
+
+    def copy(self):
+        other = SortedSet()
+        other.scores = dict(self.scores)
+        other._order = self._order.copy()
+        return other
+
+    def items(self):
+        """Yields ``(member, score)`` pairs in order."""
+        for score, (_, member) in self._order:
+            yield member, score
+
+    def score(self, member):
+        return self.scores.get(member)
+
+    def add(self, member, score):
+        """Sets the score of ``member`` and returns True if it is new."""
+        current = self.scores.get(member)
+        if current == score:
+            return False
+
+        # The new pair goes in first, so a failure leaves the set as it was.
+        order = _member_order(member)
+        self._order.add((score, order))
+        if current is not None:
+            self._order.remove((current, order))
+        self.scores[member] = score
+        return current is None
+
+    def remove(self, member):
+        """Removes ``member`` and returns True if it was present."""
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        self._order.remove((score, _member_order(member)))
+        return True
+
+    def rank(self, member, reverse=False):
+        """Returns the 0-based rank of ``member``, or None if it is absent."""
+        score = self.scores.get(member)
+        if score is None:
+            return None
+
+        rank = self._order.position((score, _member_order(member)))
+        return len(self.scores) - 1 - rank if reverse else rank
+
+    def range_by_rank(self, start, stop, reverse=False):
+        """Yields ``(member, score)`` from 0-based rank ``start`` to ``stop``
+        included. With ``reverse`` ranks count from the highest score."""
+        for score, (_, member) in self._order.islice(start, stop + 1, reverse):
+            yield member, score
+
+    def _count_below(self, score, inclusive):
+        """Returns the number of members scoring less than ``score``, or at most with ``inclusive``."""
+        return self._order.position((score, _ABOVE) if inclusive else (score,))
+
+    def count(self, low, high, low_exclusive=False, high_exclusive=False):
+        """Returns the number of members scoring between ``low`` and ``high``."""
+        count = (self._count_below(high, not high_exclusive)
+                 - self._count_below(low, low_exclusive))
+        return max(count, 0)
+
+    def range_by_score(self, low, high, low_exclusive=False, high_exclusive=False,
+                       reverse=False, offset=0, count=None):
+        """Yields ``(member, score)`` scoring between ``low`` and ``high``,
+        from the lowest score or, with ``reverse``, from the highest,
+        skipping ``offset`` of them and stopping after ``count``."""
+        below = self._count_below(low, low_exclusive)
+        up_to = self._count_below(high, not high_exclusive)
+        if up_to <= below or offset >= up_to - below:
+            return
+
+        window = up_to - below - offset
+        if count is not None and count >= 0:
+            window = min(window, count)
+        if reverse:
+            start = len(self.scores) - up_to + offset
+        else:
+            start = below + offset
+        for item in self.range_by_rank(start, start + window - 1, reverse):
+            yield item
+
+class _LRUTracker(object):
+    """Keys from least to most recently used."""
+
+    def __init__(self, keys=()):
+        self.keys = collections.OrderedDict.fromkeys(keys)
+
+    def touch(self, key):
+        try:
+            self.keys.move_to_end(key)
+        except KeyError:
+            self.keys[key] = None
+
+    def discard(self, key):
+        self.keys.pop(key, None)
+
+    def victim(self):
+        return next(iter(self.keys), None)
+
+class _LFUTracker(object):
+    """Access counts with O(1) updates: keys are grouped by count, each group
+    ordered from least to most recently used."""
+
+    def __init__(self, keys=()):
+        self.counts = {}
+        self.groups = collections.defaultdict(collections.OrderedDict)
+        self.min_count = 1
+        for key in keys:
+            self.touch(key)
+
+    def touch(self, key):
+        count = self.counts.get(key, 0)
+        if count:
+            group = self.groups[count]
+            del group[key]
+            if not group:
+                del self.groups[count]
+        self.counts[key] = count + 1
+        self.groups[count + 1][key] = None
+        if count == 0 or count == self.min_count and count not in self.groups:
+            self.min_count = count + 1
+
+    def discard(self, key):
+        count = self.counts.pop(key, None)
+        if count is not None:
+            group = self.groups[count]
+            del group[key]
+            if not group:
+                del self.groups[count]
+
+    def victim(self):
+        if not self.groups:
+            return None
+        if self.min_count not in self.groups:
+            self.min_count = min(self.groups)
+        return next(iter(self.groups[self.min_count]))
+
+def _index_item(key):
+    # Keys of different types do not compare, so the key index orders them
+    # by type name first.
+    return type(key).__name__, key
+
+def _glob_matches(regex, key):
+    """Returns True if ``key`` matches ``regex``, False for a key of another type."""
+    try:
+        return regex.match(key) is not None
+    except TypeError:
+        return False
+
+class _KeyLog(object):
+    """Keys in creation order, each numbered with a sequence number that
+    never changes while the key exists.
+
+    Deleted keys leave holes that are compacted away once they outnumber the
+    live keys, which keeps the sequence numbers of the others. A cursor is
+    the sequence number to resume from, so it stays valid whatever is added
+    or deleted in between.
+    """
+
+    def __init__(self, keys=()):
+        self.seq = {}
+        self.seqs = []
+        self.keys = []
+        self.holes = 0
+        self.next_seq = 1
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        self.seq[key] = self.next_seq
+        self.seqs.append(self.next_seq)
+        self.keys.append(key)
+        self.next_seq += 1
+
+    def discard(self, key):
+        seq = self.seq.pop(key, None)
+        if seq is None:
+            return
+
+        self.keys[bisect.bisect_left(self.seqs, seq)] = _HOLE
+        self.holes += 1
+        if self.holes > len(self.seq) + 64:
+            live = [(seq, key) for seq, key in zip(self.seqs, self.keys) if key is not _HOLE]
+            self.seqs = [seq for seq, _ in live]
+            self.keys = [key for _, key in live]
+            self.holes = 0
+
+    def scan(self, cursor, count):
+        """Returns the next cursor, 0 at the end, and the keys of the next
+        ``count`` slots from ``cursor``, holes included."""
+        start = bisect.bisect_left(self.seqs, cursor)
+        stop = start + count
+        keys = [key for key in self.keys[start:stop] if key is not _HOLE]
+        return (self.seqs[stop] if stop < len(self.seqs) else 0), keys
+
+_HOLE = object()
+
+class Keyspace(object):
+    """Synchronous key/value storage behind the mock clients.
+
+    ``data`` maps keys to ``Entry`` records. Command handlers go through
+    these helpers instead of issuing nested ``call`` round-trips; the typed
+    getters raise a ``WRONGTYPE`` error for a key of another type.
+
+    Expired keys are dropped lazily when read, and actively by
+    ``expire_cycle``, which pops due keys from a min-heap of deadlines.
+    Each cycle pops at most ``active_expire_limit`` deadlines, stale ones
+    included, so a burst of deadlines or of rewritten TTLs is spread over
+    several ticks.
+
+    ``snapshot`` and ``restore`` only copy the key table. Hashes, lists and
+    sets stay shared with the snapshot until they are first modified in
+    place, at which point that one value is copied.
+
+    ``used_memory`` approximates the memory Redis would use for the data.
+    With ``maxmemory`` set, writes first evict keys according to
+    ``maxmemory_policy`` until the keyspace fits, or fail with an ``OOM``
+    error under ``noeviction`` or when no key can be evicted.
+    ``allkeys-lfu`` counts every access exactly instead of using Redis'
+    decaying logarithmic counter.
+
+    ``watch`` starts counting the modifications of a key, which ``version``
+    returns, for WATCH. Only watched keys are counted, so keys nobody
+    watches cost a single check per write.
+
+    ``scan`` walks the keys in creation order from a log built on the first
+    call. ``keys`` serves patterns with a literal prefix from a sorted index
+    of the keys, also built on first use. Both are then maintained as keys
+    are created and deleted, so workloads that never enumerate keys do not
+    pay for them.
+    """
+
+    active_expire_limit = 200
+
+    MAXMEMORY_POLICIES = ('noeviction', 'allkeys-lru', 'allkeys-lfu', 'volatile-ttl')
+
+    # Hashes and sets up to this size are scanned in a single call, as
+    # Redis does for its compact encodings.
+    scan_compact_size = 128
+    # Number of HSCAN and SSCAN iterations in progress that are remembered.
+    scan_cursors = 1024
+
+    def __init__(self, data=None, clock=None, maxmemory=0, maxmemory_policy='noeviction'):
+        self.data = {} if data is None else data
+        self.clock = Clock() if clock is None else clock
+        self.expired_keys = 0
+        self.expire_cycles = 0
+        self.expire_cycle_time = 0.0
+        self.evicted_keys = 0
+        self.maxmemory = maxmemory
+        self._used_memory = 0
+        self._resized = set()
+        self._shared_resized = None
+        self._blocked = {}
+        self._key_log = None
+        self._key_index = None
+        self._scans = collections.OrderedDict()
+        self._versions = {}
+        self._scan_tokens = itertools.count(1)
+        self._tracker = None
+        self._expires = []
+        self._expires_counter = itertools.count()
+        self._shared = None
+        self.maxmemory_policy = maxmemory_policy
+
+    @property
+    def maxmemory_policy(self):
+        return self._maxmemory_policy
+
+    @maxmemory_policy.setter
+    def maxmemory_policy(self, policy):
+        if policy not in self.MAXMEMORY_POLICIES:
+            raise ValueError('Invalid maxmemory policy.')
+
+        self._maxmemory_policy = policy
+        if policy == 'allkeys-lru':
+            self._tracker = _LRUTracker(self.data)
+        elif policy == 'allkeys-lfu':
+            self._tracker = _LFUTracker(self.data)
+        else:
+            self._tracker = None
+
+    @property
+    def used_memory(self):
+        self._settle()
+        return self._used_memory
+
+    def lookup(self, key):
+        """Returns the ``Entry`` of ``key``, dropping it if it expired."""
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry.deadline is not None and self.clock.time() > entry.deadline:
+            self._remove(key)
+            self.expired_keys += 1
+            return None
+
+        if self._tracker is not None:
+            self._tracker.touch(key)
+        return entry
+
+    def get(self, key):
+        entry = self.lookup(key)
+        return None if entry is None else entry.value
+
+    def put(self, key, value, ttl=None, type=ValueType.STRING):
+        if self.maxmemory:
+            self._make_room()
+
+        deadline = None if ttl is None else self.clock.time() + ttl
+        self._store(key, Entry(type, value, deadline))
+        if deadline is not None:
+            self._index_expiry(key, deadline)
+
+    def put_many(self, items):
+        """Stores the ``(key, value)`` string pairs of ``items`` without TTLs."""
+        if self.maxmemory:
+            self._make_room()
+
+        store = self._store
+        for key, value in items:
+            store(key, Entry(ValueType.STRING, value))
+
+    def incr(self, key, delta):
+        """Adds ``delta`` to the integer stored at ``key``, 0 if it does not
+        exist, and returns the result.
+
+        The entry is updated in place unless it is shared with a snapshot.
+        """
+        if self.maxmemory:
+            self._make_room()
+
+        entry = self.lookup(key)
+        if entry is None:
+            self._store(key, Entry(ValueType.STRING, _add_integers(0, delta)))
+            return delta
+        if entry.type is not ValueType.STRING:
+            raise _wrong_type()
+
+        value = _add_integers(_parse_int(entry.value), delta)
+        if self._shared is not None and self._shared.get(key) is entry:
+            entry = self.data[key] = Entry(ValueType.STRING, value, entry.deadline, entry.size)
+        else:
+            entry.value = value
+        self._resized.add(key)
+        if self._versions:
+            self._touch(key)
+        return value
+
+    def _store(self, key, entry):
+        entry.size = memory_usage(key, entry)
+        previous = self.data.get(key)
+        if previous is not None:
+            self._used_memory -= previous.size
+        else:
+            if self._key_log is not None:
+                self._key_log.add(key)
+            if self._key_index is not None:
+                self._key_index.add(_index_item(key))
+        self._used_memory += entry.size
+        self.data[key] = entry
+        if self._tracker is not None:
+            self._tracker.touch(key)
+        if self._versions:
+            self._touch(key)
+
+    def _remove(self, key):
+        entry = self.data.pop(key)
+        self._used_memory -= entry.size
+        if self._tracker is not None:
+            self._tracker.discard(key)
+        if self._key_log is not None:
+            self._key_log.discard(key)
+        if self._key_index is not None and _index_item(key) in self._key_index:
+            self._key_index.remove(_index_item(key))
+        if self._versions:
+            self._touch(key)
+
+    def delete(self, key):
+        if self.lookup(key) is None:
+            return False
+
+        self._remove(key)
+        return True
+
+    def expire(self, key, ttl):
+        entry = self.lookup(key)
+        if entry is None:
+            return False
+
+        deadline = self.clock.time() + ttl
+        self.data[key] = Entry(entry.type, entry.value, deadline, entry.size)
+        self._index_expiry(key, deadline)
+        if self._versions:
+            self._touch(key)
+        return True
+
+    def persist(self, key):
+        entry = self.lookup(key)
+        if entry is None:
+            return False
+
+        if entry.deadline is not None:
+            self.data[key] = Entry(entry.type, entry.value, None, entry.size)
+            if self._versions:
+                self._touch(key)
+        return True
+
+    def clear(self):
+        self.data.clear()
+        self._used_memory = 0
+        self._resized.clear()
+        self._shared_resized = None
+        self._expires = []
+        self._shared = None
+        self._replaced_all()
+        self.maxmemory_policy = self._maxmemory_policy
+
+    def _replaced_all(self):
+        """Drops the key enumeration state and bumps every watched key,
+        once the whole content was replaced."""
+        self._key_log = None
+        self._key_index = None
+        self._scans.clear()
+        for key in self._versions:
+            self._touch(key)
+
+    def watch(self, key):
+        """Starts counting the modifications of ``key``; see ``version``."""
+        state = self._versions.get(key)
+        if state is None:
+            state = self._versions[key] = [0, 0]
+        state[1] += 1
+
+    def unwatch(self, key):
+        state = self._versions[key]
+        state[1] -= 1
+        if not state[1]:
+            del self._versions[key]
+
+    def version(self, key):
+        """Returns the number of modifications of watched ``key`` since it
+        was first watched, an expiry included."""
+        self._expire_if_due(key, self.clock.time())
+        return self._versions[key][0]
+
+    def _touch(self, key):
+        state = self._versions.get(key)
+        if state is not None:
+            state[0] += 1
+
+    def info(self):
+        """Returns the number of keys, of keys with a TTL and of keys of each type."""
+        fields = collections.OrderedDict.fromkeys(
+            ('keys', 'expires', 'strings', 'hashes', 'lists', 'sets', 'zsets'), 0)
+        counts = collections.Counter(entry.type for entry in self.data.values())
+        fields['keys'] = len(self.data)
+        fields['expires'] = sum(1 for entry in self.data.values() if entry.deadline is not None)
+        fields['strings'] = counts[ValueType.STRING]
+        fields['hashes'] = counts[ValueType.HASH]
+        fields['lists'] = counts[ValueType.LIST]
+        fields['sets'] = counts[ValueType.SET]
+        fields['zsets'] = counts[ValueType.ZSET]
+        return fields
+
+    def snapshot(self):
+        """Returns a frozen copy of the keyspace."""
+        snapshot = Snapshot(self.data.copy(), list(self._expires),
+                            self._used_memory, self._freeze_resized())
+        self._shared = snapshot.data
+        return snapshot
+
+    def restore(self, snapshot):
+        """Replaces the content of the keyspace by that of ``snapshot``."""
+        self.data.clear()
+        self.data.update(snapshot.data)
+        self._used_memory = snapshot.used_memory
+        self._resized = set()
+        self._shared_resized = snapshot.resized
+        self._expires = list(snapshot.expires)
+        self._shared = snapshot.data
+        self._replaced_all()
+        self.maxmemory_policy = self._maxmemory_policy
+
+    def load(self, entries):
+        """Replaces the content of the keyspace by the ``(key, Entry)`` pairs
+        of ``entries``, whose ``size`` must already be set.
+
+        Unlike ``put``, this neither measures nor evicts, and the expiry
+        heap is built once at the end, so it suits loading large datasets.
+        """
+        self.clear()
+        data = self.data
+        counter = self._expires_counter
+        expires = []
+        used_memory = 0
+        for key, entry in entries:
+            data[key] = entry
+            used_memory += entry.size
+            if entry.deadline is not None:
+                expires.append((entry.deadline, next(counter), key))
+
+        heapq.heapify(expires)
+        self._expires = expires
+        self._used_memory = used_memory
+        self.maxmemory_policy = self._maxmemory_policy
+
+    def _index_expiry(self, key, deadline):
+        # Entries are never removed from the heap when a key is deleted,
+        # persisted or given a new TTL; they are skipped once popped.
+        # Rebuild it when those stale entries start to dominate.
+        if len(self._expires) > 2 * len(self.data) + 64:
+            self._expires = [item for item in self._expires
+                             if self._is_due_entry(item[2], item[0])]
+            heapq.heapify(self._expires)
+
+        heapq.heappush(self._expires, (deadline, next(self._expires_counter), key))
+
+    def _is_due_entry(self, key, deadline):
+        entry = self.data.get(key)
+        return entry is not None and entry.deadline == deadline
+
+    def expire_cycle(self, limit=None):
+        """Pops up to ``limit`` due deadlines, including those of keys since
+        deleted or given another TTL, and returns how many keys were deleted."""
+        limit = self.active_expire_limit if limit is None else limit
+        start = time.perf_counter()
+        now = self.clock.time()
+        expired = 0
+
+        expires = self._expires
+        while expires and limit > 0 and expires[0][0] < now:
+            limit -= 1
+            deadline, _, key = heapq.heappop(expires)
+            if self._is_due_entry(key, deadline):
+                self._remove(key)
+                expired += 1
+
+        self.expired_keys += expired
+        self.expire_cycles += 1
+        self.expire_cycle_time += time.perf_counter() - start
+        return expired
+
+    def ttl(self, key):
+        """Returns the seconds ``key`` has left to live, -1 if it has no TTL
+        or -2 if it does not exist."""
+        entry = self.lookup(key)
+        if entry is None:
+            return -2
+        if entry.deadline is None:
+            return -1
+
+        return max(entry.deadline - self.clock.time(), 0)
+
+    def memory_usage(self, key, samples=5):
+        """Returns the approximate bytes used by ``key``, or None if it does not exist."""
+        entry = self.lookup(key)
+        return None if entry is None else memory_usage(key, entry, samples)
+
+    def _settle(self):
+        # Containers are modified in place by the command handlers after
+        # ``_get_typed`` returns them, so their size is only measured again
+        # when the memory usage is next needed. Entries still shared with a
+        # snapshot are replaced rather than updated, to leave it untouched.
+        resized = self._resized
+        if self._shared_resized:
+            resized = itertools.chain(self._shared_resized, resized)
+        for key in resized:
+            entry = self.data.get(key)
+            if entry is None:
+                continue
+            if self._shared is not None and self._shared.get(key) is entry:
+                entry = self.data[key] = Entry(entry.type, entry.value, entry.deadline, entry.size)
+            size = memory_usage(key, entry)
+            self._used_memory += size - entry.size
+            entry.size = size
+        self._resized.clear()
+        self._shared_resized = None
+
+    def _freeze_resized(self):
+        """Returns the keys whose size is stale, as a set shared with a snapshot."""
+        if self._resized:
+            if self._shared_resized:
+                self._resized.update(self._shared_resized)
+            self._shared_resized = self._resized
+            self._resized = set()
+        return self._shared_resized or ()
+
+    def _make_room(self):
+        """Evicts keys until the keyspace fits in ``maxmemory``, as Redis
+        does before running a write command."""
+        self._settle()
+        while self._used_memory > self.maxmemory:
+            key = self._eviction_victim()
+            if key is None:
+                raise CommandError('OOM', "command not allowed when used memory > 'maxmemory'.")
+            self._remove(key)
+            self.evicted_keys += 1
+
+    def _eviction_victim(self):
+        if self._tracker is not None:
+            return self._tracker.victim()
+        if self._maxmemory_policy == 'volatile-ttl':
+            while self._expires:
+                deadline, _, key = heapq.heappop(self._expires)
+                if self._is_due_entry(key, deadline):
+                    return key
+        return None
+
+    def _get_typed(self, key, value_type, factory, create, write=False):
+        """Returns the ``value_type`` value of ``key``.
+
+        With ``write`` the value is about to be modified: it is copied first
+        if it is still shared with a snapshot. ``create`` implies ``write``
+        and creates the value if needed.
+        """
+        if create and self.maxmemory:
+            self._make_room()
+
+        entry = self.lookup(key)
+        if entry is None:
+            if not create:
+                return None
+            value = factory()
+            self._store(key, Entry(value_type, value))
+        elif entry.type is not value_type:
+            raise _wrong_type()
+        elif not (create or write):
+            return entry.value
+        else:
+            value = entry.value
+            shared = None if self._shared is None else self._shared.get(key)
+            if shared is not None and shared.value is value:
+                value = value.copy()
+                self.data[key] = Entry(value_type, value, entry.deadline, entry.size)
+            if self._versions:
+                self._touch(key)
+
+        self._resized.add(key)
+        return value
+
+    def get_string(self, key):
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+        if entry.type is not ValueType.STRING:
+            raise _wrong_type()
+        return entry.value
+
+    def get_hash(self, key, create=False, write=False):
+        return self._get_typed(key, ValueType.HASH, dict, create, write)
+
+    def get_list(self, key, create=False, write=False):
+        """Returns the list of ``key``, a ``collections.deque``."""
+        return self._get_typed(key, ValueType.LIST, collections.deque, create, write)
+
+    def block_pop(self, keys, left, timeout=None):
+        """Returns a Future of ``[key, value]`` once an element can be popped
+        from one of the lists ``keys``, or of None after ``timeout`` seconds.
+
+        Waiters are served in the order they blocked, by ``serve_blocked``.
+        """
+        future = tornado.concurrent.Future()
+        waiter = (future, left)
+        for key in keys:
+            self._blocked.setdefault(key, collections.deque()).append(waiter)
+
+        def unregister(future):
+            for key in keys:
+                waiters = self._blocked.get(key)
+                if waiters is None:
+                    continue
+                try:
+                    waiters.remove(waiter)
+                except ValueError:
+                    pass
+                if not waiters:
+                    del self._blocked[key]
+
+        future.add_done_callback(unregister)
+        if timeout:
+            io_loop = tornado.ioloop.IOLoop.current()
+            handle = io_loop.call_later(
+                timeout, lambda: future.done() or future.set_result(None))
+            future.add_done_callback(lambda future: io_loop.remove_timeout(handle))
+        return future
+
+    def serve_blocked(self, key):
+        """Hands elements pushed to list ``key`` to the clients blocked on it."""
+        waiters = self._blocked.get(key)
+        if not waiters:
+            return
+
+        values = self.get_list(key, write=True)
+        while waiters and values:
+            future, left = waiters.popleft()
+            if future.done():
+                continue
+            future.set_result([key, values.popleft() if left else values.pop()])
+        if not waiters:
+            del self._blocked[key]
+        if not values:
+            self.delete(key)
+
+    def get_set(self, key, create=False):
+        return self._get_typed(key, ValueType.SET, set, create)
+
+    def _expire_if_due(self, key, now):
+        """Deletes ``key`` and returns True if it expired, without counting an access."""
+        entry = self.data.get(key)
+        if entry is None or entry.deadline is None or now <= entry.deadline:
+            return False
+
+        self._remove(key)
+        self.expired_keys += 1
+        return True
+
+    def scan(self, cursor, count=10, match=None, type=None):
+        """Returns the next cursor, 0 once done, and a batch of keys.
+
+        Each call visits ``count`` slots of the key log, so a batch may hold
+        fewer keys, or none, before the end. Keys that exist during the
+        whole iteration are returned exactly once, whatever is created or
+        deleted in between. ``match`` is a glob pattern and ``type`` a
+        ``ValueType`` the returned keys must have.
+        """
+        if self._key_log is None:
+            self._key_log = _KeyLog(self.data)
+
+        cursor, keys = self._key_log.scan(cursor, count)
+        regex = None if match is None else compile_glob(match)[1]
+        now = self.clock.time()
+        batch = []
+        for key in keys:
+            if self._expire_if_due(key, now):
+                continue
+            if type is not None and self.data[key].type is not type:
+                continue
+            if regex is not None and not _glob_matches(regex, key):
+                continue
+            batch.append(key)
+        return cursor, batch
+
+    def keys(self, pattern):
+        """Returns the keys matching the glob ``pattern``.
+
+        A pattern without wildcards is a single lookup and one with a
+        literal prefix only visits the keys starting with it.
+        """
+        prefix, regex = compile_glob(pattern)
+        if _glob_literal(prefix, regex):
+            candidates = (prefix,) if prefix in self.data else ()
+        elif prefix:
+            candidates = self._prefixed(prefix)
+        else:
+            candidates = list(self.data)
+
+        now = self.clock.time()
+        matched = []
+        expired = []
+        for key in candidates:
+            entry = self.data[key]
+            if entry.deadline is not None and now > entry.deadline:
+                expired.append(key)
+            elif _glob_matches(regex, key):
+                matched.append(key)
+
+        for key in expired:
+            self._expire_if_due(key, now)
+        return matched
+
+    def _prefixed(self, prefix):
+        if self._key_index is None:
+            self._key_index = SortedList(_index_item(key) for key in self.data)
+
+        index = self._key_index
+        kind = _index_item(prefix)[0]
+        keys = []
+        for item_kind, key in index.islice(index.position(_index_item(prefix)), len(index)):
+            if item_kind != kind or not key.startswith(prefix):
+                break
+            keys.append(key)
+        return keys
+
+    def scan_members(self, key, members, cursor, count=10):
+        """Returns the next cursor, 0 once done, and a batch of the members
+        of the hash or set ``members`` stored at ``key``.
+
+        Containers up to ``scan_compact_size`` are returned in one batch.
+        Larger ones are walked over a copy of their members taken by the
+        first call, skipping members deleted since; members added during
+        the iteration may be missed, as Redis allows. A cursor holds the
+        iteration number and the position in it, so it can be replayed.
+        """
+        if cursor == 0 and len(members) <= self.scan_compact_size:
+            return 0, list(members)
+
+        if cursor == 0:
+            token = next(self._scan_tokens)
+            self._scans[token] = (key, list(members))
+            while len(self._scans) > self.scan_cursors:
+                self._scans.popitem(last=False)
+            position = 0
+        else:
+            token, position = cursor >> 32, cursor & 0xffffffff
+            if self._scans.get(token, (None,))[0] != key:
+                raise ValueError('invalid cursor')
+
+        self._scans.move_to_end(token)
+        snapshot = self._scans[token][1]
+        stop = position + count
+        batch = [member for member in snapshot[position:stop] if member in members]
+        if stop >= len(snapshot):
+            del self._scans[token]
+            return 0, batch
+        return (token << 32) | stop, batch
+
+    def get_zset(self, key, create=False, write=False):
+        """Returns the sorted set of ``key``, a ``SortedSet``."""
+        return self._get_typed(key, ValueType.ZSET, SortedSet, create, write)
+
+class Snapshot(object):
+    """Frozen copy of a keyspace, see ``Keyspace.snapshot``."""
+
+    def __init__(self, data, expires, used_memory=0, resized=()):
+        self.data = data
+        self.expires = expires
+        self.used_memory = used_memory
+        self.resized = resized
+
+    def __len__(self):
+        return len(self.data)
+
+class MockRedis(object):
+    """An in-memory Redis instance: numbered keyspaces and pub/sub registries.
+
+    Clients bind to the instance passed as their ``redis`` argument, or else
+    to the active one (see ``activate``), or else to a process-wide default.
+    Keyspaces are created on first use, so a new instance costs O(1)
+    whatever the size of the previous one.
+
+    Setting ``latency_model`` to a ``latency.LatencyModel`` delays the
+    replies of every command dispatched on the instance.
+
+    ``executed_transactions`` and ``aborted_transactions`` count the EXECs
+    that ran and those aborted because a watched key changed, from which
+    the retries of an optimistic-locking loop follow.
+    """
+
+    active_expire_interval = 0.1
+
+    def __init__(self, clock=None, databases=16):
+        self._clock = Clock() if clock is None else clock
+        self.databases = databases
+        self.keyspaces = {}
+        self.channels = collections.defaultdict(dict)
+        self.patterns = PatternIndex()
+        self.command_stats = None
+        self.latency_model = None
+        self.delivered_messages = 0
+        self.dropped_messages = 0
+        self.executed_transactions = 0
+        self.aborted_transactions = 0
+        self._maxmemory = 0
+        self._maxmemory_policy = 'noeviction'
+        self._active_expire = None
+
+    @property
+    def clock(self):
+        return self._clock
+
+    @clock.setter
+    def clock(self, clock):
+        self._clock = clock
+        for keyspace in self.keyspaces.values():
+            keyspace.clock = clock
+
+    @property
+    def maxmemory(self):
+        """Memory limit in bytes of each database, 0 for none."""
+        return self._maxmemory
+
+    @maxmemory.setter
+    def maxmemory(self, maxmemory):
+        self._maxmemory = maxmemory
+        for keyspace in self.keyspaces.values():
+            keyspace.maxmemory = maxmemory
+
+    @property
+    def maxmemory_policy(self):
+        return self._maxmemory_policy
+
+    @maxmemory_policy.setter
+    def maxmemory_policy(self, policy):
+        if policy not in Keyspace.MAXMEMORY_POLICIES:
+            raise ValueError('Invalid maxmemory policy.')
+
+        self._maxmemory_policy = policy
+        for keyspace in self.keyspaces.values():
+            keyspace.maxmemory_policy = policy
+
+    @property
+    def expired_keys(self):
+        return sum(keyspace.expired_keys for keyspace in self.keyspaces.values())
+
+    @property
+    def evicted_keys(self):
+        return sum(keyspace.evicted_keys for keyspace in self.keyspaces.values())
+
+    @property
+    def used_memory(self):
+        return sum(keyspace.used_memory for keyspace in self.keyspaces.values())
+
+    def enable_stats(self):
+        """Starts recording per-command statistics and returns the ``CommandStats``.
+
+        Recording is off by default: it times every command, whereas
+        disabled it costs a single attribute check per command. Commands
+        queued in a transaction are recorded when EXEC runs them.
+        """
+        if self.command_stats is None:
+            self.command_stats = stats.CommandStats()
+        return self.command_stats
+
+    def disable_stats(self):
+        self.command_stats = None
+
+    def info(self, section=None):
+        """Returns server statistics as a dict of section name to fields, as INFO does.
+
+        Sections are ``memory``, ``stats``, ``keyspace`` and, while
+        statistics are enabled, ``commandstats``. With ``section`` only that one is returned.
+        """
+        sections = collections.OrderedDict()
+        sections['memory'] = collections.OrderedDict([
+            ('used_memory', self.used_memory),
+            ('maxmemory', self._maxmemory),
+            ('maxmemory_policy', self._maxmemory_policy),
+        ])
+        sections['stats'] = collections.OrderedDict([
+            ('total_commands_processed',
+             0 if self.command_stats is None else self.command_stats.calls()),
+            ('expired_keys', self.expired_keys),
+            ('evicted_keys', self.evicted_keys),
+            ('pubsub_channels', sum(1 for subscribers in self.channels.values() if subscribers)),
+            ('pubsub_patterns', len(self.patterns)),
+            ('pubsub_messages_delivered', self.delivered_messages),
+            ('pubsub_messages_dropped', self.dropped_messages),
+            ('transactions_executed', self.executed_transactions),
+            ('transactions_aborted', self.aborted_transactions),
+        ])
+
+        keyspace_info = collections.OrderedDict()
+        for index in sorted(self.keyspaces):
+            fields = self.keyspaces[index].info()
+            if fields['keys']:
+                keyspace_info['db{}'.format(index)] = fields
+        sections['keyspace'] = keyspace_info
+
+        if self.command_stats is not None:
+            sections['commandstats'] = collections.OrderedDict(
+                ('cmdstat_{}'.format(name), stat.as_dict())
+                for name, stat in sorted(self.command_stats.commands.items()))
+
+        if section is None:
+            return sections
+        return sections.get(section.lower(), {})
+
+    def db(self, index=0):
+        """Returns the keyspace of database ``index``."""
+        keyspace = self.keyspaces.get(index)
+        if keyspace is None:
+            if not isinstance(index, int) or not 0 <= index < self.databases:
+                raise ValueError('DB index is out of range')
+            keyspace = self.keyspaces[index] = Keyspace(
+                clock=self._clock, maxmemory=self._maxmemory,
+                maxmemory_policy=self._maxmemory_policy)
+
+        return keyspace
+
+    def activate(self):
+        """Makes new clients bind to this instance in the current context.
+
+        Returns a token for ``deactivate``.
+        """
+        return _current_redis.set(self)
+
+    def deactivate(self, token):
+        _current_redis.reset(token)
+
+    def clear(self):
+        self.channels.clear()
+        self.patterns.clear()
+        for keyspace in self.keyspaces.values():
+            keyspace.clear()
+
+    def snapshot(self):
+        """Returns a dict of database index to ``Snapshot`` of every keyspace."""
+        return {index: keyspace.snapshot() for index, keyspace in self.keyspaces.items()}
+
+    def restore(self, snapshot):
+        """Restores the keyspaces from a ``snapshot`` result, emptying the others."""
+        for index, keyspace in self.keyspaces.items():
+            if index not in snapshot:
+                keyspace.clear()
+        for index, keyspace_snapshot in snapshot.items():
+            self.db(index).restore(keyspace_snapshot)
+
+    def fork(self, clock=None):
+        """Returns a new instance starting from a snapshot of this one."""
+        redis = MockRedis(clock=clock, databases=self.databases)
+        redis.restore(self.snapshot())
+        return redis
+
+    def expire_cycle(self):
+        return sum(keyspace.expire_cycle() for keyspace in list(self.keyspaces.values()))
+
+    def start_active_expire(self):
+        """Runs ``expire_cycle`` every ``active_expire_interval`` seconds on the current IOLoop.
+
+        This is the equivalent of the Redis server cron.
+        """
+        if self._active_expire is not None:
+            return
+
+        self._active_expire = tornado.ioloop.PeriodicCallback(
+            self.expire_cycle, self.active_expire_interval * 1000)
+        self._active_expire.start()
+
+    def stop_active_expire(self):
+        if self._active_expire is None:
+            return
+
+        self._active_expire.stop()
+        self._active_expire = None
+
+_default_redis = MockRedis()
+_current_redis = ContextVar('pytest_tornadis_redis', default=None)
+
+def current_redis():
+    """Returns the MockRedis new clients bind to by default."""
+    redis = _current_redis.get()
+    return _default_redis if redis is None else redis
 
 class MockClient(tornadis.Client):
-    channels = _channels
-    data = _data
+    commands = {}
+
+    @classmethod
+    def register_command(cls, name, handler=None):
+        """Registers ``handler`` as the implementation of the command ``name``.
+
+        The handler is called as ``handler(client, *args)`` with the full
+        command (name included) and returns the reply, or a Future of it.
+        Arguments may be text or, when they come from the network, bytes.
+        Without ``handler`` this returns a decorator. Registering on a
+        subclass does not affect its parents, while commands registered on
+        a parent later are still seen by its subclasses.
+        """
+        if handler is None:
+            return functools.partial(cls.register_command, name)
+
+        if 'commands' not in cls.__dict__:
+            cls.commands = collections.ChainMap({}, cls.commands)
+        name = name.lower()
+        cls.commands[name] = handler
+        cls.commands[name.encode('utf-8')] = handler
+        return handler
+
+    def __init__(self, *args, redis=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.redis = current_redis() if redis is None else redis
+        self.keyspace = self.redis.db(self.db)
+        self.channels = self.redis.channels
+        self.patterns = self.redis.patterns
+        self.pipeline_sizes = []
+        self.transaction = None
+        self.transaction_failed = False
+        self.watched = []
+
+    @property
+    def data(self):
+        return self.keyspace.data
 
-    @tornado.gen.coroutine
     def call(self, *args, **kwargs):
-        command = RedisCommands(args[0].lower())
-
-        if command == RedisCommands.PUBLISH:
-            channel = self.channels[args[1]]
-            message = args[2]
-
-            for client in channel:
-                client._reply_list.append(message)
-
-            raise tornado.gen.Return(len(channel))
-        elif command == RedisCommands.DEL:
-            successful = 0
-            for key in args[1:]:
-                if key in self.data:
-                    del self.data[key]
-                    successful += 1
-
-            return successful
-        elif command == RedisCommands.GET:
-            key = args[1]
-            if key not in self.data:
-                raise tornado.gen.Return(None)
-
-            val = self.data[key]
-            if val[0] == RedisCommands.SETEX and datetime.datetime.utcnow() > val[2]:
-                del self.data[key]
-                raise tornado.gen.Return(None)
-
-            return val[1]
-        elif command == RedisCommands.SETEX:
-            key = args[1]
-            ttl = datetime.datetime.utcnow() + datetime.timedelta(seconds=args[2])
-            data = args[3]
-
-            self.data[key] = (RedisCommands.SETEX, data, ttl)
-        elif command == RedisCommands.SET:
-            key = args[1]
-            data = args[2]
-
-            self.data[key] = (RedisCommands.SET, data)
-        elif command == RedisCommands.HMSET:
-            arg_len = len(args) - 2
-            if arg_len % 2 or arg_len < 1:
-                raise ValueError('Invalid parameters.')
-
-            key = args[1]
-            data_dict = yield self.call(RedisCommands.HGETALL.value, key)
-            if not isinstance(data_dict, dict):
-                data_dict = {}
-
-            dict_args = zip(*[iter(args[2:])]*2)
-            for dkey, dval in dict_args:
-                data_dict[dkey] = dval
-
-            self.data[key] = (RedisCommands.HMSET, data_dict)
-            return 'OK'.encode('utf-8')
-        elif command == RedisCommands.HGET:
-            if len(args) != 3:
-                raise ValueError('Invalid parameters.')
-
-            key = args[1]
-            redis_dict = yield self.call(RedisCommands.GET.value, key)
-            if redis_dict is None:
-                return redis_dict
-
-            field = args[2]
-            if field not in redis_dict:
-                raise tornado.gen.Return(None)
-            return redis_dict[field]
-        elif command == RedisCommands.HGETALL:
-            if len(args) != 2:
-                raise ValueError('Invalid parameters.')
-
-            key = args[1]
-            redis_dict = yield self.call(RedisCommands.GET.value, key)
-            return redis_dict
-        elif command == RedisCommands.HSET:
-            if len(args) != 4:
-                raise ValueError('Invalid parameters.')
-
-            key = args[1]
-            field = args[2]
-            value = args[3]
-            result = yield self.call(RedisCommands.GET.value, key)
-
-            yield self.call(RedisCommands.HMSET.value, key, field, value)
-            return 1 if not isinstance(result, dict) or field not in result else 0
-        elif command == RedisCommands.EXPIRE:
-            if len(args) != 3:
-                raise ValueError('Invalid parameters.')
-
-            key = args[1]
-            result = yield self.call(RedisCommands.GET.value, key)
-            if result is None:
-                return 0
-
-            ttl = args[2]
-            yield self.call(RedisCommands.SETEX.value, key, ttl, result)
-            return 1
-        elif command == RedisCommands.PERSIST:
-            key = args[1]
-            result = yield self.call(RedisCommands.GET.value, key)
-            if result is None:
-                return 0
-
-            yield self.call(RedisCommands.SET.value, key, result)
-            return 1
-        elif command == RedisCommands.RPUSH:
-            key = args[1]
-            result = yield self.call(RedisCommands.GET.value, key)
-            if not isinstance(result, list):
-                result = []
-
-            if len(args) < 3:
-                return len(result)
-            result.extend(args[2:])
-            yield self.call(RedisCommands.SET.value, key, result)
-            return len(result)
-        elif command == RedisCommands.LRANGE:
-            if len(args) < 3:
-                raise ValueError('Invalid arguments')
-
-            key = args[1]
-            start_idx = int(args[2])
-            stop_idx = -1 if len(args) < 4 else int(args[3])
-            result = yield self.call(RedisCommands.GET.value, key)
-
-            if result is None or start_idx > len(result):
-                return []
-
-            if stop_idx == -1:
-                stop_idx = len(result)
-            return result[start_idx: stop_idx + 1]
-        elif command == RedisCommands.SADD:
-            key = args[1]
-            result = yield self.call(RedisCommands.GET.value, key)
-            if not isinstance(result, set):
-                result = set()
-
-            add_count = 0
-            for elem in args[2:]:
-                if elem not in result:
-                    add_count += 1
-                result.add(elem)
-            yield self.call(RedisCommands.SET.value, key, result)
-            return add_count
-        elif command == RedisCommands.SMEMBERS:
-            key = args[1]
-            result = yield self.call(RedisCommands.GET.value, key)
-            if not isinstance(result, set):
-                return []
-
-            return list(result)
+        """Runs a command, or a ``tornadis.Pipeline``, and returns a Future of the reply.
+
+        Commands complete synchronously unless they block or are delayed by
+        a latency model, so their reply comes back in an already resolved
+        Future rather than through a coroutine. It can be yielded from
+        ``tornado.gen`` coroutines and awaited from native ones alike.
+        """
+        if len(args) == 1 and isinstance(args[0], tornadis.Pipeline):
+            return self._call_pipeline(args[0])
+
+        try:
+            result = self._dispatch(args)
+        except Exception as error:
+            return _failed(error)
+        if tornado.concurrent.is_future(result):
+            return result
+        return _resolved(result)
+
+    def _dispatch(self, args):
+        name = args[0].lower()
+        try:
+            handler = self.commands[name]
+        except KeyError:
+            if self.transaction is not None:
+                self.transaction_failed = True
+            raise ValueError('{!r} is not a valid RedisCommands'.format(name))
+
+        if self.transaction is not None and name not in _TRANSACTION_COMMANDS:
+            # As in Redis, a command with a wrong number of arguments is
+            # rejected when queued and fails the transaction.
+            arity = _ARITY.get(name)
+            if arity is not None and (len(args) != arity if arity > 0 else len(args) < -arity):
+                self.transaction_failed = True
+                raise ValueError("wrong number of arguments for '{}' command".format(_text(name)))
+            self.transaction.append(args)
+            return 'QUEUED'.encode('utf-8')
+
+        redis = self.redis
+        if redis.latency_model is not None:
+            handler = redis.latency_model.shape(name, handler)
+        if redis.command_stats is None:
+            return handler(self, *args)
+        return self._dispatch_measured(redis.command_stats, name, handler, args)
+
+    def _dispatch_measured(self, command_stats, name, handler, args):
+        start = time.perf_counter()
+        try:
+            result = handler(self, *args)
+        except Exception:
+            command_stats.record(name, args, time.perf_counter() - start, failed=True)
+            raise
+
+        if not tornado.concurrent.is_future(result):
+            command_stats.record(name, args, time.perf_counter() - start)
+            return result
+
+        # Blocking and delayed commands are timed until their reply is ready.
+        def record(future):
+            failed = future.exception() is not None
+            command_stats.record(name, args, time.perf_counter() - start, failed=failed)
+
+        result.add_done_callback(record)
+        return result
+
+    def _call_pipeline(self, pipeline):
+        """Runs every stacked command and returns a Future of their replies.
+
+        As with tornadis, a failing command puts its error in the replies
+        instead of failing the whole pipeline, and an empty pipeline
+        resolves to a ``tornadis.ClientError``. The size of each pipeline is
+        appended to ``pipeline_sizes``.
+        """
+        if pipeline.number_of_stacked_calls == 0:
+            return _resolved(tornadis.ClientError('empty pipeline'))
+
+        self.pipeline_sizes.append(pipeline.number_of_stacked_calls)
+        replies = []
+        pending = []
+        for args in pipeline.pipelined_args:
+            try:
+                reply = self._dispatch(args)
+            except Exception as error:
+                reply = error
+
+            if tornado.concurrent.is_future(reply):
+                pending.append((len(replies), reply))
+            replies.append(reply)
+
+        if not pending:
+            return _resolved(replies)
+        return self._resolve_pipeline(replies, pending)
+
+    @tornado.gen.coroutine
+    def _resolve_pipeline(self, replies, pending):
+        for index, future in pending:
+            try:
+                replies[index] = yield future
+            except Exception as error:
+                replies[index] = error
+
+        return replies
+
+    def _unwatch_all(self):
+        """Stops watching keys and returns True if one of them was modified."""
+        modified = False
+        for keyspace, key, version in self.watched:
+            if keyspace.version(key) != version:
+                modified = True
+            keyspace.unwatch(key)
+        self.watched = []
+        return modified
 
     def is_connected(self):
         return True
 
     def clear_mock_redis(self):
-        self.channels.clear()
-        self.data.clear()
+        self.redis.clear()
+
+_MISSING = object()
+
+_TRANSACTION_COMMANDS = frozenset(
+    name for command in ('multi', 'exec', 'discard', 'watch', 'unwatch')
+    for name in (command, command.encode('utf-8')))
+
+# Number of arguments of each command, name included, as in the Redis
+# command table: a negative arity is a minimum.
+_ARITY = {
+    name: arity
+    for command, arity in (
+        (RedisCommands.PING, -1), (RedisCommands.ECHO, 2), (RedisCommands.PUBLISH, 3),
+        (RedisCommands.DEL, -2), (RedisCommands.GET, 2), (RedisCommands.SET, -3),
+        (RedisCommands.SETEX, 4), (RedisCommands.HMSET, -4), (RedisCommands.HGET, 3),
+        (RedisCommands.HGETALL, 2), (RedisCommands.HSET, -4), (RedisCommands.EXPIRE, -3),
+        (RedisCommands.PERSIST, 2), (RedisCommands.RPUSH, -3), (RedisCommands.LRANGE, 4),
+        (RedisCommands.SADD, -3), (RedisCommands.SMEMBERS, 2), (RedisCommands.TTL, 2),
+        (RedisCommands.PTTL, 2), (RedisCommands.SELECT, 2), (RedisCommands.INFO, -1),
+        (RedisCommands.TYPE, 2), (RedisCommands.MEMORY, -2), (RedisCommands.LPUSH, -3),
+        (RedisCommands.LPOP, -2), (RedisCommands.RPOP, -2), (RedisCommands.LLEN, 2),
+        (RedisCommands.LTRIM, 4), (RedisCommands.BLPOP, -3), (RedisCommands.BRPOP, -3),
+        (RedisCommands.ZADD, -4), (RedisCommands.ZREM, -3), (RedisCommands.ZSCORE, 3),
+        (RedisCommands.ZINCRBY, 4), (RedisCommands.ZCARD, 2), (RedisCommands.ZCOUNT, 4),
+        (RedisCommands.ZRANK, -3), (RedisCommands.ZREVRANK, -3), (RedisCommands.ZRANGE, -4),
+        (RedisCommands.ZREVRANGE, -4), (RedisCommands.ZRANGEBYSCORE, -4),
+        (RedisCommands.ZREVRANGEBYSCORE, -4), (RedisCommands.ZREMRANGEBYSCORE, 4),
+        (RedisCommands.ZREMRANGEBYRANK, 4), (RedisCommands.SCAN, -2), (RedisCommands.KEYS, 2),
+        (RedisCommands.HSCAN, -3), (RedisCommands.SSCAN, -3), (RedisCommands.MGET, -2),
+        (RedisCommands.MSET, -3), (RedisCommands.HMGET, -3), (RedisCommands.HDEL, -3),
+        (RedisCommands.INCR, 2), (RedisCommands.INCRBY, 3), (RedisCommands.HINCRBY, 4),
+    )
+    for name in (command.value, command.value.encode('utf-8'))
+}
+
+_INTEGER = re.compile(r'(?:0|-?[1-9][0-9]*)\Z')
+_INTEGER_MIN = -2 ** 63
+_INTEGER_MAX = 2 ** 63 - 1
+
+def _parse_int(value):
+    """Parses a 64-bit integer argument, which may arrive as text or bytes.
+
+    As with Redis, signs, spaces, leading zeros and fractions are refused.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        number = value
+    else:
+        if isinstance(value, bytes):
+            value = value.decode('latin-1')
+        if not isinstance(value, str) or not _INTEGER.match(value):
+            raise ValueError('value is not an integer or out of range')
+        number = int(value)
+    if not _INTEGER_MIN <= number <= _INTEGER_MAX:
+        raise ValueError('value is not an integer or out of range')
+    return number
+
+def _add_integers(value, delta):
+    result = value + delta
+    if not _INTEGER_MIN <= result <= _INTEGER_MAX:
+        raise ValueError('increment or decrement would overflow')
+    return result
+
+@MockClient.register_command(RedisCommands.PING.value)
+def _ping(client, *args):
+    if len(args) > 2:
+        raise ValueError('Invalid parameters.')
+
+    return args[1] if len(args) == 2 else 'PONG'.encode('utf-8')
+
+@MockClient.register_command(RedisCommands.ECHO.value)
+def _echo(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    return args[1]
+
+@MockClient.register_command(RedisCommands.PUBLISH.value)
+def _publish(client, *args):
+    channel = args[1]
+    message = args[2]
+    received = 0
+
+    subscribers = client.channels.get(channel)
+    if subscribers:
+        for subscriber in subscribers:
+            if subscriber._deliver(channel, message):
+                received += 1
+
+    if client.patterns:
+        for pattern, subscribers in client.patterns.match(channel):
+            for subscriber in subscribers:
+                if subscriber._deliver(channel, message, pattern):
+                    received += 1
+
+    client.redis.delivered_messages += received
+    return received
+
+@MockClient.register_command(RedisCommands.DEL.value)
+def _del(client, *args):
+    successful = 0
+    for key in args[1:]:
+        if client.keyspace.delete(key):
+            successful += 1
+
+    return successful
+
+@MockClient.register_command(RedisCommands.GET.value)
+def _get(client, *args):
+    return client.keyspace.get_string(args[1])
+
+@MockClient.register_command(RedisCommands.SETEX.value)
+def _setex(client, *args):
+    client.keyspace.put(args[1], args[3], ttl=_parse_int(args[2]))
+    return 'OK'.encode('utf-8')
+
+@MockClient.register_command(RedisCommands.SET.value)
+def _set(client, *args):
+    client.keyspace.put(args[1], args[2])
+    return 'OK'.encode('utf-8')
+
+@MockClient.register_command(RedisCommands.HMSET.value)
+def _hmset(client, *args):
+    arg_len = len(args) - 2
+    if arg_len % 2 or arg_len < 1:
+        raise ValueError('Invalid parameters.')
+
+    data_dict = client.keyspace.get_hash(args[1], create=True)
+    dict_args = zip(*[iter(args[2:])]*2)
+    for dkey, dval in dict_args:
+        data_dict[dkey] = dval
+
+    return 'OK'.encode('utf-8')
+
+@MockClient.register_command(RedisCommands.MGET.value)
+def _mget(client, *args):
+    if len(args) < 2:
+        raise ValueError('Invalid parameters.')
+
+    # Keys of another type read as missing, as in Redis.
+    lookup = client.keyspace.lookup
+    string = ValueType.STRING
+    replies = []
+    for key in args[1:]:
+        entry = lookup(key)
+        replies.append(entry.value if entry is not None and entry.type is string else None)
+    return replies
+
+@MockClient.register_command(RedisCommands.MSET.value)
+def _mset(client, *args):
+    if len(args) < 3 or len(args) % 2 == 0:
+        raise ValueError('Invalid parameters.')
+
+    client.keyspace.put_many(zip(args[1::2], args[2::2]))
+    return 'OK'.encode('utf-8')
+
+@MockClient.register_command(RedisCommands.INCR.value)
+def _incr(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    return client.keyspace.incr(args[1], 1)
+
+@MockClient.register_command(RedisCommands.INCRBY.value)
+def _incrby(client, *args):
+    if len(args) != 3:
+        raise ValueError('Invalid parameters.')
+
+    return client.keyspace.incr(args[1], _parse_int(args[2]))
+
+@MockClient.register_command(RedisCommands.HGET.value)
+def _hget(client, *args):
+    if len(args) != 3:
+        raise ValueError('Invalid parameters.')
+
+    redis_dict = client.keyspace.get_hash(args[1])
+    if redis_dict is None:
+        return None
+
+    return redis_dict.get(args[2])
+
+@MockClient.register_command(RedisCommands.HGETALL.value)
+def _hgetall(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    return client.keyspace.get_hash(args[1])
+
+@MockClient.register_command(RedisCommands.HMGET.value)
+def _hmget(client, *args):
+    if len(args) < 3:
+        raise ValueError('Invalid parameters.')
+
+    fields = client.keyspace.get_hash(args[1])
+    if fields is None:
+        return [None] * (len(args) - 2)
+
+    get = fields.get
+    return [get(field) for field in args[2:]]
+
+@MockClient.register_command(RedisCommands.HDEL.value)
+def _hdel(client, *args):
+    if len(args) < 3:
+        raise ValueError('Invalid parameters.')
+
+    fields = client.keyspace.get_hash(args[1], write=True)
+    if fields is None:
+        return 0
+
+    deleted = 0
+    for field in args[2:]:
+        if fields.pop(field, _MISSING) is not _MISSING:
+            deleted += 1
+    if not fields:
+        client.keyspace.delete(args[1])
+    return deleted
+
+@MockClient.register_command(RedisCommands.HINCRBY.value)
+def _hincrby(client, *args):
+    if len(args) != 4:
+        raise ValueError('Invalid parameters.')
+
+    delta = _parse_int(args[3])
+    fields = client.keyspace.get_hash(args[1], create=True)
+    try:
+        current = _parse_int(fields.get(args[2], 0))
+    except ValueError:
+        raise ValueError('hash value is not an integer')
+    value = fields[args[2]] = _add_integers(current, delta)
+    return value
+
+@MockClient.register_command(RedisCommands.HSET.value)
+def _hset(client, *args):
+    if len(args) != 4:
+        raise ValueError('Invalid parameters.')
+
+    key = args[1]
+    created = client.keyspace.get_hash(key) is None
+    client.keyspace.get_hash(key, create=True)[args[2]] = args[3]
+    return 1 if created else 0
+
+@MockClient.register_command(RedisCommands.EXPIRE.value)
+def _expire(client, *args):
+    if len(args) != 3:
+        raise ValueError('Invalid parameters.')
+
+    return 1 if client.keyspace.expire(args[1], _parse_int(args[2])) else 0
+
+@MockClient.register_command(RedisCommands.PERSIST.value)
+def _persist(client, *args):
+    return 1 if client.keyspace.persist(args[1]) else 0
+
+@MockClient.register_command(RedisCommands.TTL.value)
+def _ttl(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    ttl = client.keyspace.ttl(args[1])
+    return ttl if ttl < 0 else int(ttl + 0.5)
+
+@MockClient.register_command(RedisCommands.PTTL.value)
+def _pttl(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    ttl = client.keyspace.ttl(args[1])
+    return ttl if ttl < 0 else int(ttl * 1000 + 0.5)
+
+@MockClient.register_command(RedisCommands.SELECT.value)
+def _select(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    index = _parse_int(args[1])
+    client.keyspace = client.redis.db(index)
+    client.db = index
+    return 'OK'.encode('utf-8')
+
+def _push(client, args, left):
+    key = args[1]
+    if len(args) < 3:
+        result = client.keyspace.get_list(key)
+        return 0 if result is None else len(result)
+
+    result = client.keyspace.get_list(key, create=True)
+    if left:
+        result.extendleft(args[2:])
+    else:
+        result.extend(args[2:])
+    length = len(result)
+
+    client.keyspace.serve_blocked(key)
+    return length
+
+@MockClient.register_command(RedisCommands.RPUSH.value)
+def _rpush(client, *args):
+    return _push(client, args, left=False)
+
+@MockClient.register_command(RedisCommands.LPUSH.value)
+def _lpush(client, *args):
+    return _push(client, args, left=True)
+
+def _pop(client, args, left):
+    if len(args) not in (2, 3):
+        raise ValueError('Invalid parameters.')
+
+    count = None
+    if len(args) == 3:
+        count = _parse_int(args[2])
+        if count < 0:
+            raise ValueError('value is out of range, must be positive')
+
+    key = args[1]
+    if client.keyspace.get_list(key) is None:
+        return None
+
+    result = client.keyspace.get_list(key, write=True)
+    pop = result.popleft if left else result.pop
+    if count is None:
+        value = pop()
+    else:
+        value = [pop() for _ in range(min(count, len(result)))]
+
+    if not result:
+        client.keyspace.delete(key)
+    return value
+
+@MockClient.register_command(RedisCommands.LPOP.value)
+def _lpop(client, *args):
+    return _pop(client, args, left=True)
+
+@MockClient.register_command(RedisCommands.RPOP.value)
+def _rpop(client, *args):
+    return _pop(client, args, left=False)
+
+@MockClient.register_command(RedisCommands.LLEN.value)
+def _llen(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    result = client.keyspace.get_list(args[1])
+    return 0 if result is None else len(result)
+
+def _list_range(length, start, stop):
+    """Converts Redis' inclusive, possibly negative, indices into a
+    ``range`` of valid positions of a list of ``length`` elements."""
+    if start < 0:
+        start = max(start + length, 0)
+    if stop < 0:
+        stop += length
+    return range(start, min(stop, length - 1) + 1)
+
+@MockClient.register_command(RedisCommands.LRANGE.value)
+def _lrange(client, *args):
+    if len(args) < 3:
+        raise ValueError('Invalid arguments')
+
+    start_idx = _parse_int(args[2])
+    stop_idx = -1 if len(args) < 4 else _parse_int(args[3])
+    result = client.keyspace.get_list(args[1])
+    if result is None:
+        return []
+
+    positions = _list_range(len(result), start_idx, stop_idx)
+    if not positions:
+        return []
+
+    # Walk the deque from its nearest end.
+    if positions.start > len(result) - positions.stop:
+        skip = len(result) - positions.stop
+        values = list(itertools.islice(reversed(result), skip, skip + len(positions)))
+        values.reverse()
+        return values
+    return list(itertools.islice(result, positions.start, positions.stop))
+
+@MockClient.register_command(RedisCommands.LTRIM.value)
+def _ltrim(client, *args):
+    if len(args) != 4:
+        raise ValueError('Invalid parameters.')
+
+    start_idx = _parse_int(args[2])
+    stop_idx = _parse_int(args[3])
+    key = args[1]
+    if client.keyspace.get_list(key) is None:
+        return 'OK'.encode('utf-8')
+
+    result = client.keyspace.get_list(key, write=True)
+    positions = _list_range(len(result), start_idx, stop_idx)
+    if not positions:
+        client.keyspace.delete(key)
+        return 'OK'.encode('utf-8')
+
+    # Popping from both ends keeps capped logs (LPUSH + LTRIM 0 N) O(1).
+    for _ in range(len(result) - positions.stop):
+        result.pop()
+    for _ in range(positions.start):
+        result.popleft()
+    return 'OK'.encode('utf-8')
+
+def _parse_timeout(value):
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('timeout is not a float or out of range')
+    if timeout < 0:
+        raise ValueError('timeout is negative')
+    return timeout
+
+def _blocking_pop(client, args, left):
+    if len(args) < 3:
+        raise ValueError('Invalid parameters.')
+
+    keys = args[1:-1]
+    timeout = _parse_timeout(args[-1])
+    for key in keys:
+        result = client.keyspace.get_list(key)
+        if result:
+            return [key, _pop(client, (args[0], key), left)]
+
+    return client.keyspace.block_pop(keys, left, timeout)
+
+@MockClient.register_command(RedisCommands.BLPOP.value)
+def _blpop(client, *args):
+    return _blocking_pop(client, args, left=True)
+
+@MockClient.register_command(RedisCommands.BRPOP.value)
+def _brpop(client, *args):
+    return _blocking_pop(client, args, left=False)
+
+@MockClient.register_command(RedisCommands.SADD.value)
+def _sadd(client, *args):
+    result = client.keyspace.get_set(args[1], create=True)
+
+    add_count = 0
+    for elem in args[2:]:
+        if elem not in result:
+            add_count += 1
+            result.add(elem)
+
+    return add_count
+
+@MockClient.register_command(RedisCommands.SMEMBERS.value)
+def _smembers(client, *args):
+    result = client.keyspace.get_set(args[1])
+    if result is None:
+        return []
+
+    return list(result)
+
+def _format_info_value(value):
+    if isinstance(value, dict):
+        return ','.join('{}={}'.format(name, _format_info_value(field))
+                        for name, field in value.items())
+    if isinstance(value, float):
+        return '{:.2f}'.format(value)
+    return str(value)
+
+@MockClient.register_command(RedisCommands.INFO.value)
+def _info(client, *args):
+    if len(args) > 2:
+        raise ValueError('Invalid parameters.')
+
+    section = None
+    if len(args) == 2:
+        section = args[1].decode('utf-8') if isinstance(args[1], bytes) else args[1]
+    sections = client.redis.info()
+    if section is not None:
+        section = section.lower()
+        sections = {section: sections.get(section, {})}
+
+    lines = []
+    for name, fields in sections.items():
+        lines.append('# {}'.format(name.capitalize()))
+        for field, value in fields.items():
+            lines.append('{}:{}'.format(field, _format_info_value(value)))
+        lines.append('')
+    return '\r\n'.join(lines).encode('utf-8')
+
+def _text(value):
+    """Returns a command argument as lowercase text."""
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    return str(value).lower()
+
+def _parse_score(value):
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('value is not a valid float')
+    if score != score:
+        raise ValueError('value is not a valid float')
+    return score
+
+def _parse_score_bound(value):
+    """Parses a ZRANGEBYSCORE bound into ``(score, exclusive)``."""
+    if isinstance(value, (bytes, str)) and value[:1] in ('(', b'('):
+        return _parse_score(value[1:]), True
+    return _parse_score(value), False
+
+def _zset_reply(items, withscores):
+    if not withscores:
+        return [member for member, _ in items]
+    reply = []
+    for member, score in items:
+        reply.append(member)
+        reply.append(score)
+    return reply
+
+def _zset_modified(client, key, zset):
+    if not zset:
+        client.keyspace.delete(key)
+
+@MockClient.register_command(RedisCommands.ZADD.value)
+def _zadd(client, *args):
+    key = args[1]
+    options = set()
+    index = 2
+    while index < len(args) and _text(args[index]) in ('nx', 'xx', 'gt', 'lt', 'ch', 'incr'):
+        options.add(_text(args[index]))
+        index += 1
+
+    pairs = args[index:]
+    if not pairs or len(pairs) % 2 or 'nx' in options and (
+            'xx' in options or 'gt' in options or 'lt' in options) or (
+            'gt' in options and 'lt' in options) or 'incr' in options and len(pairs) != 2:
+        raise ValueError('Invalid parameters.')
+    scores = [(_parse_score(score), member) for score, member in zip(pairs[::2], pairs[1::2])]
+
+    zset = client.keyspace.get_zset(key, create='xx' not in options, write=True)
+    if zset is None:
+        return None if 'incr' in options else 0
+
+    changed = 0
+    added = 0
+    for score, member in scores:
+        current = zset.score(member)
+        if current is None and 'xx' in options or current is not None and 'nx' in options:
+            if 'incr' in options:
+                _zset_modified(client, key, zset)
+                return None
+            continue
+        if 'incr' in options:
+            score += current or 0.0
+        if current is not None and ('gt' in options and score <= current
+                                    or 'lt' in options and score >= current):
+            if 'incr' in options:
+                return None
+            continue
+
+        if zset.add(member, score):
+            added += 1
+            changed += 1
+        elif current != score:
+            changed += 1
+
+    _zset_modified(client, key, zset)
+    if 'incr' in options:
+        return zset.score(scores[0][1])
+    return changed if 'ch' in options else added
+
+@MockClient.register_command(RedisCommands.ZINCRBY.value)
+def _zincrby(client, *args):
+    if len(args) != 4:
+        raise ValueError('Invalid parameters.')
+
+    increment = _parse_score(args[2])
+    zset = client.keyspace.get_zset(args[1], create=True)
+    score = (zset.score(args[3]) or 0.0) + increment
+    if score != score:
+        raise ValueError('resulting score is not a number (NaN)')
+    zset.add(args[3], score)
+    return score
+
+@MockClient.register_command(RedisCommands.ZREM.value)
+def _zrem(client, *args):
+    if len(args) < 3:
+        raise ValueError('Invalid parameters.')
+
+    key = args[1]
+    zset = client.keyspace.get_zset(key, write=True)
+    if zset is None:
+        return 0
+
+    removed = sum(1 for member in args[2:] if zset.remove(member))
+    _zset_modified(client, key, zset)
+    return removed
+
+@MockClient.register_command(RedisCommands.ZSCORE.value)
+def _zscore(client, *args):
+    if len(args) != 3:
+        raise ValueError('Invalid parameters.')
+
+    zset = client.keyspace.get_zset(args[1])
+    return None if zset is None else zset.score(args[2])
+
+@MockClient.register_command(RedisCommands.ZCARD.value)
+def _zcard(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    zset = client.keyspace.get_zset(args[1])
+    return 0 if zset is None else len(zset)
+
+@MockClient.register_command(RedisCommands.ZCOUNT.value)
+def _zcount(client, *args):
+    if len(args) != 4:
+        raise ValueError('Invalid parameters.')
+
+    low, low_exclusive = _parse_score_bound(args[2])
+    high, high_exclusive = _parse_score_bound(args[3])
+    zset = client.keyspace.get_zset(args[1])
+    return 0 if zset is None else zset.count(low, high, low_exclusive, high_exclusive)
+
+def _zrank(client, args, reverse):
+    if len(args) != 3:
+        raise ValueError('Invalid parameters.')
+
+    zset = client.keyspace.get_zset(args[1])
+    return None if zset is None else zset.rank(args[2], reverse)
+
+@MockClient.register_command(RedisCommands.ZRANK.value)
+def _zrank_forward(client, *args):
+    return _zrank(client, args, reverse=False)
+
+@MockClient.register_command(RedisCommands.ZREVRANK.value)
+def _zrevrank(client, *args):
+    return _zrank(client, args, reverse=True)
+
+def _zrange(client, args, reverse):
+    if len(args) not in (4, 5) or len(args) == 5 and _text(args[4]) != 'withscores':
+        raise ValueError('Invalid parameters.')
+
+    zset = client.keyspace.get_zset(args[1])
+    if zset is None:
+        return []
+
+    positions = _list_range(len(zset), _parse_int(args[2]), _parse_int(args[3]))
+    if not positions:
+        return []
+    items = zset.range_by_rank(positions.start, positions.stop - 1, reverse)
+    return _zset_reply(items, len(args) == 5)
+
+@MockClient.register_command(RedisCommands.ZRANGE.value)
+def _zrange_forward(client, *args):
+    return _zrange(client, args, reverse=False)
+
+@MockClient.register_command(RedisCommands.ZREVRANGE.value)
+def _zrevrange(client, *args):
+    return _zrange(client, args, reverse=True)
+
+def _zrangebyscore(client, args, reverse):
+    if len(args) < 4:
+        raise ValueError('Invalid parameters.')
+
+    # ZREVRANGEBYSCORE takes the maximum first.
+    low, high = (args[3], args[2]) if reverse else (args[2], args[3])
+    low, low_exclusive = _parse_score_bound(low)
+    high, high_exclusive = _parse_score_bound(high)
+
+    withscores = False
+    offset, count = 0, None
+    index = 4
+    while index < len(args):
+        option = _text(args[index])
+        if option == 'withscores':
+            withscores = True
+            index += 1
+        elif option == 'limit' and index + 2 < len(args):
+            offset, count = _parse_int(args[index + 1]), _parse_int(args[index + 2])
+            index += 3
+        else:
+            raise ValueError('Invalid parameters.')
+
+    zset = client.keyspace.get_zset(args[1])
+    if zset is None or offset < 0:
+        return []
+    items = zset.range_by_score(low, high, low_exclusive, high_exclusive, reverse, offset, count)
+    return _zset_reply(items, withscores)
+
+@MockClient.register_command(RedisCommands.ZRANGEBYSCORE.value)
+def _zrangebyscore_forward(client, *args):
+    return _zrangebyscore(client, args, reverse=False)
+
+@MockClient.register_command(RedisCommands.ZREVRANGEBYSCORE.value)
+def _zrevrangebyscore(client, *args):
+    return _zrangebyscore(client, args, reverse=True)
+
+@MockClient.register_command(RedisCommands.ZREMRANGEBYSCORE.value)
+def _zremrangebyscore(client, *args):
+    if len(args) != 4:
+        raise ValueError('Invalid parameters.')
+
+    low, low_exclusive = _parse_score_bound(args[2])
+    high, high_exclusive = _parse_score_bound(args[3])
+    key = args[1]
+    zset = client.keyspace.get_zset(key, write=True)
+    if zset is None:
+        return 0
+
+    members = [member for member, _ in zset.range_by_score(low, high, low_exclusive, high_exclusive)]
+    for member in members:
+        zset.remove(member)
+    _zset_modified(client, key, zset)
+    return len(members)
+
+@MockClient.register_command(RedisCommands.ZREMRANGEBYRANK.value)
+def _zremrangebyrank(client, *args):
+    if len(args) != 4:
+        raise ValueError('Invalid parameters.')
+
+    key = args[1]
+    zset = client.keyspace.get_zset(key, write=True)
+    if zset is None:
+        return 0
+
+    positions = _list_range(len(zset), _parse_int(args[2]), _parse_int(args[3]))
+    members = [member for member, _ in zset.range_by_rank(positions.start, positions.stop - 1)] \
+        if positions else []
+    for member in members:
+        zset.remove(member)
+    _zset_modified(client, key, zset)
+    return len(members)
+
+@MockClient.register_command(RedisCommands.TYPE.value)
+def _type(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    entry = client.keyspace.lookup(args[1])
+    return 'none'.encode('utf-8') if entry is None else entry.type.value.encode('utf-8')
+
+@MockClient.register_command(RedisCommands.MEMORY.value)
+def _memory(client, *args):
+    subcommand = args[1].lower() if len(args) > 1 else None
+    if subcommand not in ('usage', b'usage') or len(args) not in (3, 5):
+        raise ValueError('Invalid parameters.')
+
+    samples = 5
+    if len(args) == 5:
+        if args[3].lower() not in ('samples', b'samples'):
+            raise ValueError('Invalid parameters.')
+        samples = _parse_int(args[4])
+
+    return client.keyspace.memory_usage(args[2], samples)
+
+def _parse_cursor(value):
+    cursor = _parse_int(value)
+    if cursor < 0:
+        raise ValueError('invalid cursor')
+    return cursor
+
+def _parse_scan_options(args, allowed):
+    """Parses the ``MATCH``, ``COUNT`` and, if in ``allowed``, ``TYPE`` options."""
+    if len(args) % 2:
+        raise ValueError('syntax error')
+
+    options = {'match': None, 'count': 10, 'type': None}
+    for name, value in zip(args[::2], args[1::2]):
+        name = _text(name)
+        if name not in allowed:
+            raise ValueError('syntax error')
+        if name == 'count':
+            value = _parse_int(value)
+            if value < 1:
+                raise ValueError('syntax error')
+        elif name == 'type':
+            try:
+                value = ValueType(_text(value))
+            except ValueError:
+                raise ValueError('unknown type name')
+        options[name] = value
+    return options
+
+@MockClient.register_command(RedisCommands.SCAN.value)
+def _scan(client, *args):
+    if len(args) < 2:
+        raise ValueError('Invalid parameters.')
+
+    options = _parse_scan_options(args[2:], ('match', 'count', 'type'))
+    cursor, keys = client.keyspace.scan(_parse_cursor(args[1]), **options)
+    return [str(cursor).encode('utf-8'), keys]
+
+@MockClient.register_command(RedisCommands.KEYS.value)
+def _keys(client, *args):
+    if len(args) != 2:
+        raise ValueError('Invalid parameters.')
+
+    return client.keyspace.keys(args[1])
+
+def _scan_container(client, args, container):
+    if len(args) < 3:
+        raise ValueError('Invalid parameters.')
+
+    cursor = _parse_cursor(args[2])
+    options = _parse_scan_options(args[3:], ('match', 'count'))
+    members = container(args[1])
+    if members is None:
+        return [b'0', []]
+
+    cursor, batch = client.keyspace.scan_members(args[1], members, cursor, options['count'])
+    if options['match'] is not None:
+        regex = compile_glob(options['match'])[1]
+        batch = [member for member in batch if _glob_matches(regex, member)]
+    return [str(cursor).encode('utf-8'), batch]
+
+@MockClient.register_command(RedisCommands.HSCAN.value)
+def _hscan(client, *args):
+    cursor, fields = _scan_container(client, args, client.keyspace.get_hash)
+    hash_value = client.keyspace.get_hash(args[1])
+    reply = []
+    for field in fields:
+        reply.append(field)
+        reply.append(hash_value[field])
+    return [cursor, reply]
+
+@MockClient.register_command(RedisCommands.SSCAN.value)
+def _sscan(client, *args):
+    return _scan_container(client, args, client.keyspace.get_set)
+
+@MockClient.register_command(RedisCommands.MULTI.value)
+def _multi(client, *args):
+    if len(args) != 1:
+        raise ValueError('Invalid parameters.')
+    if client.transaction is not None:
+        raise ValueError('MULTI calls can not be nested')
+
+    client.transaction = []
+    client.transaction_failed = False
+    return 'OK'.encode('utf-8')
+
+@MockClient.register_command(RedisCommands.EXEC.value)
+def _exec(client, *args):
+    if len(args) != 1:
+        raise ValueError('Invalid parameters.')
+    if client.transaction is None:
+        raise ValueError('EXEC without MULTI')
+
+    commands = client.transaction
+    failed = client.transaction_failed
+    client.transaction = None
+    client.transaction_failed = False
+    modified = client._unwatch_all()
+    if failed:
+        raise CommandError('EXECABORT', 'Transaction discarded because of previous errors.')
+    if modified:
+        client.redis.aborted_transactions += 1
+        return None
+
+    # The queued commands run back to back, so no other client can see or
+    # make changes in between. As in Redis, each one is also counted in the
+    # command statistics, and the time of EXEC includes theirs.
+    command_stats = client.redis.command_stats
+    replies = []
+    for command in commands:
+        name = command[0].lower()
+        start = time.perf_counter()
+        try:
+            reply = client.commands[name](client, *command)
+        except Exception as error:
+            reply = error
+
+        if tornado.concurrent.is_future(reply):
+            # Blocking pops do not block in a transaction: they time out at once.
+            if not reply.done():
+                reply.set_result(None)
+            reply = reply.exception() or reply.result()
+        if command_stats is not None:
+            command_stats.record(name, command, time.perf_counter() - start,
+                                 failed=isinstance(reply, Exception))
+        replies.append(reply)
+
+    client.redis.executed_transactions += 1
+    return replies
+
+@MockClient.register_command(RedisCommands.DISCARD.value)
+def _discard(client, *args):
+    if len(args) != 1:
+        raise ValueError('Invalid parameters.')
+    if client.transaction is None:
+        raise ValueError('DISCARD without MULTI')
+
+    client.transaction = None
+    client.transaction_failed = False
+    client._unwatch_all()
+    return 'OK'.encode('utf-8')
+
+@MockClient.register_command(RedisCommands.WATCH.value)
+def _watch(client, *args):
+    if len(args) < 2:
+        raise ValueError('Invalid parameters.')
+    if client.transaction is not None:
+        raise ValueError('WATCH inside MULTI is not allowed')
+
+    keyspace = client.keyspace
+    watched = set((id(space), key) for space, key, _ in client.watched)
+    for key in args[1:]:
+        if (id(keyspace), key) in watched:
+            continue
+        keyspace.watch(key)
+        client.watched.append((keyspace, key, keyspace.version(key)))
+        watched.add((id(keyspace), key))
+    return 'OK'.encode('utf-8')
+
+@MockClient.register_command(RedisCommands.UNWATCH.value)
+def _unwatch(client, *args):
+    if len(args) != 1:
+        raise ValueError('Invalid parameters.')
+
+    client._unwatch_all()
+    return 'OK'.encode('utf-8')
 
 class MockPubSubClient(tornadis.PubSubClient, MockClient):
-    def __init__(self, *args, **kwargs):
+    """Subscriber whose messages queue up in an in-memory mailbox.
+
+    ``mailbox_size`` bounds the mailbox to model a slow consumer. When it is
+    full, ``overflow`` decides what happens to a new message: ``DROP_OLDEST``
+    evicts the oldest queued one, ``DROP_NEWEST`` discards the new one and
+    ``RAISE`` makes PUBLISH raise ``tornadis.ClientError``.
+    """
+
+    DROP_OLDEST = 'drop-oldest'
+    DROP_NEWEST = 'drop-newest'
+    RAISE = 'raise'
+
+    def __init__(self, *args, mailbox_size=None, overflow=DROP_OLDEST, **kwargs):
+        if overflow not in (self.DROP_OLDEST, self.DROP_NEWEST, self.RAISE):
+            raise ValueError('Invalid overflow policy.')
+
         super().__init__(*args, **kwargs)
-        self._reply_list = []
+        self._reply_list = collections.deque()
+        self.mailbox_size = mailbox_size
+        self.overflow = overflow
+        self.dropped_messages = 0
+        self._subscribed_patterns = {}
+
+    def _deliver(self, channel, message, pattern=None):
+        """Queues ``message`` and wakes a waiting ``pubsub_pop_message``.
+
+        ``pattern`` is the matching pattern for pattern subscriptions.
+        Returns False if the message was dropped.
+        """
+        if pattern is not None:
+            message = [b'pmessage', pattern, channel, message]
+
+        mailbox = self._reply_list
+        if self.mailbox_size is not None and len(mailbox) >= self.mailbox_size:
+            if self.overflow == self.RAISE:
+                raise tornadis.ClientError('Subscriber mailbox is full.')
+
+            self.dropped_messages += 1
+            self.redis.dropped_messages += 1
+            if self.overflow == self.DROP_NEWEST:
+                return False
+            mailbox.popleft()
+
+        mailbox.append(message)
+        self._condition.notify()
+        return True
 
     @tornado.gen.coroutine
     def pubsub_subscribe(self, *args):
         for channel in args:
-            self.channels[channel].append(self)
+            self.channels[channel][self] = None
 
         raise tornado.gen.Return(len(args))
 
     @tornado.gen.coroutine
     def pubsub_unsubscribe(self, *args):
         for channel in args:
-            self.channels[channel].remove(self)
+            self.channels[channel].pop(self, None)
+
+        raise tornado.gen.Return(len(args))
+
+    @tornado.gen.coroutine
+    def pubsub_psubscribe(self, *args):
+        for pattern in args:
+            self.patterns.subscribers(pattern)[self] = None
+            self._subscribed_patterns[pattern] = None
 
         raise tornado.gen.Return(len(args))
 
     @tornado.gen.coroutine
-    def pubsub_pop_message(self, *args, **kwargs):
+    def pubsub_punsubscribe(self, *args):
+        patterns = args or list(self._subscribed_patterns)
+        for pattern in patterns:
+            self.patterns.discard(pattern, self)
+            self._subscribed_patterns.pop(pattern, None)
+
+        raise tornado.gen.Return(len(patterns))
+
+    @tornado.gen.coroutine
+    def pubsub_pop_message(self, deadline=None):
         reply = None
 
         try:
-            reply = self._reply_list.pop(0)
+            reply = self._reply_list.popleft()
             raise tornado.gen.Return(reply)
         except IndexError:
             pass
 
-        yield self._condition.wait()
+        if deadline is None:
+            yield self._condition.wait()
+        else:
+            yield self._condition.wait(timeout=datetime.timedelta(seconds=deadline))
         try:
-            reply = self._reply_list.pop(0)
+            reply = self._reply_list.popleft()
         except IndexError:
             pass
 
         raise tornado.gen.Return(reply)
+
+class MockClientPool(tornadis.ClientPool):
+    """``tornadis.ClientPool`` handing out ``client_class`` instances bound
+    to ``redis``, the active MockRedis by default.
+
+    ``max_size`` is enforced as by tornadis: ``get_connected_client`` waits
+    for a release once that many clients are checked out. The pool counts
+    ``checkouts`` and the ``waits`` among them, records the time spent
+    waiting in the ``wait_times`` histogram and tracks ``peak_checked_out``.
+    Clients checked out and never released are returned by ``leaks``.
+    """
+
+    def __init__(self, max_size=-1, redis=None, client_class=MockClient, **client_kwargs):
+        super().__init__(max_size=max_size, **client_kwargs)
+        self.redis = current_redis() if redis is None else redis
+        self.client_class = client_class
+        self.checked_out = {}
+        self.checkouts = 0
+        self.waits = 0
+        self.peak_checked_out = 0
+        self.wait_times = stats.LatencyHistogram()
+
+    def _make_client(self):
+        return self.client_class(redis=self.redis, **self.client_kwargs)
+
+    def _check_out(self, client):
+        self.checked_out[client] = tornado.ioloop.IOLoop.current().time()
+        self.checkouts += 1
+        self.peak_checked_out = max(self.peak_checked_out, len(self.checked_out))
+
+    @tornado.gen.coroutine
+    def get_connected_client(self):
+        io_loop = tornado.ioloop.IOLoop.current()
+        start = io_loop.time()
+        if self.max_size != -1 and len(self.checked_out) >= self.max_size:
+            self.waits += 1
+        client = yield super().get_connected_client()
+        self.wait_times.add(io_loop.time() - start)
+        self._check_out(client)
+        return client
+
+    def get_client_nowait(self):
+        client = super().get_client_nowait()
+        if client is not None:
+            self._check_out(client)
+        return client
+
+    def release_client(self, client):
+        self.checked_out.pop(client, None)
+        super().release_client(client)
+
+    def leaks(self):
+        """Returns the ``(client, seconds)`` pairs of the clients still
+        checked out and for how long, longest first."""
+        now = tornado.ioloop.IOLoop.current().time()
+        return [(client, now - since) for client, since in
+                sorted(self.checked_out.items(), key=lambda item: item[1])]
+
+    def as_dict(self):
+        return {
+            'max_size': self.max_size,
+            'checked_out': len(self.checked_out),
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'peak_checked_out': self.peak_checked_out,
+            'wait_time': self.wait_times.as_dict(),
+        }
@@ -0,0 +1,390 @@
+"""
+    Redis Cluster emulation: a keyspace sharded by hash slot over several
+    nodes, each a ``MockRedis`` of its own.
+
+    Keys map to one of ``SLOTS`` hash slots by the CRC16 of the key, or of
+    its hash tag, the part between the first ``{`` and the following ``}``,
+    as in Redis Cluster. ``MockClusterClient`` is connected to one node and
+    replies ``MOVED`` for slots served elsewhere, or, with
+    ``follow_redirects``, routes every command to the right node itself as
+    a cluster-aware client does. Multi-key commands whose keys span slots
+    fail with ``CROSSSLOT``. ``MockCluster.start_migration`` moves a slot
+    between nodes the way ``redis-cli --cluster reshard`` does, answering
+    ``ASK`` for keys already moved until ``finish_migration``.
+"""
+
+import binascii
+import collections
+
+from . import clients
+
+SLOTS = 16384
+
+# Position of the keys in the arguments of each command, as in the key
+# specifications of Redis' COMMAND: the first and last key, negative from
+# the end, and the step between keys. Commands missing here take no key
+# and run on the node the client is connected to.
+KEY_SPECS = {
+    'del': (1, -1, 1),
+    'get': (1, 1, 1),
+    'set': (1, 1, 1),
+    'setex': (1, 1, 1),
+    'mget': (1, -1, 1),
+    'mset': (1, -1, 2),
+    'hmset': (1, 1, 1),
+    'hget': (1, 1, 1),
+    'hgetall': (1, 1, 1),
+    'hset': (1, 1, 1),
+    'hmget': (1, 1, 1),
+    'hdel': (1, 1, 1),
+    'hincrby': (1, 1, 1),
+    'incr': (1, 1, 1),
+    'incrby': (1, 1, 1),
+    'watch': (1, -1, 1),
+    'hscan': (1, 1, 1),
+    'expire': (1, 1, 1),
+    'persist': (1, 1, 1),
+    'ttl': (1, 1, 1),
+    'pttl': (1, 1, 1),
+    'type': (1, 1, 1),
+    'memory': (2, 2, 1),
+    'rpush': (1, 1, 1),
+    'lpush': (1, 1, 1),
+    'lpop': (1, 1, 1),
+    'rpop': (1, 1, 1),
+    'llen': (1, 1, 1),
+    'lrange': (1, 1, 1),
+    'ltrim': (1, 1, 1),
+    'blpop': (1, -2, 1),
+    'brpop': (1, -2, 1),
+    'sadd': (1, 1, 1),
+    'smembers': (1, 1, 1),
+    'sscan': (1, 1, 1),
+    'zadd': (1, 1, 1),
+    'zrem': (1, 1, 1),
+    'zscore': (1, 1, 1),
+    'zincrby': (1, 1, 1),
+    'zcard': (1, 1, 1),
+    'zcount': (1, 1, 1),
+    'zrank': (1, 1, 1),
+    'zrevrank': (1, 1, 1),
+    'zrange': (1, 1, 1),
+    'zrevrange': (1, 1, 1),
+    'zrangebyscore': (1, 1, 1),
+    'zrevrangebyscore': (1, 1, 1),
+    'zremrangebyscore': (1, 1, 1),
+    'zremrangebyrank': (1, 1, 1),
+}
+
+def _key_bytes(key):
+    if isinstance(key, bytes):
+        return key
+    return str(key).encode('utf-8')
+
+def key_slot(key):
+    """Returns the hash slot of ``key``."""
+    data = _key_bytes(key)
+    start = data.find(b'{')
+    if start != -1:
+        end = data.find(b'}', start + 1)
+        if end > start + 1:
+            data = data[start + 1:end]
+    # CRC-CCITT with a zero initial value is the XMODEM CRC16 Redis uses.
+    return binascii.crc_hqx(data, 0) % SLOTS
+
+def command_keys(args):
+    """Returns the keys among the arguments of command ``args``."""
+    name = args[0]
+    if isinstance(name, bytes):
+        name = name.decode('utf-8', 'replace')
+    spec = KEY_SPECS.get(name.lower())
+    if spec is None:
+        return ()
+
+    first, last, step = spec
+    if last < 0:
+        last += len(args)
+    return args[first:last + 1:step]
+
+class ClusterNode(object):
+    """One shard of a ``MockCluster``, serving the slots assigned to it."""
+
+    def __init__(self, index, host, port, redis):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.redis = redis
+        self.calls = 0
+
+    @property
+    def address(self):
+        return '{}:{}'.format(self.host, self.port)
+
+    def __repr__(self):
+        return 'ClusterNode({})'.format(self.address)
+
+class MockCluster(object):
+    """``nodes`` shards splitting the hash slots in equal ranges.
+
+    Nodes listen, nominally, on ``host`` and consecutive ports from
+    ``port``; clients pick theirs with the usual tornadis ``host`` and
+    ``port`` arguments. Every command routed to a key counts against its
+    node's ``calls`` and its slot in ``slot_calls``, so ``hot_slots`` and
+    ``node_load`` show how evenly a key design spreads the load.
+    """
+
+    def __init__(self, nodes=3, host='127.0.0.1', port=7000, clock=None):
+        if nodes < 1:
+            raise ValueError('Invalid parameters.')
+
+        self.nodes = []
+        for index in range(nodes):
+            redis = clients.MockRedis(clock=clock, databases=1)
+            if self.nodes:
+                # Messages published on any node reach the whole cluster.
+                redis.channels = self.nodes[0].redis.channels
+                redis.patterns = self.nodes[0].redis.patterns
+            self.nodes.append(ClusterNode(index, host, port + index, redis))
+
+        # Ranges are rounded as by redis-cli --cluster create.
+        self.slots = []
+        for index, node in enumerate(self.nodes):
+            count = int(SLOTS * (index + 1) / nodes + 0.5) - int(SLOTS * index / nodes + 0.5)
+            self.slots.extend([node] * count)
+
+        self.migrations = {}
+        self.slot_calls = collections.Counter()
+        self.moved_redirects = 0
+        self.ask_redirects = 0
+        self.crossslot_errors = 0
+
+    def node(self, host=None, port=None):
+        """Returns the node listening on ``host`` and ``port``, the first one by default."""
+        if host is None and port is None:
+            return self.nodes[0]
+        for node in self.nodes:
+            if (host is None or node.host == host) and (port is None or node.port == port):
+                return node
+        raise ValueError('No cluster node at {}:{}.'.format(host, port))
+
+    def node_for_key(self, key):
+        return self.slots[key_slot(key)]
+
+    def slot_ranges(self):
+        """Yields ``(first, last, node)`` for each range of slots served by one node."""
+        first = 0
+        for slot in range(1, SLOTS + 1):
+            if slot == SLOTS or self.slots[slot] is not self.slots[first]:
+                yield first, slot - 1, self.slots[first]
+                first = slot
+
+    def route(self, slot, keys, node=None, asking=False):
+        """Returns the node that serves ``keys``, all in ``slot``.
+
+        With ``node``, the one the client is connected to, this raises the
+        ``MOVED`` or ``ASK`` error that node would reply instead of serving
+        the command. Without, redirections are followed. Either way, keys
+        split between both nodes of a migrating slot raise ``TRYAGAIN``.
+        """
+        owner = self.slots[slot]
+        target = self.migrations.get(slot)
+        if target is None:
+            if node is None or node is owner:
+                return owner
+            self.moved_redirects += 1
+            raise clients.CommandError('MOVED', '{} {}'.format(slot, owner.address))
+
+        data = owner.redis.db().data
+        present = sum(1 for key in keys if key in data)
+        if 0 < present < len(keys) and (node is None or node is owner):
+            raise clients.CommandError(
+                'TRYAGAIN', 'Multiple keys request during rehashing of slot')
+        if node is None:
+            return owner if present else target
+        if node is owner:
+            if present:
+                return owner
+            self.ask_redirects += 1
+            raise clients.CommandError('ASK', '{} {}'.format(slot, target.address))
+        if node is target and asking:
+            return target
+        self.moved_redirects += 1
+        raise clients.CommandError('MOVED', '{} {}'.format(slot, owner.address))
+
+    def start_migration(self, slot, target):
+        """Starts moving ``slot`` to node ``target``, a node or its index.
+
+        The slot stays assigned to its current node, which keeps serving the
+        keys it still has and answers ``ASK`` for the others, until
+        ``finish_migration``. ``migrate_keys`` moves keys in between.
+        """
+        if not isinstance(target, ClusterNode):
+            target = self.nodes[target]
+        if target is self.slots[slot]:
+            raise ValueError('Invalid parameters.')
+        self.migrations[slot] = target
+
+    def migrate_keys(self, slot, count=None):
+        """Moves up to ``count`` keys of migrating ``slot``, all by default,
+        to the target node and returns how many were moved."""
+        target = self.migrations[slot]
+        source = self.slots[slot].redis.db()
+        destination = target.redis.db()
+        moved = 0
+        for key in [key for key in source.data if key_slot(key) == slot]:
+            if count is not None and moved >= count:
+                break
+            entry = source.lookup(key)
+            if entry is None:
+                continue
+            ttl = None
+            if entry.deadline is not None:
+                ttl = max(entry.deadline - source.clock.time(), 0)
+            source.delete(key)
+            destination.put(key, entry.value, ttl=ttl, type=entry.type)
+            moved += 1
+        return moved
+
+    def finish_migration(self, slot):
+        """Moves the remaining keys of ``slot`` and assigns it to the target node."""
+        self.migrate_keys(slot)
+        self.slots[slot] = self.migrations.pop(slot)
+
+    def record(self, node, slot):
+        node.calls += 1
+        self.slot_calls[slot] += 1
+
+    def node_load(self):
+        """Returns the calls routed to each node, by node address."""
+        return collections.OrderedDict((node.address, node.calls) for node in self.nodes)
+
+    def hot_slots(self, count=10):
+        """Returns the ``count`` ``(slot, calls)`` pairs with the most calls."""
+        return self.slot_calls.most_common(count)
+
+    def info(self):
+        """Returns cluster-wide counters, as fields of an INFO-like section."""
+        return collections.OrderedDict([
+            ('cluster_known_nodes', len(self.nodes)),
+            ('cluster_slots_migrating', len(self.migrations)),
+            ('moved_redirects', self.moved_redirects),
+            ('ask_redirects', self.ask_redirects),
+            ('crossslot_errors', self.crossslot_errors),
+        ])
+
+    def clear(self):
+        for node in self.nodes:
+            node.redis.clear()
+            node.calls = 0
+        self.slot_calls.clear()
+        self.moved_redirects = 0
+        self.ask_redirects = 0
+        self.crossslot_errors = 0
+
+    def activate(self):
+        """Makes new cluster clients bind to this instance in the current
+        context. Returns a token for ``deactivate``."""
+        return _current_cluster.set(self)
+
+    def deactivate(self, token):
+        _current_cluster.reset(token)
+
+_current_cluster = clients.ContextVar('pytest_tornadis_cluster', default=None)
+
+def current_cluster():
+    """Returns the active MockCluster."""
+    cluster = _current_cluster.get()
+    if cluster is None:
+        raise ValueError('No active MockCluster.')
+    return cluster
+
+class MockClusterClient(clients.MockClient):
+    """Client of one node of a ``MockCluster``, the active one by default.
+
+    The node is chosen with the ``host`` and ``port`` arguments, as for a
+    tornadis client, or by its ``redis`` when served by a
+    ``MockRedisServer``. Commands on keys of another node's slots fail with
+    a ``MOVED`` or ``ASK`` error, unless ``follow_redirects`` is set.
+    """
+
+    def __init__(self, *args, cluster=None, follow_redirects=False, redis=None, **kwargs):
+        self.cluster = current_cluster() if cluster is None else cluster
+        if redis is None:
+            self.node = self.cluster.node(kwargs.get('host'), kwargs.get('port'))
+        else:
+            self.node = next(node for node in self.cluster.nodes if node.redis is redis)
+        self.follow_redirects = follow_redirects
+        self.asking = False
+        self._node_clients = {}
+        super().__init__(*args, redis=self.node.redis, **kwargs)
+
+    def _dispatch(self, args):
+        asking, self.asking = self.asking, False
+        keys = command_keys(args)
+        if not keys:
+            self.node.calls += 1
+            return super()._dispatch(args)
+
+        slot = key_slot(keys[0])
+        try:
+            for key in keys[1:]:
+                if key_slot(key) != slot:
+                    self.cluster.crossslot_errors += 1
+                    raise clients.CommandError(
+                        'CROSSSLOT', "Keys in request don't hash to the same slot")
+
+            # Commands queued in a transaction run on the connected node,
+            # which redirects them as it would any other command.
+            follow = self.follow_redirects and self.transaction is None
+            node = self.cluster.route(slot, keys, None if follow else self.node, asking)
+        except clients.CommandError:
+            # As in Redis, a command rejected while queued fails the transaction.
+            if self.transaction is not None:
+                self.transaction_failed = True
+            raise
+        self.cluster.record(node, slot)
+        if node is self.node:
+            return super()._dispatch(args)
+        return self._node_client(node)._dispatch(args)
+
+    def _node_client(self, node):
+        client = self._node_clients.get(node.index)
+        if client is None:
+            client = self._node_clients[node.index] = clients.MockClient(redis=node.redis)
+            client.commands = self.commands
+        return client
+
+@MockClusterClient.register_command('asking')
+def _asking(client, *args):
+    if len(args) != 1:
+        raise ValueError('Invalid parameters.')
+
+    client.asking = True
+    return 'OK'.encode('utf-8')
+
+@MockClusterClient.register_command('exec')
+def _exec(client, *args):
+    # Queued commands each map to one slot, yet a transaction as a whole
+    # must too. Otherwise Redis discards it.
+    slots = set(key_slot(key) for command in client.transaction or ()
+                for key in command_keys(command))
+    if len(slots) > 1:
+        client.transaction = None
+        client.transaction_failed = False
+        client._unwatch_all()
+        client.cluster.crossslot_errors += 1
+        raise clients.CommandError('CROSSSLOT', "Keys in request don't hash to the same slot")
+    return clients._exec(client, *args)
+
+@MockClusterClient.register_command('cluster')
+def _cluster(client, *args):
+    subcommand = clients._text(args[1]) if len(args) > 1 else None
+    if subcommand == 'keyslot' and len(args) == 3:
+        return key_slot(args[2])
+    if subcommand == 'slots' and len(args) == 2:
+        return [[first, last, [node.host.encode('utf-8'), node.port]]
+                for first, last, node in client.cluster.slot_ranges()]
+    if subcommand == 'countkeysinslot' and len(args) == 3:
+        slot = clients._parse_int(args[2])
+        return sum(1 for key in client.keyspace.data if key_slot(key) == slot)
+    raise ValueError('Invalid parameters.')
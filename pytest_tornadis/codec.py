@@ -0,0 +1,75 @@
+"""
+    Binary encoding of scalars, shared by trace and snapshot files.
+
+    Each scalar is a type tag followed by its data: ``n`` for None, ``i`` and
+    ``f`` for 64-bit ints and floats, and ``b``, ``s`` and ``I`` for bytes,
+    UTF-8 strings and larger ints, prefixed with their size.
+"""
+
+import struct
+
+COUNT = struct.Struct('<I')
+INT = struct.Struct('<q')
+FLOAT = struct.Struct('<d')
+
+def encode(value, parts):
+    """Appends the encoding of ``value`` to ``parts``, or returns False if
+    it is not a scalar."""
+    if value is None:
+        parts.append(b'n')
+    elif isinstance(value, bytes):
+        parts.append(b'b' + COUNT.pack(len(value)))
+        parts.append(value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        parts.append(b's' + COUNT.pack(len(data)))
+        parts.append(data)
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    elif isinstance(value, float):
+        parts.append(b'f' + FLOAT.pack(value))
+    elif -2 ** 63 <= value < 2 ** 63:
+        parts.append(b'i' + INT.pack(value))
+    else:
+        data = str(value).encode('ascii')
+        parts.append(b'I' + COUNT.pack(len(data)))
+        parts.append(data)
+    return True
+
+def _sized(tag, data):
+    if tag == b's':
+        return data.decode('utf-8')
+    if tag == b'b':
+        return data
+    if tag == b'I':
+        return int(data)
+    raise ValueError('Invalid value type {!r}.'.format(tag))
+
+def decode(buf, offset):
+    """Returns the scalar at ``offset`` of ``buf`` and the offset after it."""
+    tag = buf[offset:offset + 1]
+    offset += 1
+    if tag == b'i':
+        return INT.unpack_from(buf, offset)[0], offset + INT.size
+    if tag == b'n':
+        return None, offset
+    if tag == b'f':
+        return FLOAT.unpack_from(buf, offset)[0], offset + FLOAT.size
+
+    size = COUNT.unpack_from(buf, offset)[0]
+    offset += COUNT.size
+    return _sized(tag, buf[offset:offset + size]), offset + size
+
+def read(stream, read_exactly):
+    """Returns the next scalar of ``stream``, read with
+    ``read_exactly(stream, size)``."""
+    tag = read_exactly(stream, 1)
+    if tag == b'i':
+        return INT.unpack(read_exactly(stream, INT.size))[0]
+    if tag == b'n':
+        return None
+    if tag == b'f':
+        return FLOAT.unpack(read_exactly(stream, FLOAT.size))[0]
+
+    size = COUNT.unpack(read_exactly(stream, COUNT.size))[0]
+    return _sized(tag, read_exactly(stream, size))
@@ -0,0 +1,145 @@
+"""
+    Deterministic latency and throughput shaping for the mock clients.
+
+    Install a ``LatencyModel`` as ``MockRedis.latency_model`` and every
+    command dispatched on that instance replies after a delay drawn from a
+    seeded random generator, so tail latencies reproduce from run to run.
+    With ``throughput`` set, commands also queue behind each other as on a
+    single-threaded Redis server, which exposes head-of-line blocking.
+"""
+
+import bisect
+import functools
+import random
+
+import tornado.concurrent
+import tornado.gen
+import tornado.ioloop
+
+class Fixed(object):
+    """Always the same latency, in seconds."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def sample(self, rng):
+        return self.seconds
+
+class Normal(object):
+    """Normally distributed latency, clipped at ``minimum`` seconds."""
+
+    def __init__(self, mean, stddev, minimum=0.0):
+        self.mean = mean
+        self.stddev = stddev
+        self.minimum = minimum
+
+    def sample(self, rng):
+        return max(rng.gauss(self.mean, self.stddev), self.minimum)
+
+class Recorded(object):
+    """Latency drawn from observed samples, in seconds."""
+
+    def __init__(self, samples):
+        if not samples:
+            raise ValueError('Invalid parameters.')
+        self.samples = list(samples)
+
+    @classmethod
+    def from_histogram(cls, histogram):
+        """Builds the distribution of a ``stats.LatencyHistogram``, such as
+        the per-command latencies of a trace replay."""
+        return _HistogramDistribution(histogram)
+
+    def sample(self, rng):
+        return rng.choice(self.samples)
+
+class _HistogramDistribution(object):
+    def __init__(self, histogram):
+        if not histogram.count:
+            raise ValueError('Invalid parameters.')
+
+        self.bounds = []
+        self.cumulative = []
+        seen = 0
+        for bucket in sorted(histogram.buckets):
+            seen += histogram.buckets[bucket]
+            self.bounds.append(min(histogram._bucket_upper_bound(bucket), histogram.max))
+            self.cumulative.append(seen)
+
+    def sample(self, rng):
+        rank = rng.randrange(self.cumulative[-1])
+        return self.bounds[bisect.bisect_right(self.cumulative, rank)]
+
+class LatencyModel(object):
+    """Delays the replies of commands.
+
+    ``default`` is the distribution of commands without their own one, set
+    with ``set``, and may be None for no added latency. ``throughput`` caps
+    the commands served per second: each one takes ``1 / throughput``
+    seconds of a single server, so a burst queues up and later commands
+    wait for earlier ones. Commands take effect when dispatched; only their
+    replies, errors included, are delayed.
+    """
+
+    def __init__(self, default=None, commands=None, throughput=None, seed=0):
+        self.default = default
+        self.commands = {}
+        self.throughput = throughput
+        self.busy_until = 0.0
+        self.delayed_calls = 0
+        self.queued_time = 0.0
+        self.seed(seed)
+        for names, distribution in (commands or {}).items():
+            self.set(names, distribution)
+
+    def seed(self, seed):
+        self.rng = random.Random(seed)
+
+    def set(self, names, distribution):
+        """Sets the distribution of one command, or of an iterable of them."""
+        if isinstance(names, (str, bytes)):
+            names = (names,)
+        for name in names:
+            if isinstance(name, bytes):
+                name = name.decode('utf-8')
+            self.commands[name.lower()] = distribution
+
+    def reply_delay(self, name):
+        """Draws the seconds after which the reply to command ``name`` is sent."""
+        if isinstance(name, bytes):
+            name = name.decode('utf-8', 'replace')
+        distribution = self.commands.get(name.lower(), self.default)
+        delay = 0.0 if distribution is None else distribution.sample(self.rng)
+
+        if self.throughput:
+            now = tornado.ioloop.IOLoop.current().time()
+            start = max(now, self.busy_until)
+            self.busy_until = start + 1.0 / self.throughput
+            self.queued_time += start - now
+            delay += self.busy_until - now
+
+        return delay
+
+    def shape(self, name, handler):
+        """Wraps a command handler so that its reply is delayed."""
+        return functools.partial(self._call_shaped, name, handler)
+
+    def _call_shaped(self, name, handler, client, *args):
+        delay = self.reply_delay(name)
+        try:
+            result = handler(client, *args)
+        except Exception as error:
+            return self._reply_later(delay, None, error)
+
+        return self._reply_later(delay, result, None)
+
+    @tornado.gen.coroutine
+    def _reply_later(self, delay, result, error):
+        if delay > 0:
+            self.delayed_calls += 1
+            yield tornado.gen.sleep(delay)
+        if error is not None:
+            raise error
+        if tornado.concurrent.is_future(result):
+            result = yield result
+        return result
@@ -0,0 +1,146 @@
+"""
+    Pytest fixtures for tests that run against the mock clients.
+"""
+
+import pytest
+
+from . import clients, cluster, latency, server, snapshot, stats
+
+HOT_COMMANDS = 10
+
+def pytest_addoption(parser):
+    group = parser.getgroup('tornadis')
+    group.addoption('--tornadis-stats', action='store_true', default=False,
+                    help='record the commands sent to mock_redis and report the hottest ones')
+    group.addoption('--tornadis-snapshot', default=None, metavar='PATH',
+                    help='start every mock_redis from the snapshot file PATH')
+
+def pytest_configure(config):
+    config._tornadis_command_stats = None
+    config._tornadis_snapshot = config.getoption('tornadis_snapshot')
+    if config.getoption('tornadis_stats'):
+        config._tornadis_command_stats = stats.CommandStats()
+
+def pytest_terminal_summary(terminalreporter, config):
+    command_stats = getattr(config, '_tornadis_command_stats', None)
+    if not command_stats or not command_stats.commands:
+        return
+
+    terminalreporter.section('tornadis hot commands')
+    terminalreporter.write_line('{:<16} {:>10} {:>12} {:>12} {:>12}'.format(
+        'command', 'calls', 'total ms', 'us/call', 'p99 us'))
+    for name, stat in command_stats.hot(HOT_COMMANDS):
+        terminalreporter.write_line('{:<16} {:>10} {:>12.2f} {:>12.2f} {:>12.2f}'.format(
+            name, stat.calls, stat.latency.total * 1e3, stat.latency.mean * 1e6,
+            stat.latency.percentile(99) * 1e6))
+
+@pytest.fixture(scope='session')
+def mock_redis_seed(request):
+    """MockRedis every ``mock_redis`` starts from.
+
+    It is loaded from the ``--tornadis-snapshot`` file, if given. Override
+    it to build a shared fixture dataset once per session.
+    """
+    path = getattr(request.config, '_tornadis_snapshot', None)
+    if path is None:
+        return None
+
+    return snapshot.load(path)
+
+@pytest.fixture(scope='session')
+def mock_redis_snapshot(mock_redis_seed):
+    """Snapshot of ``mock_redis_seed``, taken once per session."""
+    if mock_redis_seed is None:
+        return None
+
+    return mock_redis_seed.snapshot()
+
+@pytest.fixture
+def mock_redis(mock_redis_snapshot, request):
+    """Fresh MockRedis that clients created during the test bind to.
+
+    It starts as a copy-on-write copy of ``mock_redis_seed``, if any.
+    """
+    session_stats = getattr(request.config, '_tornadis_command_stats', None)
+    redis = clients.MockRedis()
+    if mock_redis_snapshot is not None:
+        redis.restore(mock_redis_snapshot)
+    if session_stats is not None:
+        redis.enable_stats()
+    token = redis.activate()
+    yield redis
+    redis.stop_active_expire()
+    redis.deactivate(token)
+    if session_stats is not None and redis.command_stats is not None:
+        session_stats.merge(redis.command_stats)
+
+@pytest.fixture
+def mock_redis_stats(mock_redis):
+    """Per-command statistics of ``mock_redis``, to assert call budgets::
+
+        assert mock_redis_stats.calls('get') <= 3
+    """
+    return mock_redis.enable_stats()
+
+@pytest.fixture
+def mock_clock(mock_redis):
+    """Virtual clock driving key expiry; call ``advance(seconds)`` to move it."""
+    mock_redis.clock = clients.VirtualClock()
+    return mock_redis.clock
+
+@pytest.fixture
+def mock_active_expire(mock_redis, io_loop):
+    """Runs the active expiry cycle of ``mock_redis`` on the test IOLoop."""
+    mock_redis.start_active_expire()
+    yield mock_redis
+    mock_redis.stop_active_expire()
+
+@pytest.fixture
+def mock_latency(mock_redis, io_loop):
+    """Seeded ``LatencyModel`` of ``mock_redis``, adding no latency until configured::
+
+        mock_latency.set(('get', 'hget'), latency.Normal(0.002, 0.001))
+        mock_latency.throughput = 1000
+    """
+    mock_redis.latency_model = latency.LatencyModel()
+    yield mock_redis.latency_model
+    mock_redis.latency_model = None
+
+@pytest.fixture
+def mock_client_pool_size():
+    """``max_size`` of ``mock_client_pool``; override or parametrize it to size the pool."""
+    return 10
+
+@pytest.fixture
+def mock_client_pool(mock_redis, mock_client_pool_size, io_loop):
+    """``MockClientPool`` of ``mock_redis``.
+
+    The test fails if it leaves clients checked out of the pool.
+    """
+    pool = clients.MockClientPool(max_size=mock_client_pool_size, redis=mock_redis)
+    yield pool
+    leaks = pool.leaks()
+    pool.destroy()
+    if leaks:
+        pytest.fail('{} client(s) of mock_client_pool were never released, the oldest '
+                    'after {:.3f}s.'.format(len(leaks), leaks[0][1]))
+
+@pytest.fixture
+def mock_cluster():
+    """Fresh three-node ``MockCluster`` that ``MockClusterClient`` instances
+    created during the test connect to."""
+    redis_cluster = cluster.MockCluster()
+    token = redis_cluster.activate()
+    yield redis_cluster
+    redis_cluster.deactivate(token)
+
+@pytest.fixture
+def mock_redis_server(mock_redis, io_loop):
+    """RESP server on a free loopback port serving ``mock_redis``.
+
+    Pass its ``client_kwargs`` to ``tornadis.Client`` or ``tornadis.ClientPool``.
+    """
+    redis_server = server.MockRedisServer(redis=mock_redis)
+    redis_server.listen_tcp()
+    yield redis_server
+    redis_server.stop()
@@ -0,0 +1,274 @@
+"""
+    In-process RESP2 server backed by a MockRedis.
+
+    Unmodified ``tornadis.Client`` and ``tornadis.ClientPool`` instances can
+    connect to it, so the real connection, parser and pooling code run in
+    tests without a Redis install.
+"""
+
+import hiredis
+import tornado.concurrent
+import tornado.gen
+import tornado.iostream
+import tornado.netutil
+import tornado.tcpserver
+import tornadis
+
+from . import clients
+
+READ_BUFFER_SIZE = 65536
+
+def _format_float(value):
+    """Formats a float as Redis does: integral values without a fraction."""
+    if value != value or value in (float('inf'), float('-inf')):
+        return repr(value)
+    if value.is_integer() and abs(value) < 1e17:
+        return str(int(value))
+    return repr(value)
+
+def encode_reply(reply, parts):
+    """Appends the RESP2 encoding of ``reply`` to the ``parts`` list."""
+    if reply is None:
+        parts.append(b'$-1\r\n')
+    elif isinstance(reply, bytes):
+        parts.append(b'$%d\r\n' % len(reply))
+        parts.append(reply)
+        parts.append(b'\r\n')
+    elif isinstance(reply, str):
+        encode_reply(reply.encode('utf-8'), parts)
+    elif isinstance(reply, int):
+        parts.append(b':%d\r\n' % reply)
+    elif isinstance(reply, float):
+        encode_reply(_format_float(reply), parts)
+    elif isinstance(reply, dict):
+        parts.append(b'*%d\r\n' % (2 * len(reply)))
+        for field, value in reply.items():
+            encode_reply(field, parts)
+            encode_reply(value, parts)
+    elif isinstance(reply, Exception):
+        message = str(reply).splitlines()[0] if str(reply) else 'error'
+        code = getattr(reply, 'code', 'ERR')
+        parts.append('-{} {}\r\n'.format(code, message).encode('utf-8'))
+    else:
+        items = list(reply)
+        parts.append(b'*%d\r\n' % len(items))
+        for item in items:
+            encode_reply(item, parts)
+
+def _error_reply(name, error):
+    """Returns the error reply to command ``name`` whose handler raised ``error``."""
+    if isinstance(error, (ValueError, tornadis.TornadisException)):
+        return error
+
+    name = name.decode('utf-8', 'replace')
+    if isinstance(error, IndexError):
+        # Handlers index their arguments without checking how many there are.
+        return ValueError("wrong number of arguments for '{}' command".format(name))
+    return ValueError("error in '{}' command: {!r}".format(name, error))
+
+class _Subscriber(object):
+    """Connection side of SUBSCRIBE/PSUBSCRIBE: pushes messages to the socket."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.channels = {}
+        self.patterns = {}
+
+    def _deliver(self, channel, message, pattern=None):
+        if pattern is None:
+            reply = [b'message', channel, message]
+        else:
+            reply = [b'pmessage', pattern, channel, message]
+
+        return self.connection.write_replies([reply])
+
+    def count(self):
+        return len(self.channels) + len(self.patterns)
+
+class _Connection(object):
+    def __init__(self, server, stream):
+        self.server = server
+        self.stream = stream
+        self.client = server.client_class(redis=server.redis)
+        self.authenticated = server.password is None
+        self.subscriber = None
+
+    def write_replies(self, replies):
+        parts = []
+        _encode_replies(replies, parts)
+
+        if self.stream.closed():
+            return False
+        self.stream.write(b''.join(parts))
+        return True
+
+    @tornado.gen.coroutine
+    def run(self):
+        reader = hiredis.Reader()
+        buf = bytearray(READ_BUFFER_SIZE)
+        try:
+            while True:
+                size = yield self.stream.read_into(buf, partial=True)
+                reader.feed(buf, 0, size)
+
+                # Every command parsed out of this read is answered with a
+                # single write, so pipelined requests cost one syscall.
+                replies = []
+                command = reader.gets()
+                while command is not False:
+                    reply = self.execute(command)
+                    if tornado.concurrent.is_future(reply):
+                        reply = yield reply
+                    replies.append(reply)
+                    command = reader.gets()
+                self.write_replies(replies)
+        except tornado.iostream.StreamClosedError:
+            pass
+        except hiredis.ProtocolError:
+            self.stream.close()
+        finally:
+            self.unsubscribe_all()
+
+    def execute(self, command):
+        """Returns the reply to ``command``, or a Future of it for blocking commands."""
+        if not command:
+            return ValueError('empty command')
+
+        name = command[0].lower()
+        if name == b'auth':
+            return self.auth(command)
+        if not self.authenticated:
+            return clients.CommandError('NOAUTH', 'Authentication required.')
+        if name in _PUBSUB_COMMANDS:
+            return getattr(self, _PUBSUB_COMMANDS[name])(command[1:])
+
+        # Unknown commands go through the client too, so that they fail a
+        # transaction being queued.
+        try:
+            reply = self.client._dispatch(command)
+        except Exception as error:
+            if name not in self.client.commands:
+                return ValueError("unknown command '{}'".format(command[0].decode('utf-8', 'replace')))
+            return _error_reply(name, error)
+
+        if tornado.concurrent.is_future(reply):
+            return self._wait(name, reply)
+        return reply
+
+    @tornado.gen.coroutine
+    def _wait(self, name, future):
+        try:
+            reply = yield future
+        except Exception as error:
+            return _error_reply(name, error)
+        return reply
+
+    def auth(self, command):
+        if len(command) != 2:
+            return ValueError("wrong number of arguments for 'auth' command")
+        if self.server.password is None:
+            return ValueError('Client sent AUTH, but no password is set')
+        if command[1] != self.server.password:
+            return clients.CommandError('WRONGPASS', 'invalid password')
+
+        self.authenticated = True
+        return 'OK'.encode('utf-8')
+
+    def _get_subscriber(self):
+        if self.subscriber is None:
+            self.subscriber = _Subscriber(self)
+        return self.subscriber
+
+    def subscribe(self, channels):
+        subscriber = self._get_subscriber()
+        replies = []
+        for channel in channels:
+            self.server.redis.channels[channel][subscriber] = None
+            subscriber.channels[channel] = None
+            replies.append([b'subscribe', channel, subscriber.count()])
+        return _MultiReply(replies)
+
+    def unsubscribe(self, channels):
+        subscriber = self._get_subscriber()
+        channels = channels or list(subscriber.channels)
+        replies = []
+        for channel in channels:
+            subscribers = self.server.redis.channels.get(channel)
+            if subscribers is not None:
+                subscribers.pop(subscriber, None)
+            subscriber.channels.pop(channel, None)
+            replies.append([b'unsubscribe', channel, subscriber.count()])
+        return _MultiReply(replies or [[b'unsubscribe', None, subscriber.count()]])
+
+    def psubscribe(self, patterns):
+        subscriber = self._get_subscriber()
+        replies = []
+        for pattern in patterns:
+            self.server.redis.patterns.subscribers(pattern)[subscriber] = None
+            subscriber.patterns[pattern] = None
+            replies.append([b'psubscribe', pattern, subscriber.count()])
+        return _MultiReply(replies)
+
+    def punsubscribe(self, patterns):
+        subscriber = self._get_subscriber()
+        patterns = patterns or list(subscriber.patterns)
+        replies = []
+        for pattern in patterns:
+            self.server.redis.patterns.discard(pattern, subscriber)
+            subscriber.patterns.pop(pattern, None)
+            replies.append([b'punsubscribe', pattern, subscriber.count()])
+        return _MultiReply(replies or [[b'punsubscribe', None, subscriber.count()]])
+
+    def unsubscribe_all(self):
+        if self.subscriber is not None:
+            self.unsubscribe([])
+            self.punsubscribe([])
+
+_PUBSUB_COMMANDS = {
+    b'subscribe': 'subscribe',
+    b'unsubscribe': 'unsubscribe',
+    b'psubscribe': 'psubscribe',
+    b'punsubscribe': 'punsubscribe',
+}
+
+class _MultiReply(list):
+    """Several top-level replies to a single command, as (P)SUBSCRIBE sends."""
+
+def _encode_replies(replies, parts):
+    for reply in replies:
+        if isinstance(reply, _MultiReply):
+            _encode_replies(reply, parts)
+        else:
+            encode_reply(reply, parts)
+
+class MockRedisServer(tornado.tcpserver.TCPServer):
+    """RESP2 server serving the command handlers and keyspaces of a MockRedis.
+
+    Each connection gets its own ``client_class`` instance bound to
+    ``redis``, so connection state such as SELECT behaves as with Redis.
+    Start it with ``listen_tcp`` or ``listen_unix`` and pass
+    ``client_kwargs`` to tornadis clients and pools.
+    """
+
+    def __init__(self, redis=None, password=None, client_class=clients.MockClient, **kwargs):
+        super().__init__(**kwargs)
+        self.redis = clients.current_redis() if redis is None else redis
+        self.password = password.encode('utf-8') if isinstance(password, str) else password
+        self.client_class = client_class
+        self.client_kwargs = {}
+
+    def listen_tcp(self, port=0, address='127.0.0.1'):
+        """Listens on a TCP port, picking a free one by default, and returns it."""
+        sockets = tornado.netutil.bind_sockets(port, address=address)
+        self.add_sockets(sockets)
+        port = sockets[0].getsockname()[1]
+        self.client_kwargs = {'host': address, 'port': port}
+        return port
+
+    def listen_unix(self, path):
+        self.add_socket(tornado.netutil.bind_unix_socket(path))
+        self.client_kwargs = {'unix_domain_socket': path}
+
+    @tornado.gen.coroutine
+    def handle_stream(self, stream, address):
+        yield _Connection(self, stream).run()
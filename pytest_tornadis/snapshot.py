@@ -0,0 +1,296 @@
+"""
+    Binary snapshot files of a MockRedis, loaded through a memory map.
+
+    ``dump`` writes every database: strings, hashes, lists, sets and sorted
+    sets with their remaining TTLs. ``load`` maps the file and only reads
+    its key table; every value is decoded from the map the first time it is
+    accessed.
+
+    The key table stores each column (key types, key lengths, value types,
+    TTLs, sizes and value offsets) as a packed array, so it is read with a
+    few bulk copies. Loading still creates one ``Entry`` per key, as the
+    keyspace is a dict, which bounds it to about a microsecond per key.
+
+    A file is the values area followed by the key table and, last, the
+    offset of the key table.
+"""
+
+import array
+import collections
+import gc
+import itertools
+import mmap
+import os
+import struct
+import sys
+
+from . import clients, codec
+
+MAGIC = b'PTSNAP01'
+
+_TYPES = (
+    clients.ValueType.STRING,
+    clients.ValueType.HASH,
+    clients.ValueType.LIST,
+    clients.ValueType.SET,
+    clients.ValueType.ZSET,
+)
+_TYPE_CODES = {value_type: code for code, value_type in enumerate(_TYPES)}
+
+_COUNT = codec.COUNT
+_FLOAT = codec.FLOAT
+_OFFSET = struct.Struct('<Q')
+# Database index, number of keys and size of the key names.
+_DATABASE = struct.Struct('<IQQ')
+
+# Typecodes of the key table columns: key lengths, TTLs in seconds (NaN
+# for none), accounted sizes and value offsets.
+_LENGTHS = 'I'
+_TTLS = 'd'
+_SIZES = 'Q'
+_OFFSETS = 'Q'
+
+_KEY_DECODERS = {
+    ord('s'): lambda data: data.decode('utf-8'),
+    ord('b'): bytes,
+    ord('i'): int,
+    ord('f'): float,
+}
+
+def _encode_scalar(value, parts):
+    if not codec.encode(value, parts):
+        raise ValueError('Cannot snapshot value {!r}.'.format(value))
+
+def _encode_key(key):
+    """Returns the type tag and the bytes of ``key``."""
+    if isinstance(key, bytes):
+        return b'b', key
+    if isinstance(key, str):
+        return b's', key.encode('utf-8')
+    if isinstance(key, bool) or not isinstance(key, (int, float)):
+        raise ValueError('Cannot snapshot key {!r}.'.format(key))
+    if isinstance(key, float):
+        return b'f', repr(key).encode('ascii')
+    return b'i', str(key).encode('ascii')
+
+def _encode_value(entry, parts):
+    value = entry.value
+    if entry.type is clients.ValueType.STRING:
+        _encode_scalar(value, parts)
+        return
+
+    parts.append(_COUNT.pack(len(value)))
+    if entry.type is clients.ValueType.HASH:
+        for field, item in value.items():
+            _encode_scalar(field, parts)
+            _encode_scalar(item, parts)
+    elif entry.type is clients.ValueType.ZSET:
+        for member, score in value.items():
+            _encode_scalar(member, parts)
+            parts.append(_FLOAT.pack(score))
+    else:
+        for item in value:
+            _encode_scalar(item, parts)
+
+def _decode_value(value_type, buf, offset):
+    if value_type is clients.ValueType.STRING:
+        return codec.decode(buf, offset)[0]
+
+    count = _COUNT.unpack_from(buf, offset)[0]
+    offset += _COUNT.size
+    if value_type is clients.ValueType.ZSET:
+        zset = clients.SortedSet()
+        for _ in range(count):
+            member, offset = codec.decode(buf, offset)
+            zset.add(member, _FLOAT.unpack_from(buf, offset)[0])
+            offset += _FLOAT.size
+        return zset
+
+    if value_type is clients.ValueType.HASH:
+        count *= 2
+    items = []
+    for _ in range(count):
+        item, offset = codec.decode(buf, offset)
+        items.append(item)
+    if value_type is clients.ValueType.HASH:
+        return dict(zip(items[::2], items[1::2]))
+    if value_type is clients.ValueType.LIST:
+        return collections.deque(items)
+    return set(items)
+
+_ENTRY_VALUE = clients.Entry.value
+
+class _LazyEntry(clients.Entry):
+    """Entry whose value is decoded from the snapshot on first access."""
+
+    __slots__ = ('_source',)
+
+    def __init__(self, type, source, deadline, size):
+        self.type = type
+        self.deadline = deadline
+        self.size = size
+        self._source = source
+
+    @property
+    def value(self):
+        source = self._source
+        if source is not None:
+            _ENTRY_VALUE.__set__(self, _decode_value(self.type, *source))
+            self._source = None
+        return _ENTRY_VALUE.__get__(self, clients.Entry)
+
+    @value.setter
+    def value(self, value):
+        self._source = None
+        _ENTRY_VALUE.__set__(self, value)
+
+def _packed(typecode, values):
+    column = array.array(typecode, values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+def _unpacked(typecode, buf, offset, count):
+    """Returns the array of ``count`` items at ``offset`` and the offset after it."""
+    column = array.array(typecode)
+    end = offset + count * column.itemsize
+    column.frombytes(buf[offset:end])
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column, end
+
+def dump(redis, path):
+    """Writes every database of MockRedis ``redis`` to the snapshot file ``path``.
+
+    The file is written aside and then moved in place, so snapshots of it
+    already loaded stay readable.
+    """
+    temporary = '{}.tmp{}'.format(path, os.getpid())
+    try:
+        with open(temporary, 'wb') as stream:
+            stream.write(MAGIC)
+            position = len(MAGIC)
+            table = [_COUNT.pack(len(redis.keyspaces))]
+            for index in sorted(redis.keyspaces):
+                position = _dump_keyspace(redis.keyspaces[index], index, stream, position, table)
+            stream.write(b''.join(table))
+            stream.write(_OFFSET.pack(position))
+    except BaseException:
+        os.remove(temporary)
+        raise
+    os.replace(temporary, path)
+
+def _dump_keyspace(keyspace, index, stream, position, table):
+    """Writes the values of ``keyspace`` at ``position`` of ``stream``,
+    appends its key table to ``table`` and returns the position after them."""
+    keyspace.used_memory     # Measures the containers modified in place.
+    now = keyspace.clock.time()
+    key_tags, key_names, value_types, ttls, sizes, offsets = [], [], [], [], [], []
+    for key, entry in keyspace.data.items():
+        if entry.deadline is None:
+            ttl = float('nan')
+        elif entry.deadline < now:
+            continue
+        else:
+            ttl = entry.deadline - now
+
+        tag, name = _encode_key(key)
+        parts = []
+        _encode_value(entry, parts)
+        data = b''.join(parts)
+        stream.write(data)
+
+        key_tags.append(tag)
+        key_names.append(name)
+        value_types.append(_TYPE_CODES[entry.type])
+        ttls.append(ttl)
+        sizes.append(entry.size)
+        offsets.append(position)
+        position += len(data)
+
+    names = b''.join(key_names)
+    table.append(_DATABASE.pack(index, len(key_names), len(names)))
+    table.append(b''.join(key_tags))
+    table.append(_packed(_LENGTHS, [len(name) for name in key_names]))
+    table.append(bytes(value_types))
+    table.append(_packed(_TTLS, ttls))
+    table.append(_packed(_SIZES, sizes))
+    table.append(_packed(_OFFSETS, offsets))
+    table.append(names)
+    return position
+
+def _read_keyspace(buf, offset, count, names_size, now):
+    """Returns the ``(key, Entry)`` pairs of the key table of ``count`` keys
+    at ``offset`` and the offset after it."""
+    key_tags = buf[offset:offset + count]
+    offset += count
+    lengths, offset = _unpacked(_LENGTHS, buf, offset, count)
+    value_types = buf[offset:offset + count]
+    offset += count
+    ttls, offset = _unpacked(_TTLS, buf, offset, count)
+    sizes, offset = _unpacked(_SIZES, buf, offset, count)
+    positions, offset = _unpacked(_OFFSETS, buf, offset, count)
+    names = buf[offset:offset + names_size]
+    offset += names_size
+
+    ends = list(itertools.accumulate(lengths))
+    starts = [0] + ends[:-1]
+    text = None
+    if key_tags.count(b's') == count:
+        # Text keys, by far the most common, are decoded all at once. The
+        # lengths count bytes, so it only works for ASCII names.
+        try:
+            text = names.decode('ascii')
+        except UnicodeDecodeError:
+            pass
+    if text is not None:
+        keys = [text[start:end] for start, end in zip(starts, ends)]
+    else:
+        keys = [_KEY_DECODERS[tag](names[start:end])
+                for tag, start, end in zip(key_tags, starts, ends)]
+
+    lazy = _LazyEntry
+    types = _TYPES
+    entries = [
+        lazy(types[code], (buf, position), None if ttl != ttl else now + ttl, size)
+        for code, ttl, size, position in zip(value_types, ttls, sizes, positions)]
+    return zip(keys, entries), offset
+
+def load(path, redis=None):
+    """Loads the snapshot file ``path`` into ``redis``, a new MockRedis by
+    default, and returns it. Databases missing from the file are emptied.
+
+    TTLs resume from the time of the dump on the clock of ``redis``.
+    """
+    redis = clients.MockRedis() if redis is None else redis
+    with open(path, 'rb') as stream:
+        buf = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    if buf[:len(MAGIC)] != MAGIC or len(buf) < len(MAGIC) + _OFFSET.size:
+        buf.close()
+        raise ValueError('Not a snapshot file.')
+
+    offset = _OFFSET.unpack_from(buf, len(buf) - _OFFSET.size)[0]
+    databases = _COUNT.unpack_from(buf, offset)[0]
+    offset += _COUNT.size
+    loaded = set()
+    # Loading only creates entries without reference cycles, yet the
+    # collections triggered by so many allocations would take about as
+    # long as the decoding itself.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(databases):
+            index, count, names_size = _DATABASE.unpack_from(buf, offset)
+            offset += _DATABASE.size
+            keyspace = redis.db(index)
+            entries, offset = _read_keyspace(buf, offset, count, names_size, keyspace.clock.time())
+            keyspace.load(entries)
+            loaded.add(index)
+    finally:
+        if collecting:
+            gc.enable()
+
+    for index, keyspace in redis.keyspaces.items():
+        if index not in loaded:
+            keyspace.clear()
+    return redis
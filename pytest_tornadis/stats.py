@@ -0,0 +1,167 @@
+"""
+    Fixed-memory latency statistics.
+"""
+
+import collections
+import math
+
+class LatencyHistogram(object):
+    """Histogram of durations in seconds with logarithmic buckets.
+
+    Each power of two of microseconds is split in ``SUB_BUCKETS`` buckets, so
+    percentiles are accurate to a few percent whatever the number of samples,
+    while memory stays bounded.
+    """
+
+    SUB_BUCKETS = 16
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+        bucket = self._bucket(seconds)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def _bucket(self, seconds):
+        micros = seconds * 1e6
+        if micros < 1:
+            return 0
+        return int(math.log2(micros) * self.SUB_BUCKETS) + 1
+
+    def _bucket_upper_bound(self, bucket):
+        if bucket == 0:
+            return 1e-6
+        return 2 ** (bucket / self.SUB_BUCKETS) * 1e-6
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """Returns an upper bound of the ``percent`` percentile, in seconds."""
+        if not self.count:
+            return 0.0
+
+        rank = math.ceil(self.count * percent / 100.0)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self._bucket_upper_bound(bucket), self.max)
+        return self.max
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min or 0.0,
+            'max': self.max or 0.0,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+        }
+
+class CommandStat(object):
+    """Counters of a single command."""
+
+    def __init__(self):
+        self.calls = 0
+        self.failed_calls = 0
+        self.arg_bytes = 0
+        self.latency = LatencyHistogram()
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.failed_calls += other.failed_calls
+        self.arg_bytes += other.arg_bytes
+        self.latency.merge(other.latency)
+
+    def as_dict(self):
+        """Returns the fields of the command's COMMANDSTATS line, times in microseconds."""
+        return collections.OrderedDict([
+            ('calls', self.calls),
+            ('usec', self.latency.total * 1e6),
+            ('usec_per_call', self.latency.mean * 1e6),
+            ('failed_calls', self.failed_calls),
+            ('arg_bytes', self.arg_bytes),
+            ('p50_usec', self.latency.percentile(50) * 1e6),
+            ('p99_usec', self.latency.percentile(99) * 1e6),
+        ])
+
+def _arg_size(arg):
+    if isinstance(arg, (bytes, str)):
+        return len(arg)
+    return len(str(arg))
+
+class CommandStats(object):
+    """Per-command call counts, argument sizes and latency histograms.
+
+    Commands are keyed by their lowercase name, as in Redis' COMMANDSTATS.
+    """
+
+    def __init__(self):
+        self.commands = {}
+
+    def __getitem__(self, name):
+        return self.commands[name]
+
+    def record(self, name, args, seconds, failed=False):
+        if isinstance(name, bytes):
+            name = name.decode('utf-8', 'replace')
+        name = name.lower()
+
+        stat = self.commands.get(name)
+        if stat is None:
+            stat = self.commands[name] = CommandStat()
+
+        stat.calls += 1
+        stat.arg_bytes += sum(_arg_size(arg) for arg in args[1:])
+        stat.latency.add(seconds)
+        if failed:
+            stat.failed_calls += 1
+
+    def calls(self, name=None):
+        """Returns the number of calls of command ``name``, or of all commands."""
+        if name is None:
+            return sum(stat.calls for stat in self.commands.values())
+
+        stat = self.commands.get(name.lower())
+        return 0 if stat is None else stat.calls
+
+    def hot(self, count=10):
+        """Returns the ``count`` ``(name, CommandStat)`` pairs with the most total time."""
+        ranked = sorted(self.commands.items(), key=lambda item: item[1].latency.total, reverse=True)
+        return ranked[:count]
+
+    def merge(self, other):
+        for name, stat in other.commands.items():
+            mine = self.commands.get(name)
+            if mine is None:
+                mine = self.commands[name] = CommandStat()
+            mine.merge(stat)
+
+    def reset(self):
+        self.commands.clear()
+
+    def as_dict(self):
+        return {name: stat.as_dict() for name, stat in self.commands.items()}
@@ -1,15 +1,14 @@
 import pytest
 
 from .. import clients
+from ..plugin import (mock_active_expire, mock_client_pool, mock_client_pool_size, mock_clock,  # noqa
+                      mock_cluster, mock_latency, mock_redis, mock_redis_seed, mock_redis_server,
+                      mock_redis_snapshot, mock_redis_stats)
 
 @pytest.fixture
-def pubsub_client():
-    client = clients.MockPubSubClient()
-    yield client
-    client.clear_mock_redis()
+def pubsub_client(mock_redis):
+    return clients.MockPubSubClient()
 
 @pytest.fixture
-def mock_client():
-    client = clients.MockClient()
-    yield client
-    client.clear_mock_redis()
+def mock_client(mock_redis):
+    return clients.MockClient()
@@ -0,0 +1,20 @@
+"""
+    Tests for the benchmark baseline comparison.
+"""
+
+from .. import benchmarks
+
+def test_compare_reports_regressions_only():
+    baseline = {'get.a': 1.0, 'get.b': 1.0, 'get.c': 1.0}
+    results = {'get.a': 1.2, 'get.b': 1.5, 'get.c': 0.5, 'get.new': 9.0}
+    assert benchmarks.compare(results, baseline) == [('get.b', 1.5)]
+    assert benchmarks.compare(results, baseline, threshold=0.1) == [('get.a', 1.2), ('get.b', 1.5)]
+
+def test_results_round_trip(tmp_path):
+    path = str(tmp_path / 'results.json')
+    results = benchmarks.run(['dispatch'])
+    assert all(seconds > 0 for seconds in results.values())
+
+    benchmarks.save(results, path)
+    assert benchmarks.load_results(path) == results
+    assert benchmarks.compare(results, benchmarks.load_results(path)) == []
@@ -0,0 +1,137 @@
+"""
+    Tests for the Redis Cluster emulation.
+"""
+
+import pytest
+import pytest_tornado
+
+from .. import clients, cluster
+
+def test_key_slot():
+    assert cluster.key_slot('123456789') == 12739
+    assert cluster.key_slot(b'foo') == 12182
+    assert cluster.key_slot('{user1000}.following') == cluster.key_slot('user1000')
+    assert cluster.key_slot('foo{}{bar}') == cluster.key_slot('foo{}{bar}')
+    assert cluster.key_slot('foo{}{bar}') != cluster.key_slot('bar')
+    assert cluster.key_slot('foo{{bar}}zap') == cluster.key_slot('{bar')
+
+def test_cluster_slot_ranges():
+    redis_cluster = cluster.MockCluster(nodes=3)
+    ranges = list(redis_cluster.slot_ranges())
+    assert [(first, last) for first, last, _ in ranges] == [(0, 5460), (5461, 10922), (10923, 16383)]
+    assert [node.port for _, _, node in ranges] == [7000, 7001, 7002]
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_cluster')
+async def test_cluster_client_redirects(mock_cluster):
+    client = cluster.MockClusterClient(follow_redirects=True)
+    for i in range(300):
+        assert await client.call('SET', 'user:{}'.format(i), i) == b'OK'
+    assert sorted(len(node.redis.db().data) for node in mock_cluster.nodes)[0] > 50
+    assert sum(mock_cluster.node_load().values()) == 300
+    assert len(mock_cluster.hot_slots(5)) == 5
+
+    owner = mock_cluster.node_for_key('user:1')
+    other = next(node for node in mock_cluster.nodes if node is not owner)
+    direct = cluster.MockClusterClient(port=owner.port)
+    assert await direct.call('GET', 'user:1') == 1
+    with pytest.raises(clients.CommandError) as excinfo:
+        await cluster.MockClusterClient(port=other.port).call('GET', 'user:1')
+    assert excinfo.value.code == 'MOVED'
+    assert str(excinfo.value) == '{} {}'.format(cluster.key_slot('user:1'), owner.address)
+
+    with pytest.raises(clients.CommandError) as excinfo:
+        await client.call('DEL', 'user:1', 'user:2')
+    assert excinfo.value.code == 'CROSSSLOT'
+    await client.call('SET', '{user:1}:name', 'foo')
+    assert await client.call('DEL', '{user:1}:name', '{user:1}:missing') == 1
+    assert mock_cluster.info()['crossslot_errors'] == 1
+
+    assert await direct.call('CLUSTER', 'KEYSLOT', 'user:1') == cluster.key_slot('user:1')
+    assert len(await direct.call('CLUSTER', 'SLOTS')) == 3
+    assert await direct.call('PING') == b'PONG'
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_cluster')
+async def test_cluster_resharding(mock_cluster):
+    keys = ['{{tag}}:{}'.format(i) for i in range(10)]
+    slot = cluster.key_slot('tag')
+    source = mock_cluster.slots[slot]
+    target = next(node for node in mock_cluster.nodes if node is not source)
+
+    client = cluster.MockClusterClient(follow_redirects=True)
+    for key in keys:
+        await client.call('SET', key, 'foo')
+
+    mock_cluster.start_migration(slot, target)
+    assert mock_cluster.migrate_keys(slot, count=4) == 4
+    moved = [key for key in keys if key in target.redis.db().data]
+    assert len(moved) == 4
+
+    # The source still serves the keys it has and sends the others to the target.
+    on_source = cluster.MockClusterClient(port=source.port)
+    on_target = cluster.MockClusterClient(port=target.port)
+    remaining = next(key for key in keys if key not in moved)
+    assert await on_source.call('GET', remaining) == 'foo'
+    with pytest.raises(clients.CommandError) as excinfo:
+        await on_source.call('GET', moved[0])
+    assert excinfo.value.code == 'ASK'
+    assert str(excinfo.value).endswith(target.address)
+
+    with pytest.raises(clients.CommandError) as excinfo:
+        await on_target.call('GET', moved[0])
+    assert excinfo.value.code == 'MOVED'
+    assert await on_target.call('ASKING') == b'OK'
+    assert await on_target.call('GET', moved[0]) == 'foo'
+    with pytest.raises(clients.CommandError):
+        await on_target.call('GET', moved[0])     # ASKING only covers the next command.
+    with pytest.raises(clients.CommandError) as excinfo:
+        await on_source.call('DEL', moved[0], remaining)
+    assert excinfo.value.code == 'TRYAGAIN'
+
+    assert await client.call('GET', moved[0]) == 'foo'
+    assert await client.call('GET', remaining) == 'foo'
+    with pytest.raises(clients.CommandError) as excinfo:
+        await client.call('MGET', moved[0], remaining)
+    assert excinfo.value.code == 'TRYAGAIN'
+
+    mock_cluster.finish_migration(slot)
+    assert mock_cluster.slots[slot] is target
+    assert not source.redis.db().data
+    assert await on_target.call('GET', remaining) == 'foo'
+    assert mock_cluster.info()['ask_redirects'] == 1
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_cluster')
+async def test_cluster_transactions(mock_cluster):
+    owner = mock_cluster.node_for_key('b')
+    assert mock_cluster.node_for_key('bar') is owner
+    assert mock_cluster.node_for_key('a') is not owner
+    client = cluster.MockClusterClient(port=owner.port)
+
+    await client.call('MULTI')
+    await client.call('SET', '{b}:name', 'foo')
+    assert await client.call('INCR', 'b') == b'QUEUED'
+    assert await client.call('EXEC') == [b'OK', 1]
+
+    # Redirected and cross-slot commands fail the transaction.
+    for args in (('SET', 'a', 1), ('DEL', 'b', 'bar')):
+        await client.call('MULTI')
+        await client.call('INCR', 'b')
+        with pytest.raises(clients.CommandError):
+            await client.call(*args)
+        with pytest.raises(clients.CommandError) as excinfo:
+            await client.call('EXEC')
+        assert excinfo.value.code == 'EXECABORT'
+
+    # Keys of different slots of the same node are rejected at EXEC.
+    await client.call('MULTI')
+    await client.call('INCR', 'b')
+    await client.call('INCR', 'bar')
+    with pytest.raises(clients.CommandError) as excinfo:
+        await client.call('EXEC')
+    assert excinfo.value.code == 'CROSSSLOT'
+    assert client.transaction is None
+    assert await client.call('MGET', 'b', '{b}:name') == [1, 'foo']
+    assert owner.redis.db().get_string('bar') is None
+    assert mock_cluster.info()['crossslot_errors'] == 2
@@ -0,0 +1,68 @@
+"""
+    Tests for latency and throughput shaping.
+"""
+
+import time
+
+import pytest
+import pytest_tornado
+import tornado.gen
+
+from .. import latency, stats
+
+def test_latency_distributions_are_seeded():
+    distribution = latency.Normal(0.01, 0.005)
+    first = latency.LatencyModel(default=distribution, seed=42)
+    second = latency.LatencyModel(default=distribution, seed=42)
+    samples = [first.reply_delay('get') for _ in range(100)]
+    assert samples == [second.reply_delay(b'GET') for _ in range(100)]
+    assert min(samples) >= 0.0
+
+    histogram = stats.LatencyHistogram()
+    for micros in (100, 100, 100, 5000):
+        histogram.add(micros * 1e-6)
+    recorded = latency.LatencyModel(default=latency.Recorded.from_histogram(histogram))
+    samples = {recorded.reply_delay('get') for _ in range(200)}
+    assert len(samples) == 2 and max(samples) == 5000e-6
+
+    model = latency.LatencyModel(commands={('get', 'hget'): latency.Fixed(0.5)})
+    assert model.reply_delay('HGET') == 0.5
+    assert model.reply_delay('set') == 0.0
+    with pytest.raises(ValueError):
+        latency.Recorded([])
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_latency')
+async def test_latency_delays_replies(mock_latency, mock_client):
+    mock_latency.set(('get', 'hget'), latency.Fixed(0.05))
+    start = time.perf_counter()
+    assert await mock_client.call('SET', 'test', 'foo') == b'OK'
+    assert time.perf_counter() - start < 0.05
+
+    start = time.perf_counter()
+    assert await mock_client.call('GET', 'test') == 'foo'
+    assert time.perf_counter() - start >= 0.05
+
+    # Errors are delayed like replies.
+    start = time.perf_counter()
+    with pytest.raises(ValueError):
+        await mock_client.call('HGET', 'test')
+    assert time.perf_counter() - start >= 0.05
+    assert mock_latency.delayed_calls == 2
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_latency')
+async def test_latency_throughput_queues_calls(mock_latency, mock_client):
+    mock_latency.throughput = 50
+    finished = []
+
+    @tornado.gen.coroutine
+    def call(name):
+        yield mock_client.call('SET', name, 'foo')
+        finished.append(name)
+
+    start = time.perf_counter()
+    await tornado.gen.multi([call(name) for name in ('a', 'b', 'c', 'd')])
+    assert finished == ['a', 'b', 'c', 'd']
+    assert time.perf_counter() - start >= 4 / 50.0
+    assert mock_latency.queued_time >= (1 + 2 + 3) / 50.0 * 0.9
@@ -2,10 +2,15 @@
     Tests for MockPubSub object.
 """
 
-import time
+import collections
+import random
+import threading
 
 import pytest
 import pytest_tornado
+import tornado.gen
+import tornado.ioloop
+import tornadis
 
 from .. import clients
 
@@ -20,7 +25,7 @@ async def test_valid_mockclient_call_publish(pubsub_client, mock_client):
     await pubsub_client.pubsub_subscribe('test')
     assert not pubsub_client._reply_list
     assert len(pubsub_client.channels['test']) == 1
-    assert pubsub_client.channels['test'][0] == pubsub_client
+    assert list(pubsub_client.channels['test']) == [pubsub_client]
 
     mock_client.call('PUBLISH', 'test', 'message')
     val = await pubsub_client.pubsub_pop_message()
@@ -38,7 +43,7 @@ async def test_mockclient_hmset(mock_client):
     assert 'test' not in mock_client.data
     result = await mock_client.call('HMSET', 'test', 'foo', 'bar')
     assert result == 'OK'.encode('utf-8')
-    assert mock_client.data['test'] == (clients.RedisCommands.HMSET, {'foo': 'bar'})
+    assert mock_client.data['test'] == clients.Entry(clients.ValueType.HASH, {'foo': 'bar'})
 
 @pytest.mark.gen_test
 @pytest.mark.usefixtures('mock_client')
@@ -47,8 +52,8 @@ async def test_mockclient_no_command(mock_client):
         await mock_client.call('NOTACOMMAND')
 
 @pytest.mark.gen_test
-@pytest.mark.usefixtures('mock_client')
-async def test_mockclient_get(mock_client):
+@pytest.mark.usefixtures('mock_client', 'mock_clock')
+async def test_mockclient_get(mock_client, mock_clock):
     assert 'test' not in mock_client.data
     result = await mock_client.call('GET', 'test')
     assert result is None
@@ -56,12 +61,12 @@ async def test_mockclient_get(mock_client):
     # Expired
     await mock_client.call('SETEX', 'test', 1, 'foo')
     assert 'test' in mock_client.data
-    time.sleep(5)
+    mock_clock.advance(5)
     result = await mock_client.call('GET', 'test')
     assert result is None
 
     # Success
-    mock_client.data['test'] = (clients.RedisCommands.SET, 'foo')
+    mock_client.data['test'] = clients.Entry(clients.ValueType.STRING, 'foo')
     result = await mock_client.call('GET', 'test')
     assert result == 'foo'
 
@@ -70,7 +75,7 @@ async def test_mockclient_get(mock_client):
 async def test_mockclient_set(mock_client):
     assert 'test' not in mock_client.data
     result = await mock_client.call('SET', 'test', 'foo')
-    assert mock_client.data['test'] == (clients.RedisCommands.SET, 'foo')
+    assert mock_client.data['test'] == clients.Entry(clients.ValueType.STRING, 'foo')
 
 @pytest.mark.gen_test
 @pytest.mark.usefixtures('mock_client')
@@ -87,12 +92,12 @@ async def test_mockclient_hget(mock_client):
     assert result is None
 
     # No field
-    mock_client.data['test'] = (clients.RedisCommands.HMSET, {'notfoo': 'bar'})
+    mock_client.data['test'] = clients.Entry(clients.ValueType.HASH, {'notfoo': 'bar'})
     result = await mock_client.call('HGET', 'test', 'foo')
     assert result is None
 
     # Success
-    mock_client.data['test'] = (clients.RedisCommands.HMSET, {'foo': 'bar'})
+    mock_client.data['test'] = clients.Entry(clients.ValueType.HASH, {'foo': 'bar'})
     result = await mock_client.call('HGET', 'test', 'foo')
     assert result is 'bar'
 
@@ -111,7 +116,7 @@ async def test_mockclient_hgetall(mock_client):
     assert result is None
 
     # Success
-    mock_client.data['test'] = (clients.RedisCommands.HMSET, {'foo': 'bar'})
+    mock_client.data['test'] = clients.Entry(clients.ValueType.HASH, {'foo': 'bar'})
     result = await mock_client.call('HGETALL', 'test')
     assert result == {'foo': 'bar'}
 
@@ -130,7 +135,7 @@ async def test_mockclient_hset(mock_client):
     assert result == 1
 
     # Success
-    mock_client.data['test'] = (clients.RedisCommands.HMSET, {})
+    mock_client.data['test'] = clients.Entry(clients.ValueType.HASH, {})
     result = await mock_client.call('HSET', 'test', 'foo', 'bar')
     assert result == 0
 
@@ -138,8 +143,8 @@ async def test_mockclient_hset(mock_client):
     assert result == {'foo': 'bar'}
 
 @pytest.mark.gen_test
-@pytest.mark.usefixtures('mock_client')
-async def test_mockclient_expire(mock_client):
+@pytest.mark.usefixtures('mock_client', 'mock_clock')
+async def test_mockclient_expire(mock_client, mock_clock):
     with pytest.raises(ValueError):
         await mock_client.call('EXPIRE', 'test')   # Too short
 
@@ -152,23 +157,23 @@ async def test_mockclient_expire(mock_client):
     assert result is 0
 
     # Success
-    mock_client.data['test'] = (clients.RedisCommands.SET, 'foo')
+    mock_client.data['test'] = clients.Entry(clients.ValueType.STRING, 'foo')
     result = await mock_client.call('EXPIRE', 'test', 1)
     assert result == 1
-    time.sleep(5)
+    mock_clock.advance(5)
     result = await mock_client.call('GET', 'test')
     assert result is None
 
 @pytest.mark.gen_test
 @pytest.mark.usefixtures('mock_client')
 async def test_mockclient_del(mock_client):
-    mock_client.data['test'] = (clients.RedisCommands.SET, 'foo')
+    mock_client.data['test'] = clients.Entry(clients.ValueType.STRING, 'foo')
     await mock_client.call('DEL', 'test')
     assert 'test' not in mock_client.data
 
 @pytest.mark.gen_test
-@pytest.mark.usefixtures('mock_client')
-async def test_mockclient_persist(mock_client):
+@pytest.mark.usefixtures('mock_client', 'mock_clock')
+async def test_mockclient_persist(mock_client, mock_clock):
     # No key
     assert 'test' not in mock_client.data
     result = await mock_client.call('PERSIST', 'test', 1)
@@ -178,9 +183,33 @@ async def test_mockclient_persist(mock_client):
     await mock_client.call('SETEX', 'test', 5, 'foo')
     result = await mock_client.call('PERSIST', 'test')
     assert result == 1
-    time.sleep(7)
+    mock_clock.advance(7)
     assert 'test' in mock_client.data
 
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client', 'mock_clock')
+async def test_mockclient_ttl(mock_client, mock_clock):
+    with pytest.raises(ValueError):
+        await mock_client.call('TTL')   # Too short
+
+    # No key
+    assert await mock_client.call('TTL', 'test') == -2
+    assert await mock_client.call('PTTL', 'test') == -2
+
+    # No TTL
+    await mock_client.call('SET', 'test', 'foo')
+    assert await mock_client.call('TTL', 'test') == -1
+    assert await mock_client.call('PTTL', 'test') == -1
+
+    # Success
+    await mock_client.call('EXPIRE', 'test', 10)
+    mock_clock.advance(2.5)
+    assert await mock_client.call('TTL', 'test') == 8
+    assert await mock_client.call('PTTL', 'test') == 7500
+
+    mock_clock.advance(8)
+    assert await mock_client.call('TTL', 'test') == -2
+
 @pytest.mark.gen_test
 @pytest.mark.usefixtures('mock_client')
 async def test_mockclient_RPUSH(mock_client):
@@ -193,12 +222,12 @@ async def test_mockclient_RPUSH(mock_client):
     assert 'test' not in mock_client.data
     result = await mock_client.call('RPUSH', 'test', 'foo')
     assert result == 1
-    assert mock_client.data['test'] == (clients.RedisCommands.SET, ['foo'])
+    assert mock_client.data['test'] == clients.Entry(clients.ValueType.LIST, collections.deque(['foo']))
 
     # Append List
     result = await mock_client.call('RPUSH', 'test', 'bar', 'foobar')
     assert result == 3
-    assert mock_client.data['test'] == (clients.RedisCommands.SET, ['foo', 'bar', 'foobar'])
+    assert mock_client.data['test'] == clients.Entry(clients.ValueType.LIST, collections.deque(['foo', 'bar', 'foobar']))
 
 @pytest.mark.gen_test
 @pytest.mark.usefixtures('mock_client')
@@ -212,7 +241,7 @@ async def test_mockclient_lrange(mock_client):
     result = await mock_client.call('LRANGE', 'test', 0)
     assert result == []
 
-    mock_client.data['test'] = (clients.RedisCommands.SET, ['foo', 'bar', 'foobar'])
+    mock_client.data['test'] = clients.Entry(clients.ValueType.LIST, collections.deque(['foo', 'bar', 'foobar']))
     assert 'test' in mock_client.data
     result = await mock_client.call('LRANGE', 'test', 4)
     assert result == []
@@ -226,15 +255,76 @@ async def test_mockclient_lrange(mock_client):
     result = await mock_client.call('LRANGE', 'test', 0, 1)
     assert result == ['foo', 'bar']
 
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client')
+async def test_mockclient_list_commands(mock_client):
+    assert await mock_client.call('LPUSH', 'test', 'c', 'b', 'a') == 3
+    assert await mock_client.call('RPUSH', 'test', 'd', 'e') == 5
+    assert await mock_client.call('LLEN', 'test') == 5
+    assert await mock_client.call('LLEN', 'missing') == 0
+
+    # Redis index semantics: inclusive stop, negative indices from the end.
+    assert await mock_client.call('LRANGE', 'test', 0, -1) == ['a', 'b', 'c', 'd', 'e']
+    assert await mock_client.call('LRANGE', 'test', -2, -1) == ['d', 'e']
+    assert await mock_client.call('LRANGE', 'test', -100, 1) == ['a', 'b']
+    assert await mock_client.call('LRANGE', 'test', 3, 100) == ['d', 'e']
+    assert await mock_client.call('LRANGE', 'test', 3, 2) == []
+    assert await mock_client.call('LRANGE', 'test', -1, -2) == []
+
+    assert await mock_client.call('LPOP', 'test') == 'a'
+    assert await mock_client.call('RPOP', 'test') == 'e'
+    assert await mock_client.call('LPOP', 'test', 2) == ['b', 'c']
+    assert await mock_client.call('RPOP', 'test', 5) == ['d']
+    assert 'test' not in mock_client.data
+    assert await mock_client.call('LPOP', 'test') is None
+    with pytest.raises(ValueError):
+        await mock_client.call('LPOP', 'test', -1)
+
+    # Capped log.
+    for i in range(10):
+        await mock_client.call('LPUSH', 'log', i)
+        await mock_client.call('LTRIM', 'log', 0, 2)
+    assert await mock_client.call('LRANGE', 'log', 0, -1) == [9, 8, 7]
+    assert await mock_client.call('LTRIM', 'log', 1, -1) == b'OK'
+    assert await mock_client.call('LRANGE', 'log', 0, -1) == [8, 7]
+    await mock_client.call('LTRIM', 'log', 5, 10)
+    assert 'log' not in mock_client.data
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis')
+async def test_mockclient_blocking_pop(mock_redis):
+    producer = clients.MockClient()
+    await producer.call('RPUSH', 'ready', 'foo')
+    assert await clients.MockClient().call('BRPOP', 'empty', 'ready', 0) == ['ready', 'foo']
+    assert await clients.MockClient().call('BLPOP', 'ready', 0.01) is None
+
+    first = clients.MockClient().call('BLPOP', 'jobs', 'other', 0)
+    second = clients.MockClient().call('BRPOP', 'jobs', 0)
+    await tornado.gen.sleep(0)
+    assert not first.done() and not second.done()
+
+    # Pushes wake the blocked clients in the order they blocked.
+    assert await producer.call('RPUSH', 'jobs', 'a', 'b', 'c') == 3
+    assert await first == ['jobs', 'a']
+    assert await second == ['jobs', 'c']
+    assert await producer.call('LRANGE', 'jobs', 0, -1) == ['b']
+
+    third = clients.MockClient().call('BRPOP', 'other', 0)
+    await tornado.gen.sleep(0)
+    await producer.call('LPUSH', 'other', 'x')
+    assert await third == ['other', 'x']
+    assert 'other' not in producer.data
+    assert not mock_redis.db(0)._blocked
+
 @pytest.mark.gen_test
 @pytest.mark.usefixtures('mock_client')
 async def test_mockclient_sadd(mock_client):
     assert 'test' not in mock_client.data
     result = await mock_client.call('SADD', 'test', 0)
-    assert mock_client.data['test'] == (clients.RedisCommands.SET, set([0]))
+    assert mock_client.data['test'] == clients.Entry(clients.ValueType.SET, set([0]))
 
     result = await mock_client.call('SADD', 'test', 0, 1, 3)
-    assert mock_client.data['test'] == (clients.RedisCommands.SET, set([0, 1, 3]))
+    assert mock_client.data['test'] == clients.Entry(clients.ValueType.SET, set([0, 1, 3]))
 
 @pytest.mark.gen_test
 @pytest.mark.usefixtures('mock_client')
@@ -247,3 +337,708 @@ async def test_mockclient_smembers(mock_client):
     assert 'test' in mock_client.data
     result = await mock_client.call('SMEMBERS', 'test')
     assert isinstance(result, list) and set(result) == set([0, 1, 3])
+
+def test_sorted_set():
+    rng = random.Random(0)
+    zset = clients.SortedSet()
+    reference = {}
+    for _ in range(3000):
+        member = 'member{}'.format(rng.randrange(300))
+        if rng.random() < 0.7:
+            score = rng.randrange(50)
+            assert zset.add(member, score) == (member not in reference)
+            reference[member] = score
+        else:
+            assert zset.remove(member) == (member in reference)
+            reference.pop(member, None)
+
+    order = sorted(reference, key=lambda member: (reference[member], member))
+    assert list(zset) == order
+    assert [zset.rank(member) for member in order] == list(range(len(order)))
+    assert zset.rank(order[0], reverse=True) == len(order) - 1
+    assert [member for member, _ in zset.range_by_rank(5, 9)] == order[5:10]
+    assert [member for member, _ in zset.range_by_rank(0, 2, reverse=True)] == order[::-1][:3]
+
+    expected = [member for member in order if 10 < reference[member] <= 20]
+    assert zset.count(10, 20, low_exclusive=True) == len(expected)
+    assert [member for member, _ in zset.range_by_score(10, 20, low_exclusive=True)] == expected
+    window = zset.range_by_score(10, 20, low_exclusive=True, reverse=True, offset=2, count=3)
+    assert [member for member, _ in window] == expected[::-1][2:5]
+    assert zset.copy() == zset
+
+    entries = clients.SortedList([1, 3])
+    with pytest.raises(ValueError):
+        entries.remove(2)
+    with pytest.raises(ValueError):
+        entries.remove(4)
+    assert list(entries) == [1, 3]
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client')
+async def test_mockclient_zset_commands(mock_client):
+    assert await mock_client.call('ZADD', 'board', 10, 'a', 20, 'b', 30, 'c') == 3
+    assert await mock_client.call('ZADD', 'board', 'CH', 15, 'a', 40, 'd') == 2
+    assert await mock_client.call('ZADD', 'board', 'NX', 0, 'a') == 0
+    assert await mock_client.call('ZADD', 'board', 'XX', 0, 'missing') == 0
+    assert await mock_client.call('ZADD', 'board', 'INCR', 5, 'a') == 20.0
+    assert await mock_client.call('ZINCRBY', 'board', -1, 'b') == 19.0
+    assert await mock_client.call('ZSCORE', 'board', 'a') == 20.0
+    assert await mock_client.call('ZCARD', 'board') == 4
+    assert await mock_client.call('TYPE', 'board') == b'zset'
+
+    assert await mock_client.call('ZRANGE', 'board', 0, -1) == ['b', 'a', 'c', 'd']
+    assert await mock_client.call('ZREVRANGE', 'board', 0, 1, 'WITHSCORES') == ['d', 40.0, 'c', 30.0]
+    assert await mock_client.call('ZRANK', 'board', 'c') == 2
+    assert await mock_client.call('ZREVRANK', 'board', 'c') == 1
+    assert await mock_client.call('ZRANK', 'board', 'missing') is None
+    assert await mock_client.call('ZCOUNT', 'board', '(19', '+inf') == 3
+
+    assert await mock_client.call('ZRANGEBYSCORE', 'board', 20, '(40') == ['a', 'c']
+    assert await mock_client.call('ZRANGEBYSCORE', 'board', '-inf', '+inf', 'LIMIT', 1, 2) == ['a', 'c']
+    assert await mock_client.call('ZREVRANGEBYSCORE', 'board', 40, 20, 'WITHSCORES', 'LIMIT', 0, 1) == \
+        ['d', 40.0]
+    with pytest.raises(ValueError):
+        await mock_client.call('ZRANGEBYSCORE', 'board', 'low', 40)
+
+    # Sliding-window rate limiter.
+    assert await mock_client.call('ZREMRANGEBYSCORE', 'board', '-inf', '(30') == 2
+    assert await mock_client.call('ZREMRANGEBYRANK', 'board', 0, 0) == 1
+    assert await mock_client.call('ZREM', 'board', 'd', 'missing') == 1
+    assert 'board' not in mock_client.data
+
+    # Members of different types tying on score.
+    assert await mock_client.call('ZADD', 'mixed', 1, 42) == 1
+    assert await mock_client.call('ZADD', 'mixed', 2, 'x', 2, b'y') == 2
+    assert await mock_client.call('ZADD', 'mixed', 2, 42) == 0
+    assert await mock_client.call('ZRANGE', 'mixed', 0, -1) == [b'y', 42, 'x']
+    assert await mock_client.call('ZRANK', 'mixed', 'x') == 2
+    assert await mock_client.call('ZREM', 'mixed', 42, 'x', b'y') == 3
+    assert 'mixed' not in mock_client.data
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis', 'mock_client')
+async def test_mockclient_transactions(mock_redis, mock_client):
+    assert await mock_client.call('MULTI') == b'OK'
+    assert await mock_client.call('SET', 'stock', 10) == b'QUEUED'
+    assert await mock_client.call('HGET', 'stock', 'field') == b'QUEUED'
+    assert await mock_client.call('BLPOP', 'queue', 0) == b'QUEUED'
+    assert 'stock' not in mock_client.data
+    replies = await mock_client.call('EXEC')
+    assert replies[0] == b'OK'
+    assert isinstance(replies[1], clients.CommandError) and replies[1].code == 'WRONGTYPE'
+    assert replies[2] is None     # Blocking pops do not block in a transaction.
+
+    with pytest.raises(ValueError):
+        await mock_client.call('EXEC')
+    await mock_client.call('MULTI')
+    with pytest.raises(ValueError):
+        await mock_client.call('NOTACOMMAND')
+    with pytest.raises(clients.CommandError) as excinfo:
+        await mock_client.call('EXEC')
+    assert excinfo.value.code == 'EXECABORT'
+
+    # So does a command with a wrong number of arguments, checked when queued.
+    await mock_client.call('MULTI')
+    assert await mock_client.call('SET', 'partial', 1) == b'QUEUED'
+    with pytest.raises(ValueError):
+        await mock_client.call('SET', 'other')
+    with pytest.raises(clients.CommandError) as excinfo:
+        await mock_client.call('EXEC')
+    assert excinfo.value.code == 'EXECABORT'
+    assert 'partial' not in mock_client.data
+
+    # A watched key modified by another client aborts the transaction.
+    other = clients.MockClient()
+    await mock_client.call('WATCH', 'stock')
+    await other.call('SET', 'stock', 9)
+    await mock_client.call('MULTI')
+    await mock_client.call('SET', 'stock', 0)
+    assert await mock_client.call('EXEC') is None
+    assert await mock_client.call('GET', 'stock') == 9
+
+    # Watches end with EXEC or DISCARD.
+    await mock_client.call('WATCH', 'stock')
+    await mock_client.call('MULTI')
+    assert await mock_client.call('DISCARD') == b'OK'
+    await other.call('SET', 'stock', 8)
+    await mock_client.call('MULTI')
+    assert await mock_client.call('EXEC') == []
+
+    assert mock_redis.executed_transactions == 2
+    assert mock_redis.aborted_transactions == 1
+    assert not mock_client.keyspace._versions
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis', 'mock_clock')
+async def test_mockclient_optimistic_locking(mock_redis, mock_clock):
+    workers = [clients.MockClient() for _ in range(20)]
+    await workers[0].call('SET', 'counter', 0)
+
+    @tornado.gen.coroutine
+    def increment(client):
+        while True:
+            yield client.call('WATCH', 'counter')
+            value = yield client.call('GET', 'counter')
+            yield tornado.gen.sleep(0)     # Let the other workers interleave.
+            yield client.call('MULTI')
+            yield client.call('SET', 'counter', value + 1)
+            if (yield client.call('EXEC')) is not None:
+                return
+
+    await tornado.gen.multi([increment(client) for client in workers])
+    assert await workers[0].call('GET', 'counter') == 20
+    assert mock_redis.executed_transactions == 20
+    assert mock_redis.aborted_transactions > 0
+    assert mock_redis.info('stats')['transactions_aborted'] == mock_redis.aborted_transactions
+
+    # Expiry and flushes count as modifications.
+    client = workers[0]
+    await client.call('SETEX', 'session', 1, 'foo')
+    await client.call('WATCH', 'session')
+    mock_clock.advance(2)
+    await client.call('MULTI')
+    assert await client.call('EXEC') is None
+    await client.call('WATCH', 'counter')
+    mock_redis.clear()
+    await client.call('MULTI')
+    assert await client.call('EXEC') is None
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client')
+async def test_mockclient_call_resolved(mock_client):
+    # Synchronous commands reply with a resolved Future, errors included.
+    future = mock_client.call('SET', 'test', 'foo')
+    assert future.done() and future.result() == b'OK'
+    failed = mock_client.call('NOTACOMMAND')
+    assert failed.done() and isinstance(failed.exception(), ValueError)
+    assert not mock_client.call('BLPOP', 'empty', 0.01).done()
+
+    @tornado.gen.coroutine
+    def legacy():
+        return (yield mock_client.call('GET', 'test'))
+
+    assert await legacy() == 'foo'
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client')
+async def test_mockclient_bulk_and_counter_commands(mock_client):
+    assert await mock_client.call('MSET', 'a', 1, 'b', 2) == b'OK'
+    await mock_client.call('SADD', 'set', 'member')
+    assert await mock_client.call('MGET', 'a', 'missing', 'set', 'b') == [1, None, None, 2]
+    with pytest.raises(ValueError):
+        await mock_client.call('MSET', 'a', 1, 'b')
+
+    await mock_client.call('HMSET', 'hash', 'x', 1, 'y', 'text')
+    assert await mock_client.call('HMGET', 'hash', 'x', 'z', 'y') == [1, None, 'text']
+    assert await mock_client.call('HMGET', 'missing', 'x', 'y') == [None, None]
+    assert await mock_client.call('HINCRBY', 'hash', 'x', 41) == 42
+    assert await mock_client.call('HINCRBY', 'hash', 'new', -1) == -1
+    with pytest.raises(ValueError) as excinfo:
+        await mock_client.call('HINCRBY', 'hash', 'y', 1)
+    assert str(excinfo.value) == 'hash value is not an integer'
+    assert await mock_client.call('HDEL', 'hash', 'x', 'y', 'z') == 2
+    assert await mock_client.call('HDEL', 'hash', 'new') == 1
+    assert 'hash' not in mock_client.data
+
+    assert await mock_client.call('INCR', 'counter') == 1
+    assert await mock_client.call('INCRBY', 'counter', b'-11') == -10
+    await mock_client.call('SET', 'text', b'17')
+    assert await mock_client.call('INCR', 'text') == 18
+    for value in (b'+1', b' 1', b'01', b'-0', b'1.0', 1.0, b'9223372036854775808'):
+        with pytest.raises(ValueError):
+            await mock_client.call('INCRBY', 'counter', value)
+    await mock_client.call('SET', 'max', 2 ** 63 - 1)
+    with pytest.raises(ValueError) as excinfo:
+        await mock_client.call('INCR', 'max')
+    assert str(excinfo.value) == 'increment or decrement would overflow'
+    with pytest.raises(clients.CommandError):
+        await mock_client.call('INCR', 'set')
+
+def test_keyspace_incr_in_place():
+    keyspace = clients.Keyspace()
+    keyspace.put('counter', 1, ttl=100)
+    entry = keyspace.data['counter']
+    assert keyspace.incr('counter', 2) == 3
+    assert keyspace.data['counter'] is entry and entry.deadline is not None
+
+    # An entry shared with a snapshot is replaced instead.
+    snapshot = keyspace.snapshot()
+    assert keyspace.incr('counter', 1) == 4
+    assert snapshot.data['counter'].value == 3
+
+@pytest.mark.gen_test
+@pytest.mark.parametrize('mock_client_pool_size', [2])
+@pytest.mark.usefixtures('mock_redis', 'mock_client_pool')
+async def test_mock_client_pool(mock_redis, mock_client_pool):
+    pool = mock_client_pool
+    first = await pool.get_connected_client()
+    second = pool.get_client_nowait()
+    assert isinstance(first, clients.MockClient) and first.redis is mock_redis
+    assert pool.get_client_nowait() is None
+
+    # The pool is exhausted: the next caller waits for a release.
+    waiting = pool.get_connected_client()
+    await tornado.gen.sleep(0.01)
+    assert not waiting.done()
+    pool.release_client(first)
+    third = await waiting
+    assert third is first
+    assert pool.waits == 1 and pool.wait_times.max >= 0.01
+    assert pool.peak_checked_out == 2
+
+    assert [client for client, _ in pool.leaks()] == [second, third]
+    pool.release_client(second)
+    pool.release_client(third)
+
+    @tornado.gen.coroutine
+    def use_pool():
+        with (yield pool.connected_client()) as client:
+            return (yield client.call('SET', 'test', 'foo'))
+
+    assert await use_pool() == b'OK'
+    assert mock_redis.db().get('test') == 'foo'
+    assert not pool.leaks()
+    assert pool.as_dict()['checkouts'] == 4
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client')
+async def test_mockclient_register_command(mock_client):
+    class CustomClient(clients.MockClient):
+        pass
+
+    @CustomClient.register_command('SHOUT')
+    def shout(client, *args):
+        return args[1].upper()
+
+    client = CustomClient()
+    assert await client.call('SHOUT', 'foo') == 'FOO'
+    assert await client.call(b'shout', b'foo') == b'FOO'
+    assert await client.call('SET', 'test', 'foo') == b'OK'
+
+    # Registering on a subclass leaves the parent untouched.
+    assert 'shout' not in clients.MockClient.commands
+    with pytest.raises(ValueError):
+        await mock_client.call('SHOUT', 'foo')
+
+    # Commands registered on the parent afterwards reach the subclass.
+    clients.MockClient.register_command('WHISPER', lambda client, *args: args[1].lower())
+    try:
+        assert await client.call('WHISPER', 'FOO') == 'foo'
+    finally:
+        del clients.MockClient.commands['whisper']
+        del clients.MockClient.commands[b'whisper']
+
+def test_keyspace_typed_helpers():
+    keyspace = clients.Keyspace()
+    assert keyspace.get_hash('test') is None
+
+    assert keyspace.get_hash('test', create=True) == {}
+    assert keyspace.data['test'] == clients.Entry(clients.ValueType.HASH, {})
+
+    # In-place updates keep the TTL.
+    assert keyspace.expire('test', 100)
+    keyspace.get_hash('test')['foo'] = 'bar'
+    assert keyspace.data['test'].deadline is not None
+    assert keyspace.get('test') == {'foo': 'bar'}
+
+    keyspace.put('string', 'foo')
+    for getter in (keyspace.get_hash, keyspace.get_list, keyspace.get_set):
+        with pytest.raises(clients.CommandError) as excinfo:
+            getter('string', create=True)
+        assert excinfo.value.code == 'WRONGTYPE'
+    with pytest.raises(clients.CommandError):
+        keyspace.get_string('test')
+
+    assert keyspace.delete('test')
+    assert not keyspace.delete('test')
+
+def test_keyspace_expire_cycle():
+    clock = clients.VirtualClock(start=0)
+    keyspace = clients.Keyspace(clock=clock)
+    for i in range(10):
+        keyspace.put(i, 'foo', ttl=1 + i)
+    keyspace.put('persistent', 'foo')
+    keyspace.put('persisted', 'foo', ttl=1)
+    keyspace.persist('persisted')
+
+    assert keyspace.expire_cycle() == 0
+    clock.advance(5.5)
+    # The stale deadline of the persisted key counts toward the limit.
+    assert keyspace.expire_cycle(limit=2) == 1
+    assert keyspace.expire_cycle() == 4
+    assert len(keyspace.data) == 7
+    assert keyspace.expired_keys == 5
+    assert keyspace.expire_cycles == 3
+
+    # Re-expiring a key leaves a stale heap entry behind that must be ignored.
+    keyspace.expire(9, 100)
+    clock.advance(10)
+    assert keyspace.expire_cycle() == 4
+    assert set(keyspace.data) == {9, 'persistent', 'persisted'}
+
+    # Rewriting TTLs leaves stale deadlines that are popped a bounded
+    # number at a time.
+    for seconds in range(1, 6):
+        keyspace.expire(9, seconds)
+    clock.advance(4.5)
+    assert keyspace.expire_cycle(limit=2) == 0
+    assert len(keyspace._expires) == 4
+    assert keyspace.expire_cycle(limit=2) == 0
+    clock.advance(1)
+    assert keyspace.expire_cycle(limit=2) == 1
+
+def test_keyspace_scan():
+    clock = clients.VirtualClock(start=0)
+    keyspace = clients.Keyspace(clock=clock)
+    for i in range(500):
+        keyspace.put('key:{}'.format(i), 'foo')
+    keyspace.put('short', 'foo', ttl=1)
+
+    # Keys present for the whole iteration come back exactly once, however
+    # many keys are created and deleted between calls.
+    seen = []
+    cursor, created = 0, 0
+    while True:
+        cursor, keys = keyspace.scan(cursor, count=20)
+        assert len(keys) <= 20
+        seen.extend(keys)
+        keyspace.delete('key:{}'.format(created * 2 + 1))
+        keyspace.put('new:{}'.format(created), 'foo')
+        created += 1
+        if not cursor:
+            break
+    stable = ['key:{}'.format(i) for i in range(0, 500, 2)]
+    assert sorted(key for key in seen if key in stable) == sorted(stable)
+    assert len(seen) == len(set(seen))
+
+    clock.advance(2)
+    cursor, keys = 0, []
+    while True:
+        cursor, batch = keyspace.scan(cursor, count=1000, match='new:1?')
+        keys.extend(batch)
+        if not cursor:
+            break
+    assert sorted(keys) == ['new:{}'.format(i) for i in range(10, 20)]
+    assert 'short' not in keyspace.data
+
+def test_keyspace_keys():
+    keyspace = clients.Keyspace()
+    for i in range(100):
+        keyspace.put('user:{}'.format(i), 'foo')
+        keyspace.put('session:{}'.format(i), 'foo')
+    keyspace.put(b'user:bytes', 'foo')
+
+    assert sorted(keyspace.keys('user:1?')) == ['user:{}'.format(i) for i in range(10, 20)]
+    assert keyspace.keys('user:42') == ['user:42']
+    assert keyspace.keys(b'user:*') == [b'user:bytes']
+    assert len(keyspace.keys('*')) == 200
+
+    # The prefix index follows later writes.
+    keyspace.put('user:1000', 'foo')
+    keyspace.delete('user:10')
+    assert keyspace.keys('user:10*') == ['user:1000']
+    keyspace.clear()
+    assert keyspace.keys('user:*') == []
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client')
+async def test_mockclient_scan_commands(mock_client):
+    for i in range(30):
+        await mock_client.call('SET', 'key:{}'.format(i), 'foo')
+    await mock_client.call('HMSET', 'hash', 'a', 1, 'b', 2)
+    await mock_client.call('SADD', 'big', *range(300))
+
+    cursor, keys = await mock_client.call('SCAN', 0, 'COUNT', 100, 'TYPE', 'hash')
+    assert (cursor, keys) == (b'0', ['hash'])
+    cursor, keys = await mock_client.call('SCAN', 0, 'MATCH', 'key:2*', 'COUNT', 5)
+    assert cursor != b'0' and len(keys) <= 5
+    assert sorted(await mock_client.call('KEYS', 'key:2*')) == \
+        ['key:2'] + ['key:{}'.format(i) for i in range(20, 30)]
+    with pytest.raises(ValueError):
+        await mock_client.call('SCAN', 0, 'COUNT', 0)
+    with pytest.raises(ValueError):
+        await mock_client.call('SCAN', 0, 'TYPE', 'stream')
+
+    # Small hashes come back whole.
+    assert await mock_client.call('HSCAN', 'hash', 0) == [b'0', ['a', 1, 'b', 2]]
+    assert await mock_client.call('HSCAN', 'missing', 0) == [b'0', []]
+
+    members = []
+    cursor = 0
+    while True:
+        cursor, batch = await mock_client.call('SSCAN', 'big', cursor, 'COUNT', 50)
+        assert len(batch) <= 50
+        members.extend(batch)
+        if members and len(members) <= 50:
+            await mock_client.call('SADD', 'big', 'added')
+        if cursor == b'0':
+            break
+    assert sorted(members) == list(range(300))
+
+    cursor, batch = await mock_client.call('SSCAN', 'big', 0, 'MATCH', '1*', 'COUNT', 1000)
+    assert cursor == b'0' and batch == []     # Integer members never match a text pattern.
+    with pytest.raises(ValueError):
+        await mock_client.call('SSCAN', 'big', 12345)
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client', 'mock_clock', 'mock_active_expire')
+async def test_mockclient_active_expire(mock_client, mock_clock, mock_active_expire):
+    expired_keys = mock_active_expire.expired_keys
+    await mock_client.call('SETEX', 'test', 1, 'foo')
+    mock_clock.advance(2)
+    await tornado.gen.sleep(mock_active_expire.active_expire_interval * 2)
+    assert 'test' not in mock_client.data
+    assert mock_active_expire.expired_keys == expired_keys + 1
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client')
+async def test_mockclient_pipeline(mock_client):
+    pipeline = tornadis.Pipeline()
+    result = await mock_client.call(pipeline)
+    assert isinstance(result, tornadis.ClientError)
+    assert mock_client.pipeline_sizes == []
+
+    pipeline.stack_call('SET', 'test', 'foo')
+    pipeline.stack_call('NOTACOMMAND')
+    pipeline.stack_call('HSET', 'hash', 'foo', 'bar')
+    pipeline.stack_call('GET', 'test')
+    pipeline.stack_call('SET', 'test')
+    result = await mock_client.call(pipeline)
+    assert result[0] == b'OK'
+    assert isinstance(result[1], ValueError)
+    assert result[2:4] == [1, 'foo']
+    assert isinstance(result[4], IndexError)
+    assert mock_client.pipeline_sizes == [5]
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis', 'mock_client')
+async def test_mockclient_select(mock_redis, mock_client):
+    with pytest.raises(ValueError):
+        await mock_client.call('SELECT', 16)
+
+    await mock_client.call('SET', 'test', 'foo')
+    assert await mock_client.call('SELECT', 1) == b'OK'
+    assert await mock_client.call('GET', 'test') is None
+    assert 'test' not in mock_client.data
+
+    await mock_client.call('SET', 'test', 'bar')
+    assert await clients.MockClient(db=1).call('GET', 'test') == 'bar'
+    assert await clients.MockClient().call('GET', 'test') == 'foo'
+    assert set(mock_redis.keyspaces) == {0, 1}
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis')
+async def test_mockclient_isolated_redis(mock_redis):
+    client = clients.MockClient()
+    assert client.redis is mock_redis
+    await client.call('SET', 'test', 'foo')
+
+    other_redis = clients.MockRedis()
+    other = clients.MockClient(redis=other_redis)
+    assert await other.call('GET', 'test') is None
+
+    token = other_redis.activate()
+    assert clients.MockClient().redis is other_redis
+    other_redis.deactivate(token)
+    assert clients.MockClient().redis is mock_redis
+
+def test_mockclient_redis_per_thread():
+    def run(results, index):
+        redis = clients.MockRedis()
+        redis.activate()
+        client = clients.MockClient()
+
+        async def set_and_get():
+            await client.call('SET', 'test', index)
+            await tornado.gen.sleep(0.01)
+            return await client.call('GET', 'test')
+
+        results[index] = tornado.ioloop.IOLoop().run_sync(set_and_get)
+
+    results = {}
+    threads = [threading.Thread(target=run, args=(results, i)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: i for i in range(4)}
+
+def test_keyspace_snapshot():
+    keyspace = clients.Keyspace()
+    keyspace.put('string', 'foo')
+    keyspace.get_hash('hash', create=True)['foo'] = 'bar'
+    keyspace.get_list('list', create=True).append('foo')
+    keyspace.put('volatile', 'foo', ttl=100)
+
+    snapshot = keyspace.snapshot()
+    assert len(snapshot) == 4
+
+    # Writes to the original do not reach the snapshot.
+    keyspace.get_hash('hash', create=True)['foo'] = 'foobar'
+    keyspace.delete('string')
+    assert snapshot.data['hash'].value == {'foo': 'bar'}
+
+    forked = clients.Keyspace()
+    forked.restore(snapshot)
+    assert forked.get_hash('hash') == {'foo': 'bar'}
+    assert forked.data['list'] is snapshot.data['list']
+    forked.get_list('list', create=True).append('bar')
+    assert list(forked.get('list')) == ['foo', 'bar']
+    assert list(snapshot.data['list'].value) == ['foo']
+    assert forked.get('string') == 'foo'
+    assert 0 < forked.ttl('volatile') <= 100
+
+    keyspace.restore(snapshot)
+    assert keyspace.get_hash('hash') == {'foo': 'bar'}
+
+def test_keyspace_memory_usage():
+    keyspace = clients.Keyspace()
+    assert keyspace.used_memory == 0
+    assert keyspace.memory_usage('string') is None
+
+    keyspace.put('string', 'foo')
+    assert keyspace.memory_usage('string') == keyspace.used_memory > len('string') + len('foo')
+
+    small = keyspace.used_memory
+    keyspace.get_hash('hash', create=True).update(('field{}'.format(i), 'x' * 100) for i in range(100))
+    assert keyspace.used_memory > small + 100 * 100
+    assert keyspace.used_memory == small + keyspace.memory_usage('hash')
+    exact = keyspace.memory_usage('hash', samples=0)
+    assert abs(keyspace.memory_usage('hash') - exact) < exact * 0.05
+
+    # Accounting survives snapshots without leaking between their copies.
+    keyspace.get_list('list', create=True).extend(['x'] * 10)
+    snapshot = keyspace.snapshot()
+    forked = clients.Keyspace()
+    forked.restore(snapshot)
+    keyspace.get_hash('hash', create=True).clear()
+    assert forked.used_memory > keyspace.used_memory
+    assert forked.used_memory == sum(forked.memory_usage(key) for key in forked.data)
+    assert snapshot.used_memory < forked.used_memory
+
+    keyspace.delete('hash')
+    keyspace.delete('list')
+    keyspace.delete('string')
+    assert keyspace.used_memory == 0
+
+@pytest.mark.parametrize('policy,evicted', [
+    ('allkeys-lru', {'b', 'c'}),
+    ('allkeys-lfu', {'b', 'c'}),
+    ('volatile-ttl', {'c', 'a'}),
+])
+def test_keyspace_maxmemory_eviction(policy, evicted):
+    clock = clients.VirtualClock(start=0)
+    keyspace = clients.Keyspace(clock=clock)
+    keyspace.maxmemory_policy = policy
+    keyspace.put('a', 'x' * 100, ttl=20)
+    keyspace.put('b', 'x' * 100)
+    keyspace.put('c', 'x' * 100, ttl=10)
+    keyspace.get('a')
+    keyspace.get('a')
+
+    keyspace.maxmemory = keyspace.used_memory
+    keyspace.put('d', 'x' * 200)
+    keyspace.put('e', 'x')
+    assert set(keyspace.data) == {'a', 'b', 'c', 'd', 'e'} - evicted
+    assert keyspace.evicted_keys == 2
+    assert keyspace.used_memory <= keyspace.maxmemory + keyspace.memory_usage('e')
+
+def test_keyspace_maxmemory_noeviction():
+    keyspace = clients.Keyspace()
+    with pytest.raises(ValueError):
+        keyspace.maxmemory_policy = 'allkeys-random'
+
+    keyspace.maxmemory = 1
+    keyspace.put('a', 'foo')
+    with pytest.raises(clients.CommandError) as excinfo:
+        keyspace.put('b', 'foo')
+    assert excinfo.value.code == 'OOM'
+    assert keyspace.delete('a')
+    keyspace.put('b', 'foo')
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis')
+async def test_mockclient_type_and_memory(mock_redis, mock_client):
+    await mock_client.call('SET', 'string', 'foo')
+    await mock_client.call('SADD', 'set', 'foo')
+    assert await mock_client.call('TYPE', 'string') == b'string'
+    assert await mock_client.call('TYPE', 'set') == b'set'
+    assert await mock_client.call('TYPE', 'missing') == b'none'
+    with pytest.raises(clients.CommandError):
+        await mock_client.call('RPUSH', 'string', 'foo')
+
+    usage = await mock_client.call('MEMORY', 'USAGE', 'string')
+    assert usage == mock_redis.db(0).memory_usage('string')
+    assert await mock_client.call('MEMORY', 'USAGE', 'set', 'SAMPLES', 0) > 0
+    assert await mock_client.call('MEMORY', 'USAGE', 'missing') is None
+
+    mock_redis.maxmemory = mock_redis.used_memory
+    mock_redis.maxmemory_policy = 'allkeys-lru'
+    await mock_client.call('SET', 'other', 'x' * 10)
+    await mock_client.call('SET', 'more', 'x')
+    assert 'string' not in mock_client.data and 'more' in mock_client.data
+    assert mock_redis.info('stats')['evicted_keys'] >= 1
+    assert mock_redis.info('memory')['maxmemory_policy'] == 'allkeys-lru'
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis')
+async def test_mockredis_fork(mock_redis):
+    client = clients.MockClient()
+    await client.call('SADD', 'test', 'foo')
+    await client.call('SELECT', 2)
+    await client.call('SET', 'test', 'bar')
+
+    forked = mock_redis.fork()
+    forked_client = clients.MockClient(redis=forked)
+    await forked_client.call('SADD', 'test', 'bar')
+    assert set(await clients.MockClient().call('SMEMBERS', 'test')) == {'foo'}
+    assert set(await forked_client.call('SMEMBERS', 'test')) == {'foo', 'bar'}
+    assert await clients.MockClient(redis=forked, db=2).call('GET', 'test') == 'bar'
+
+    await clients.MockClient().call('DEL', 'test')
+    mock_redis.restore(forked.snapshot())
+    assert set(await clients.MockClient().call('SMEMBERS', 'test')) == {'foo', 'bar'}
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis_stats')
+async def test_mockredis_stats(mock_redis, mock_redis_stats):
+    client = clients.MockClient()
+    await client.call('SET', 'string', 'foo')
+    await client.call('GET', 'string')
+    await client.call('get', 'string')
+    await client.call('HSET', 'hash', 'field', 'value')
+    await client.call('SETEX', 'volatile', 100, 'bar')
+    with pytest.raises(ValueError):
+        await client.call('SETEX', 'volatile', 'soon', 'bar')
+
+    assert mock_redis_stats.calls() == 6
+    assert mock_redis_stats.calls('GET') == 2
+    assert mock_redis_stats['set'].arg_bytes == len('string') + len('foo')
+    assert mock_redis_stats['setex'].failed_calls == 1
+    assert mock_redis_stats.hot(1)[0][0] in {'set', 'get', 'hset', 'setex'}
+
+    info = mock_redis.info()
+    assert info['stats']['total_commands_processed'] == 6
+    assert info['keyspace']['db0'] == {
+        'keys': 3, 'expires': 1, 'strings': 2, 'hashes': 1, 'lists': 0, 'sets': 0, 'zsets': 0}
+    assert info['commandstats']['cmdstat_get']['calls'] == 2
+    assert mock_redis.info('keyspace') == info['keyspace']
+
+    text = await client.call('INFO', 'commandstats')
+    assert text.startswith(b'# Commandstats\r\ncmdstat_get:calls=2,usec=')
+
+    # Commands of a transaction are counted when EXEC runs them.
+    await client.call('MULTI')
+    await client.call('GET', 'string')
+    await client.call('INCR', 'string')
+    replies = await client.call('EXEC')
+    assert isinstance(replies[1], ValueError)
+    assert mock_redis_stats.calls('get') == 3
+    assert mock_redis_stats['incr'].failed_calls == 1
+    assert mock_redis_stats.calls('multi') == mock_redis_stats.calls('exec') == 1
+
+    mock_redis.disable_stats()
+    await client.call('GET', 'string')
+    assert mock_redis_stats.calls('get') == 3
+    assert 'commandstats' not in mock_redis.info()
@@ -4,6 +4,7 @@
 
 import pytest
 import pytest_tornado
+import tornadis
 
 from tornado.ioloop import TimeoutError
 
@@ -41,7 +42,7 @@ async def test_valid_mockpubsub_pubsub_unsubscribe_single(pubsub_client):
     assert 'test' in pubsub_client.channels
     assert len(pubsub_client.channels.keys()) == 1
     assert len(pubsub_client.channels['test']) == 1
-    assert pubsub_client.channels['test'][0] == pubsub_client
+    assert list(pubsub_client.channels['test']) == [pubsub_client]
 
     await pubsub_client.pubsub_unsubscribe('test')
     assert 'test' in pubsub_client.channels
@@ -60,9 +61,9 @@ async def test_valid_mockpubsub_pubsub_unsubscribe_many(pubsub_client):
     assert 'bar' in pubsub_client.channels
     assert len(pubsub_client.channels.keys()) == 2
     assert len(pubsub_client.channels['foo']) == 1
-    assert pubsub_client.channels['foo'][0] == pubsub_client
+    assert list(pubsub_client.channels['foo']) == [pubsub_client]
     assert len(pubsub_client.channels['bar']) == 1
-    assert pubsub_client.channels['bar'][0] == pubsub_client
+    assert list(pubsub_client.channels['bar']) == [pubsub_client]
 
     await pubsub_client.pubsub_unsubscribe('foo', 'bar')
     assert 'foo' in pubsub_client.channels
@@ -78,3 +79,94 @@ async def test_valid_mockpubsub_pubsub_pop_message(pubsub_client):
     pubsub_client._reply_list.append('test')
     res = await pubsub_client.pubsub_pop_message()
     assert res == 'test'
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('pubsub_client', 'mock_client')
+async def test_valid_mockpubsub_publish_wakes_consumer(pubsub_client, mock_client):
+    await pubsub_client.pubsub_subscribe('test')
+    pop = pubsub_client.pubsub_pop_message(deadline=5)
+    assert not pop.done()
+
+    assert await mock_client.call('PUBLISH', 'test', 'message') == 1
+    assert await pop == 'message'
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('pubsub_client')
+async def test_valid_mockpubsub_pop_message_deadline(pubsub_client):
+    await pubsub_client.pubsub_subscribe('test')
+    assert await pubsub_client.pubsub_pop_message(deadline=0.01) is None
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client')
+async def test_valid_mockpubsub_bounded_mailbox(mock_client):
+    with pytest.raises(ValueError):
+        clients.MockPubSubClient(overflow='notapolicy')
+
+    oldest = clients.MockPubSubClient(mailbox_size=2)
+    newest = clients.MockPubSubClient(mailbox_size=2, overflow=clients.MockPubSubClient.DROP_NEWEST)
+    for client in (oldest, newest):
+        await client.pubsub_subscribe('test')
+
+    for message in ('foo', 'bar', 'foobar'):
+        await mock_client.call('PUBLISH', 'test', message)
+
+    assert list(oldest._reply_list) == ['bar', 'foobar']
+    assert list(newest._reply_list) == ['foo', 'bar']
+    assert oldest.dropped_messages == newest.dropped_messages == 1
+    assert mock_client.redis.info('stats')['pubsub_messages_delivered'] == 5
+    assert mock_client.redis.info('stats')['pubsub_messages_dropped'] == 2
+
+    strict = clients.MockPubSubClient(mailbox_size=1, overflow=clients.MockPubSubClient.RAISE)
+    await strict.pubsub_subscribe('strict')
+    await mock_client.call('PUBLISH', 'strict', 'foo')
+    with pytest.raises(tornadis.ClientError):
+        await mock_client.call('PUBLISH', 'strict', 'bar')
+
+@pytest.mark.parametrize('pattern,prefix,matches,mismatches', [
+    ('events.*', 'events.', ['events.', 'events.a.b'], ['event', 'other.events.a']),
+    ('h?llo', 'h', ['hello', 'hallo'], ['hllo', 'heello']),
+    ('h[^e]llo', 'h', ['hallo'], ['hello']),
+    ('h[a-b]llo', 'h', ['hallo', 'hbllo'], ['hcllo']),
+    ('a\\*b', 'a*b', ['a*b'], ['axb']),
+    ('a[b', 'a[b', ['a[b'], ['ab']),
+    (b'ev*', b'ev', [b'ev1'], [b'e']),
+])
+def test_compile_glob(pattern, prefix, matches, mismatches):
+    glob_prefix, regex = clients.compile_glob(pattern)
+    assert glob_prefix == prefix
+    assert all(regex.match(channel) for channel in matches)
+    assert not any(regex.match(channel) for channel in mismatches)
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('pubsub_client', 'mock_client')
+async def test_valid_mockpubsub_pubsub_psubscribe(pubsub_client, mock_client):
+    await pubsub_client.pubsub_psubscribe('events.*', 'logs.[ew]*')
+    assert 'events.*' in pubsub_client.patterns
+    assert len(pubsub_client.patterns) == 2
+
+    assert await mock_client.call('PUBLISH', 'events.created', 'foo') == 1
+    assert await mock_client.call('PUBLISH', 'logs.info', 'bar') == 0
+    assert await mock_client.call('PUBLISH', 'logs.error', 'foobar') == 1
+
+    val = await pubsub_client.pubsub_pop_message()
+    assert val == [b'pmessage', 'events.*', 'events.created', 'foo']
+    val = await pubsub_client.pubsub_pop_message()
+    assert val == [b'pmessage', 'logs.[ew]*', 'logs.error', 'foobar']
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('pubsub_client', 'mock_client')
+async def test_valid_mockpubsub_pubsub_punsubscribe(pubsub_client, mock_client):
+    other = clients.MockPubSubClient()
+    await pubsub_client.pubsub_psubscribe('events.*', 'logs.*')
+    await other.pubsub_psubscribe('events.*')
+
+    await pubsub_client.pubsub_punsubscribe('events.*')
+    assert 'events.*' in pubsub_client.patterns
+    assert await mock_client.call('PUBLISH', 'events.created', 'foo') == 1
+
+    await other.pubsub_punsubscribe()
+    assert 'events.*' not in pubsub_client.patterns
+    assert await mock_client.call('PUBLISH', 'events.created', 'foo') == 0
+
+    await pubsub_client.pubsub_punsubscribe()
+    assert not pubsub_client.patterns
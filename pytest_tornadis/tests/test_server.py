@@ -0,0 +1,152 @@
+"""
+    Tests for MockRedisServer.
+"""
+
+import hiredis
+import pytest
+import pytest_tornado
+import tornado.gen
+import tornado.tcpclient
+import tornadis
+
+from .. import clients, server
+
+# tornadis relies on tornado.gen.Task, which tornado 6 removed.
+requires_tornadis_client = pytest.mark.skipif(
+    not hasattr(tornado.gen, 'Task'), reason='tornadis clients need tornado < 6')
+
+class RespConnection(object):
+    def __init__(self, stream):
+        self.stream = stream
+        self.reader = hiredis.Reader()
+
+    @classmethod
+    async def connect(cls, redis_server):
+        kwargs = redis_server.client_kwargs
+        stream = await tornado.tcpclient.TCPClient().connect(kwargs['host'], kwargs['port'])
+        return cls(stream)
+
+    async def call(self, *commands):
+        payload = []
+        for command in commands:
+            server.encode_reply(command, payload)
+        await self.stream.write(b''.join(payload))
+        return [await self.read() for _ in commands]
+
+    async def read(self):
+        reply = self.reader.gets()
+        while reply is False:
+            self.reader.feed(await self.stream.read_bytes(65536, partial=True))
+            reply = self.reader.gets()
+        return reply
+
+def test_encode_reply():
+    parts = []
+    server.encode_reply([None, b'foo', 'bar', 1, {'foo': 'bar'}, ValueError('boom')], parts)
+    assert b''.join(parts) == (b'*6\r\n$-1\r\n$3\r\nfoo\r\n$3\r\nbar\r\n:1\r\n'
+                               b'*2\r\n$3\r\nfoo\r\n$3\r\nbar\r\n-ERR boom\r\n')
+
+    parts = []
+    server.encode_reply([2.0, 0.5, float('-inf')], parts)
+    assert b''.join(parts) == b'*3\r\n$1\r\n2\r\n$3\r\n0.5\r\n$4\r\n-inf\r\n'
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis', 'mock_redis_server')
+async def test_server_commands(mock_redis, mock_redis_server):
+    connection = await RespConnection.connect(mock_redis_server)
+    replies = await connection.call(['SET', 'test', 'foo'], ['GET', 'test'], ['NOTACOMMAND'],
+                                    ['HSET', 'hash', 'foo', 'bar'], ['RPUSH', 'list', 'a', 'b'])
+    assert replies[:2] == [b'OK', b'foo']
+    assert isinstance(replies[2], hiredis.ReplyError)
+    assert "unknown command 'NOTACOMMAND'" in str(replies[2])
+    assert replies[3:] == [1, 2]
+
+    # The server serves the same keyspace as the mock clients.
+    assert await clients.MockClient().call('GET', b'test') == b'foo'
+    assert await connection.call(['HGETALL', 'hash']) == [[b'foo', b'bar']]
+    wrongtype = (await connection.call(['GET', 'hash']))[0]
+    assert str(wrongtype).startswith('WRONGTYPE')
+
+    # Connection state such as SELECT is per connection.
+    other = await RespConnection.connect(mock_redis_server)
+    assert await connection.call(['SELECT', '1'], ['GET', 'test']) == [b'OK', None]
+    assert await other.call(['GET', 'test']) == [b'foo']
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis', 'mock_redis_server')
+async def test_server_malformed_commands(mock_redis, mock_redis_server):
+    connection = await RespConnection.connect(mock_redis_server)
+    replies = await connection.call(['SET', 'test'], ['BLPOP', 'list'], ['SET', 'test', 'foo'])
+    assert isinstance(replies[0], hiredis.ReplyError)
+    assert "wrong number of arguments for 'set' command" in str(replies[0])
+    assert isinstance(replies[1], hiredis.ReplyError)
+    assert replies[2] == b'OK'
+
+    # An unknown command fails the transaction it is queued in.
+    replies = await connection.call(['MULTI'], ['SET', 'test', 'bar'], ['NOTACOMMAND'], ['EXEC'])
+    assert replies[:2] == [b'OK', b'QUEUED']
+    assert "unknown command 'NOTACOMMAND'" in str(replies[2])
+    assert str(replies[3]).startswith('EXECABORT')
+    assert await connection.call(['GET', 'test']) == [b'foo']
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis', 'mock_redis_server')
+async def test_server_pipelined_requests(mock_redis, mock_redis_server):
+    connection = await RespConnection.connect(mock_redis_server)
+    commands = [['RPUSH', 'list', str(i)] for i in range(1000)]
+    replies = await connection.call(*commands)
+    assert replies == list(range(1, 1001))
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis')
+async def test_server_auth(mock_redis):
+    redis_server = server.MockRedisServer(redis=mock_redis, password='secret')
+    redis_server.listen_tcp()
+    try:
+        connection = await RespConnection.connect(redis_server)
+        replies = await connection.call(['GET', 'test'], ['AUTH', 'wrong'], ['AUTH', 'secret'], ['GET', 'test'])
+        assert str(replies[0]).startswith('NOAUTH')
+        assert str(replies[1]).startswith('WRONGPASS')
+        assert replies[2:] == [b'OK', None]
+    finally:
+        redis_server.stop()
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client', 'mock_redis_server')
+async def test_server_pubsub(mock_client, mock_redis_server):
+    connection = await RespConnection.connect(mock_redis_server)
+    assert await connection.call(['SUBSCRIBE', 'test']) == [[b'subscribe', b'test', 1]]
+    assert await connection.call(['PSUBSCRIBE', 'te*']) == [[b'psubscribe', b'te*', 2]]
+
+    assert await mock_client.call('PUBLISH', b'test', b'foo') == 2
+    assert await connection.read() == [b'message', b'test', b'foo']
+    assert await connection.read() == [b'pmessage', b'te*', b'test', b'foo']
+
+    assert await connection.call(['UNSUBSCRIBE']) == [[b'unsubscribe', b'test', 1]]
+    assert await mock_client.call('PUBLISH', b'test', b'foo') == 1
+
+@requires_tornadis_client
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis_server')
+async def test_server_tornadis_client(mock_redis_server):
+    client = tornadis.Client(db=1, **mock_redis_server.client_kwargs)
+    assert await client.call('SET', 'test', 'foo') == b'OK'
+    assert await client.call('GET', 'test') == b'foo'
+
+    pipeline = tornadis.Pipeline()
+    pipeline.stack_call('RPUSH', 'list', 'foo', 'bar')
+    pipeline.stack_call('LRANGE', 'list', 0, -1)
+    assert await client.call(pipeline) == [2, [b'foo', b'bar']]
+    client.disconnect()
+
+@requires_tornadis_client
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis_server')
+async def test_server_tornadis_pool(mock_redis_server):
+    pool = tornadis.ClientPool(max_size=2, **mock_redis_server.client_kwargs)
+    pooled = [await pool.get_connected_client() for _ in range(2)]
+    assert pool.get_client_nowait() is None
+    for client in pooled:
+        assert await client.call('PING') == b'PONG'
+        pool.release_client(client)
+    pool.destroy()
@@ -0,0 +1,83 @@
+"""
+    Tests for snapshot files.
+"""
+
+import pytest
+
+from .. import clients, snapshot
+
+def _seed(clock):
+    redis = clients.MockRedis(clock=clock)
+    keyspace = redis.db()
+    keyspace.put('string', 'foo')
+    keyspace.put(42, 1.5)
+    keyspace.put(b'counter', 2 ** 70, ttl=100)
+    keyspace.get_hash('hash', create=True).update({'field': 'bar', b'count': 3})
+    keyspace.get_list('list', create=True).extend(['a', b'b', 1.5])
+    keyspace.get_set('set', create=True).update({1, 'two'})
+    keyspace.get_zset('zset', create=True).add('member', 2.5)
+    keyspace.put('short', 'foo', ttl=1)
+    redis.db(3).put('other', 'baz')
+    redis.db(4).put('clé', 'baz')
+    return redis
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'seed.snapshot')
+    clock = clients.VirtualClock(start=0)
+    redis = _seed(clock)
+    clock.advance(2)
+    snapshot.dump(redis, path)
+
+    loaded = snapshot.load(path, clients.MockRedis(clock=clock))
+    assert 'short' not in loaded.db().data
+    redis.db().delete('short')
+    assert loaded.db().data == redis.db().data
+    assert loaded.db(3).data == redis.db(3).data
+    assert loaded.db(4).data == redis.db(4).data
+    assert loaded.used_memory == redis.used_memory
+
+    # TTLs go on from the time of the dump.
+    assert loaded.db().ttl(b'counter') == 98
+    clock.advance(99)
+    assert loaded.db().expire_cycle() == 1
+    assert b'counter' not in loaded.db().data
+
+    # Databases missing from the file are emptied.
+    target = clients.MockRedis()
+    target.db(5).put('stale', 'foo')
+    snapshot.load(path, target)
+    assert not target.db(5).data
+
+def test_snapshot_decodes_lazily(tmp_path):
+    path = str(tmp_path / 'seed.snapshot')
+    snapshot.dump(_seed(clients.VirtualClock(start=0)), path)
+    loaded = snapshot.load(path)
+
+    for key in ('string', 'hash'):
+        assert loaded.db().data[key]._source is not None
+    assert loaded.db().get_string('string') == 'foo'
+    assert loaded.db().get_hash('hash') == {'field': 'bar', b'count': 3}
+    for key in ('string', 'hash'):
+        assert loaded.db().data[key]._source is None
+    assert loaded.db().data['list']._source is not None
+
+    # Restored copies share the decoded values until they modify them.
+    frozen = loaded.snapshot()
+    forked = clients.MockRedis()
+    forked.restore(frozen)
+    forked.db().get_list('list', write=True).append('c')
+    assert list(loaded.db().get_list('list')) == ['a', b'b', 1.5]
+    assert list(forked.db().get_list('list')) == ['a', b'b', 1.5, 'c']
+
+def test_snapshot_rejects_other_files(tmp_path):
+    path = tmp_path / 'other'
+    path.write_bytes(b'REDIS0009' + bytes(32))
+    with pytest.raises(ValueError):
+        snapshot.load(str(path))
+
+    # A failed dump leaves no file behind.
+    redis = clients.MockRedis()
+    redis.db().put('key', object())
+    with pytest.raises(ValueError):
+        snapshot.dump(redis, str(tmp_path / 'object.snapshot'))
+    assert sorted(entry.name for entry in tmp_path.iterdir()) == ['other']
@@ -0,0 +1,88 @@
+"""
+    Tests for the trace recorder and replayer.
+"""
+
+import pytest
+import pytest_tornado
+import tornadis
+
+from .. import clients, stats, trace
+
+def test_latency_histogram():
+    histogram = stats.LatencyHistogram()
+    assert histogram.percentile(50) == 0.0
+
+    for micros in range(1, 1001):
+        histogram.add(micros * 1e-6)
+    assert histogram.count == 1000
+    assert histogram.min == 1e-6 and histogram.max == 1e-3
+    assert 500e-6 <= histogram.percentile(50) <= 500e-6 * 1.05
+    assert 990e-6 <= histogram.percentile(99) <= 1e-3
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_client')
+async def test_trace_record_and_read(mock_client, tmp_path):
+    path = str(tmp_path / 'trace.bin.gz')
+    with trace.TraceRecorder(mock_client, path) as recorder:
+        assert await recorder.call('SET', 'test', b'foo') == b'OK'
+        with pytest.raises(ValueError):     # Out of range, but still recorded.
+            await recorder.call('EXPIRE', 'test', 2 ** 70)
+
+        pipeline = tornadis.Pipeline()
+        pipeline.stack_call('HSET', 'hash', 'foo', 1.5)
+        pipeline.stack_call('HGET', 'hash', 'foo')
+        assert await recorder.call(pipeline) == [1, 1.5]
+        assert recorder.pipeline_sizes == [2]
+        assert recorder.records == 3
+
+        # Arguments that cannot be recorded fail the call, which is not sent.
+        future = recorder.call('SET', 'test', object())
+        with pytest.raises(ValueError):
+            await future
+        assert recorder.records == 3
+        assert await recorder.call('GET', 'test') == b'foo'
+
+    records = list(trace.read_trace(path))
+    assert [args for _, args in records[:2]] == [('SET', 'test', b'foo'), ('EXPIRE', 'test', 2 ** 70)]
+    assert records[2][1].pipelined_args == [('HSET', 'hash', 'foo', 1.5), ('HGET', 'hash', 'foo')]
+    assert records[0][0] <= records[1][0] <= records[2][0]
+    assert len(records) == 4
+
+def test_trace_invalid(tmp_path):
+    path = tmp_path / 'trace.bin'
+    path.write_bytes(b'garbage')
+    with pytest.raises(ValueError):
+        list(trace.read_trace(str(path)))
+
+    with pytest.raises(ValueError):
+        with trace.TraceRecorder(clients.MockClient(), str(path)) as recorder:
+            recorder.record(('SET', 'test', None))
+
+    path.write_bytes(trace.MAGIC + b'C')
+    with pytest.raises(ValueError):
+        list(trace.read_trace(str(path)))
+
+@pytest.mark.gen_test
+@pytest.mark.usefixtures('mock_redis')
+async def test_trace_replay(mock_redis, tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    recorded = clients.MockClient(redis=clients.MockRedis())
+    with trace.TraceRecorder(recorded, path) as recorder:
+        for i in range(10):
+            await recorder.call('RPUSH', 'list', i)
+        with pytest.raises(ValueError):
+            await recorder.call('NOTACOMMAND')
+        with pytest.raises(IndexError):     # Malformed, but still replayed.
+            await recorder.call('SET', 'key')
+        await recorder.call('RPUSH', 'list', 10)
+
+    report = await trace.TraceReplayer(path).replay()
+    assert await clients.MockClient().call('LRANGE', 'list', 0) == list(range(11))
+    assert report.commands == 13
+    assert report.errors == 2
+    assert report.latencies['rpush'].count == 11
+    assert report.throughput > 0
+    assert set(report.as_dict()['latencies']) == {'rpush', 'notacommand', 'set'}
+
+    paced = await trace.TraceReplayer(path).replay(paced=True, speed=1000)
+    assert paced.commands == 13
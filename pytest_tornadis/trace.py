@@ -0,0 +1,199 @@
+"""
+    Recording of tornadis client traffic to a trace file and replay of it
+    against the mock clients.
+
+    A trace is a stream of records, each the time elapsed since recording
+    started and either one command or a whole pipeline. Both the recorder and
+    the replayer stream records, so traces larger than memory work. Paths
+    ending with ``.gz`` are gzip-compressed.
+"""
+
+import collections
+import gzip
+import struct
+import time
+
+import tornado.concurrent
+import tornado.gen
+import tornadis
+
+from . import clients, codec, stats
+
+MAGIC = b'PTTRACE1'
+
+_RECORD = struct.Struct('<cd')
+_COUNT = codec.COUNT
+
+_COMMAND = b'C'
+_PIPELINE = b'P'
+
+def _open(path, mode):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+def _encode_arg(arg, parts):
+    if arg is None or not codec.encode(arg, parts):
+        raise ValueError('Cannot trace argument {!r}.'.format(arg))
+
+def _encode_command(args, parts):
+    parts.append(_COUNT.pack(len(args)))
+    for arg in args:
+        _encode_arg(arg, parts)
+
+def _read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError('Truncated trace.')
+    return data
+
+def _read_command(stream):
+    count = _COUNT.unpack(_read_exactly(stream, _COUNT.size))[0]
+    return tuple(codec.read(stream, _read_exactly) for _ in range(count))
+
+def read_trace(path):
+    """Yields ``(timestamp, args)`` for each record of the trace at ``path``.
+
+    ``args`` is a tuple of command arguments, or a ``tornadis.Pipeline``.
+    """
+    with _open(path, 'rb') as stream:
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a trace file.')
+
+        while True:
+            header = stream.read(_RECORD.size)
+            if not header:
+                return
+            if len(header) != _RECORD.size:
+                raise ValueError('Truncated trace.')
+
+            kind, timestamp = _RECORD.unpack(header)
+            if kind == _COMMAND:
+                yield timestamp, _read_command(stream)
+            elif kind == _PIPELINE:
+                pipeline = tornadis.Pipeline()
+                count = _COUNT.unpack(_read_exactly(stream, _COUNT.size))[0]
+                for _ in range(count):
+                    pipeline.stack_call(*_read_command(stream))
+                yield timestamp, pipeline
+            else:
+                raise ValueError('Invalid trace record {!r}.'.format(kind))
+
+class TraceRecorder(object):
+    """Wraps a tornadis client, real or mock, and streams its calls to ``path``.
+
+    Use it in place of the client; every other attribute is delegated to it.
+    """
+
+    def __init__(self, client, path):
+        self.client = client
+        self.records = 0
+        self._stream = _open(path, 'wb')
+        self._stream.write(MAGIC)
+        self._start = time.perf_counter()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, args):
+        parts = []
+        timestamp = time.perf_counter() - self._start
+        if len(args) == 1 and isinstance(args[0], tornadis.Pipeline):
+            pipeline = args[0]
+            parts.append(_RECORD.pack(_PIPELINE, timestamp))
+            parts.append(_COUNT.pack(len(pipeline.pipelined_args)))
+            for command in pipeline.pipelined_args:
+                _encode_command(command, parts)
+        else:
+            parts.append(_RECORD.pack(_COMMAND, timestamp))
+            _encode_command(args, parts)
+
+        self._stream.write(b''.join(parts))
+        self.records += 1
+
+    def call(self, *args, **kwargs):
+        """Records the call and forwards it to the client.
+
+        A call that cannot be recorded is not sent, and its error comes back
+        in the returned Future as the client's own errors do.
+        """
+        try:
+            self.record(args)
+        except ValueError as error:
+            future = tornado.concurrent.Future()
+            future.set_exception(error)
+            return future
+        return self.client.call(*args, **kwargs)
+
+    def close(self):
+        self._stream.close()
+
+class ReplayReport(object):
+    """Throughput and per-command latency histograms of a replay."""
+
+    def __init__(self):
+        self.commands = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.latencies = collections.defaultdict(stats.LatencyHistogram)
+
+    @property
+    def throughput(self):
+        """Commands per second."""
+        return self.commands / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'commands': self.commands,
+            'errors': self.errors,
+            'elapsed': self.elapsed,
+            'throughput': self.throughput,
+            'latencies': {name: histogram.as_dict() for name, histogram in self.latencies.items()},
+        }
+
+class TraceReplayer(object):
+    """Feeds a trace into a client, a MockClient bound to the active MockRedis by default."""
+
+    def __init__(self, path, client=None):
+        self.path = path
+        self.client = clients.MockClient() if client is None else client
+
+    @tornado.gen.coroutine
+    def replay(self, paced=False, speed=1.0):
+        """Replays the trace and returns a ``ReplayReport``.
+
+        With ``paced`` each call is issued at its recorded time, divided by
+        ``speed``; otherwise calls are issued as fast as possible.
+        """
+        report = ReplayReport()
+        start = time.perf_counter()
+        for timestamp, args in read_trace(self.path):
+            if paced:
+                delay = timestamp / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    yield tornado.gen.sleep(delay)
+
+            if isinstance(args, tornadis.Pipeline):
+                name = 'pipeline'
+                call_args = (args,)
+            else:
+                name = args[0].decode('utf-8') if isinstance(args[0], bytes) else args[0]
+                name = name.lower()
+                call_args = args
+
+            call_start = time.perf_counter()
+            try:
+                yield self.client.call(*call_args)
+            except Exception:
+                report.errors += 1
+            report.latencies[name].add(time.perf_counter() - call_start)
+            report.commands += 1
+
+        report.elapsed = time.perf_counter() - start
+        return report
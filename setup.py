@@ -25,6 +25,7 @@ setuptools.setup(
 
     install_requires=['tornadis>=0.8.0', 'tornado>=4.5.2'],
     tests_require=['pytest>=3.3.1', 'pytest-cov==2.5.1', 'pytest-tornado>=0.4.5'],
+    entry_points={'pytest11': ['tornadis = pytest_tornadis.plugin']},
 
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',